@@ -0,0 +1,116 @@
+"""
+A simple commandline benchmark for reading inverted lists from a
+Lucene index.  It reports the time needed to read one million postings
+in each postings mode, and the memory footprint and decoding speed of
+compressed inverted lists.  Run it to see a simple usage message.
+"""
+
+# Copyright (c) 2026, Carnegie Mellon University.  All Rights Reserved.
+
+import sys
+import time
+
+from Idx import Idx
+from InvList import InvList
+from InvListCompressed import InvListCompressed
+
+# ------------------ Global variables ---------------------- #
+
+usage = (
+    "Usage:  python " + sys.argv[0] +
+    " INDEX_PATH FIELD TERM [TERM ...]\n\n" +
+    "Reads the inverted list of each TERM in FIELD with each postings\n" +
+    "mode, and reports seconds per million postings.  Then reports\n" +
+    "the size of the plain and compressed inverted lists, and how fast\n" +
+    "compressed inverted lists are decoded.\n")
+
+
+# ------------------ Methods (alphabetical) ---------------- #
+
+def main():
+    """The main function"""
+
+    if len(sys.argv) < 4:
+        print(usage)
+        sys.exit(1)
+
+    index_path, field, terms = sys.argv[1], sys.argv[2], sys.argv[3:]
+
+    if not Idx.open(index_path):
+        sys.exit(1)
+
+    print(f'{"mode":<10} {"postings":>10} {"secs":>8}',
+          f'{"secs/M postings":>16}')
+
+    for mode in [InvList.DOCS, InvList.FREQS, InvList.POSITIONS]:
+        secs, postings = time_invlists(field, terms, mode)
+        per_million = secs / postings * 1e6 if postings > 0 else 0.0
+        print(f'{mode:<10} {postings:>10} {secs:>8.3f}',
+              f'{per_million:>16.3f}')
+
+    print(f'\n{"mode":<10} {"postings":>10} {"plain MB":>9}',
+          f'{"compressed MB":>14} {"decode M postings/s":>20}')
+
+    for mode in [InvList.FREQS, InvList.POSITIONS]:
+        plain, compressed, postings, secs = time_compression(field, terms,
+                                                              mode)
+        rate = postings / secs / 1e6 if secs > 0 else 0.0
+        print(f'{mode:<10} {postings:>10} {plain / 2**20:>9.2f}',
+              f'{compressed / 2**20:>14.2f} {rate:>20.2f}')
+
+    Idx.close()
+
+
+def time_compression(field, terms, mode):
+    """
+    Compress the inverted lists for a list of terms, and time how
+    long it takes to decode them.
+
+    field: The name of a document field.
+    terms: A list of lexically-processed terms.
+    mode: InvList.FREQS or InvList.POSITIONS.
+
+    Returns a tuple of (plain bytes, compressed bytes, number of
+    postings decoded, seconds).
+    """
+    plain = 0
+    compressed = 0
+    postings = 0
+    secs = 0.0
+
+    for term in terms:
+        invList = InvList(field, term, mode)
+        c = InvListCompressed(invList)
+        plain += invList.getSizeInBytes()
+        compressed += c.getSizeInBytes()
+        postings += invList.df
+
+        start = time.perf_counter()
+        c.decompress()
+        secs += time.perf_counter() - start
+
+    return((plain, compressed, postings, secs))
+
+
+def time_invlists(field, terms, mode):
+    """
+    Read the inverted lists for a list of terms.
+
+    field: The name of a document field.
+    terms: A list of lexically-processed terms.
+    mode: InvList.DOCS, InvList.FREQS, or InvList.POSITIONS.
+
+    Returns a tuple of (seconds, number of postings read).
+    """
+    postings = 0
+    start = time.perf_counter()
+
+    for term in terms:
+        postings += InvList(field, term, mode).df
+
+    return((time.perf_counter() - start, postings))
+
+
+# ------------------ Script body --------------------------- #
+
+main()
@@ -0,0 +1,83 @@
+"""
+A simple commandline utility for building the BM25 impact-ordered
+index that the score-at-a-time evaluator uses.  Run it to see a
+simple usage message.
+"""
+
+# Copyright (c) 2026, Carnegie Mellon University.  All Rights Reserved.
+
+import sys
+import time
+
+import Util
+
+from Idx import Idx
+from ImpactIndex import ImpactIndex
+from QryIopTerm import QryIopTerm
+from QryParser import QryParser
+
+# ------------------ Global variables ---------------------- #
+
+usage = (
+    "Usage:  python " + sys.argv[0] +
+    " INDEX_PATH K_1 B QUERY_FILE [QUERY_FILE ...]\n\n" +
+    "Builds BM25 impact lists with parameters K_1 and B for the terms\n" +
+    "in each QUERY_FILE (.qry format), and writes them to the\n" +
+    "Idx.pycache.impacts directory in INDEX_PATH.  Impact lists for\n" +
+    "other terms are built when a query first needs them.\n")
+
+
+# ------------------ Methods (alphabetical) ---------------- #
+
+def get_terms(q, terms):
+    """
+    Find the terms in a query tree.
+
+    q: A query.
+    terms: A dict of (field, term) pairs, which is updated.
+    """
+    if isinstance(q, QryIopTerm):
+        terms[(q._field, q._term)] = True
+        return
+
+    for q_i in q._args:
+        get_terms(q_i, terms)
+
+
+def main():
+    """The main function"""
+
+    if len(sys.argv) < 5:
+        print(usage)
+        sys.exit(1)
+
+    index_path = sys.argv[1]
+    k_1, b = float(sys.argv[2]), float(sys.argv[3])
+
+    if not Idx.open(index_path) or not ImpactIndex.open(index_path):
+        sys.exit(1)
+
+    # A dict keeps the terms in the order that they were found.
+    terms = {}
+    for path in sys.argv[4:]:
+        for qString in Util.read_queries(path).values():
+            get_terms(QryParser.getQuery(f'#SUM({qString})'), terms)
+
+    start = time.time()
+    postings = 0
+    segments = 0
+
+    for field, term in terms:
+        impacts = ImpactIndex.build(field, term, k_1, b)
+        postings += sum(len(docids) for _, docids in impacts)
+        segments += len(impacts)
+
+    print(f'{len(terms)} terms, {segments} segments, {postings} postings,',
+          f'{time.time() - start:.3f} secs')
+
+    Idx.close()
+
+
+# ------------------ Script body --------------------------- #
+
+main()
@@ -0,0 +1,289 @@
+"""
+A persistent cache of collection statistics, stored next to the
+Idx.pycache.* files so that later runs don't need to get them from
+Lucene again.
+"""
+
+# Copyright (c) 2026, Carnegie Mellon University.  All Rights Reserved.
+
+import gzip
+import json
+import math
+import os
+
+import PyLu
+
+
+class CollectionStats:
+    """
+    Collection statistics: the number of documents (N), the number
+    of documents that contain each field, the sum and average of each
+    field's lengths, and the df and ctf of each term that has been
+    looked up.  Each statistic is fetched from Lucene at most once per
+    index, and Idx's statistics methods read them from here.
+
+    The cache also memoizes values that retrieval models compute from
+    the statistics: BM25 RSJ (idf) weights, indexed by df, and Indri
+    maximum likelihood estimates (pMLE), indexed by field and ctf.
+    Scorers get them here instead of computing them for each query
+    operator.
+
+    Idx.open opens the cache and loads the Idx.pycache.stats.gz file
+    if it was created from the same version of the Lucene index.
+    Idx.close saves the statistics to the file if new statistics were
+    fetched.  Derived values are not saved; they are cheap to compute.
+    """
+
+    # -------------- Constants and static variables -------- #
+
+    _filename = 'Idx.pycache.stats.gz'
+
+    _path = None		# The file, or None if not persistent
+    _reader = None		# A Lucene IndexReader
+    _index_version = None
+    _changed = False
+
+    _numDocs = None
+    _docCount = {}		# field -> number of documents
+    _sumOfFieldLengths = {}	# field -> sum of field lengths
+    _docFreq = {}		# field -> {term -> df}
+    _totalTermFreq = {}		# field -> {term -> ctf}
+
+    _avgFieldLength = {}	# field -> average field length
+    _idf = {}			# df -> RSJ weight
+    _pMLE = {}			# (field, ctf) -> pMLE
+
+
+    # -------------- Methods (alphabetical) ---------------- #
+
+    @staticmethod
+    def close():
+        """
+        Save the statistics, if new statistics were fetched and the
+        cache is persistent.
+        """
+        if CollectionStats._path is None or not CollectionStats._changed:
+            return
+
+        contents = {
+            'version': CollectionStats._index_version,
+            'numDocs': CollectionStats._numDocs,
+            'docCount': CollectionStats._docCount,
+            'sumOfFieldLengths': CollectionStats._sumOfFieldLengths,
+            'docFreq': CollectionStats._docFreq,
+            'totalTermFreq': CollectionStats._totalTermFreq}
+
+        # Write a temporary file and rename it, so that a failed write
+        # doesn't leave a damaged file.
+        path = CollectionStats._path
+        try:
+            with gzip.open(path + '.tmp', 'wt', encoding='utf-8') as f:
+                json.dump(contents, f)
+            os.replace(path + '.tmp', path)
+            CollectionStats._changed = False
+        except Exception as e:
+            print('Cannot write file', CollectionStats._filename)
+            print(str(e))
+
+
+    @staticmethod
+    def getAvgFieldLength(fieldName):
+        """
+        Get the average length of a field in the documents that
+        contain it.
+
+        fieldName: The name of a document field.
+        """
+        avg = CollectionStats._avgFieldLength.get(fieldName)
+
+        if avg is None:
+            avg = (CollectionStats.getSumOfFieldLengths(fieldName) /
+                   CollectionStats.getDocCount(fieldName))
+            CollectionStats._avgFieldLength[fieldName] = avg
+
+        return(avg)
+
+
+    @staticmethod
+    def getDocCount(fieldName):
+        """
+        Get the number of documents that contain a specified field.
+
+        fieldName: The name of a document field.
+        """
+        count = CollectionStats._docCount.get(fieldName)
+
+        if count is None:
+            count = CollectionStats._reader.getDocCount(
+                PyLu.JString(fieldName))
+            CollectionStats._docCount[fieldName] = count
+            CollectionStats._changed = True
+
+        return(count)
+
+
+    @staticmethod
+    def getDocFreq(fieldName, term):
+        """
+        Get the document frequency (df) of a term in a field.
+
+        fieldName: The name of a document field.
+        term: A lexically-processed term that may appear in the corpus.
+        """
+        dfs = CollectionStats._docFreq.setdefault(fieldName, {})
+        df = dfs.get(term)
+
+        if df is None:
+            df = CollectionStats._reader.docFreq(
+                CollectionStats.__getTerm(fieldName, term))
+            dfs[term] = df
+            CollectionStats._changed = True
+
+        return(df)
+
+
+    @staticmethod
+    def getIdf(df):
+        """
+        Get the BM25 RSJ weight of a term, log((N+1)/(df+0.5)).
+
+        df: The term's document frequency.
+        """
+        idf = CollectionStats._idf.get(df)
+
+        if idf is None:
+            N = CollectionStats.getNumDocs()
+            idf = math.log((N+1)/(df+0.5))
+            CollectionStats._idf[df] = idf
+
+        return(idf)
+
+
+    @staticmethod
+    def getNumDocs():
+        """
+        Get the total number of documents in the corpus.
+        """
+        if CollectionStats._numDocs is None:
+            CollectionStats._numDocs = CollectionStats._reader.numDocs()
+            CollectionStats._changed = True
+
+        return(CollectionStats._numDocs)
+
+
+    @staticmethod
+    def getPMLE(fieldName, ctf):
+        """
+        Get the Indri maximum likelihood estimate of a term's
+        probability in a field, ctf / sum of field lengths.
+
+        fieldName: The name of a document field.
+        ctf: The term's collection term frequency.  Callers that smooth
+          terms that have ctf=0 pass the smoothed ctf.
+        """
+        key = (fieldName, ctf)
+        pMLE = CollectionStats._pMLE.get(key)
+
+        if pMLE is None:
+            pMLE = ctf / CollectionStats.getSumOfFieldLengths(fieldName)
+            CollectionStats._pMLE[key] = pMLE
+
+        return(pMLE)
+
+
+    @staticmethod
+    def getSumOfFieldLengths(fieldName):
+        """
+        Get the total number of term occurrences contained in all
+        instances of the specified field in the corpus.
+
+        fieldName: The name of a document field.
+        """
+        total = CollectionStats._sumOfFieldLengths.get(fieldName)
+
+        if total is None:
+            total = CollectionStats._reader.getSumTotalTermFreq(
+                PyLu.JString(fieldName))
+            CollectionStats._sumOfFieldLengths[fieldName] = total
+            CollectionStats._changed = True
+
+        return(total)
+
+
+    @staticmethod
+    def __getTerm(fieldName, term):
+        """Get a Lucene Term for a (field, term) pair."""
+        b = PyLu.LBytesRef(PyLu.JString(term))
+        return(PyLu.LTerm(PyLu.JString(fieldName), b))
+
+
+    @staticmethod
+    def getTotalTermFreq(fieldName, term):
+        """
+        Get the collection term frequency (ctf) of a term in a field.
+
+        fieldName: The name of a document field.
+        term: A lexically-processed term that may appear in the corpus.
+        """
+        ctfs = CollectionStats._totalTermFreq.setdefault(fieldName, {})
+        ctf = ctfs.get(term)
+
+        if ctf is None:
+            ctf = CollectionStats._reader.totalTermFreq(
+                CollectionStats.__getTerm(fieldName, term))
+            ctfs[term] = ctf
+            CollectionStats._changed = True
+
+        return(ctf)
+
+
+    @staticmethod
+    def open(indexReader, index_path=None):
+        """
+        Open the statistics cache for an index.  Statistics that were
+        saved for the same version of the index are loaded.
+
+        indexReader: A Lucene IndexReader for the index.
+        index_path: The directory that contains the Idx.pycache.stats.gz
+          file, or None if statistics are not saved.
+        """
+        CollectionStats._reader = indexReader
+        CollectionStats._index_version = indexReader.getVersion()
+        CollectionStats._changed = False
+        CollectionStats._numDocs = None
+        CollectionStats._docCount = {}
+        CollectionStats._sumOfFieldLengths = {}
+        CollectionStats._docFreq = {}
+        CollectionStats._totalTermFreq = {}
+        CollectionStats._avgFieldLength = {}
+        CollectionStats._idf = {}
+        CollectionStats._pMLE = {}
+
+        if index_path is None:
+            CollectionStats._path = None
+            return
+
+        CollectionStats._path = os.path.join(index_path,
+                                             CollectionStats._filename)
+
+        if not os.path.exists(CollectionStats._path):
+            return
+
+        try:
+            with gzip.open(CollectionStats._path, 'rt',
+                           encoding='utf-8') as f:
+                contents = json.load(f)
+        except Exception as e:
+            print('Cannot open file', CollectionStats._filename)
+            print(str(e))
+            return
+
+        # Statistics from another version of the index are out of date.
+        if contents.get('version') != CollectionStats._index_version:
+            return
+
+        CollectionStats._numDocs = contents['numDocs']
+        CollectionStats._docCount = contents['docCount']
+        CollectionStats._sumOfFieldLengths = contents['sumOfFieldLengths']
+        CollectionStats._docFreq = contents['docFreq']
+        CollectionStats._totalTermFreq = contents['totalTermFreq']
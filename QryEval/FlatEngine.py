@@ -0,0 +1,437 @@
+"""
+A document-at-a-time evaluator for flat bag-of-words queries.  It is
+a fast path for the query operator tree.
+"""
+
+# Copyright (c) 2026, Carnegie Mellon University.  All Rights Reserved.
+
+import math
+from bisect import bisect_left
+
+from CollectionStats import CollectionStats
+from Idx import Idx
+from InvListCompressed import InvListCompressed
+from InvListStream import InvListStream
+from LengthNorms import LengthNorms
+from QryIopTerm import QryIopTerm
+from QrySop import QrySop
+from QrySopAnd import QrySopAnd
+from QrySopOr import QrySopOr
+from QrySopScore import QrySopScore
+from QrySopSum import QrySopSum
+from ResultHeap import ResultHeap
+from RetrievalModelBM25 import RetrievalModelBM25
+from RetrievalModelIndri import RetrievalModelIndri
+from RetrievalModelRankedBoolean import RetrievalModelRankedBoolean
+from RetrievalModelUnrankedBoolean import RetrievalModelUnrankedBoolean
+
+
+class FlatEngine:
+    """
+    Evaluate flat bag-of-words queries document-at-a-time: queries
+    whose arguments are all terms, e.g., the #SUM and #AND queries that
+    Ranker creates for unstructured query text.  The supported shapes
+    are BM25 #SUM, Indri #AND, and Boolean #AND and #OR; a query that
+    is a single term is supported by every model.
+
+    The terms' posting arrays are merged in one loop, and term scores
+    are calculated inline with per-term constants that are computed
+    once per query and length normalization values from LengthNorms,
+    instead of several Python method calls per term per document
+    through QrySopScore and QryIop.  Term scores use the same floating
+    point operations in the same order as QrySopScore, and they are
+    combined in query order, as QrySopSum and QrySopAnd do.  The top
+    documents are selected with a ResultHeap, as Ranker selects them,
+    so scores and rankings match evaluation with the query operator
+    tree.
+
+    Queries that enable WAND, Block-Max WAND, or MaxScore pruning are
+    left to the query operator tree.  So are queries whose inverted
+    lists are streamed or compressed, because the engine reads posting
+    arrays; reading them in full would defeat the memory limits that
+    streaming and compression provide.
+    """
+
+    # -------------- Constants and variables --------------- #
+
+    END = 2**31			# Larger than any docid
+
+
+    # -------------- Methods (alphabetical) ---------------- #
+
+    def __init__(self, model, max_results):
+        """
+        Create a flat query engine.
+
+        model: A retrieval model.
+        max_results: The maximum number of documents to return.
+        """
+        self._model = model
+        self._max_results = max_results
+
+
+    class ComputedLengthNorms:
+        """
+        Length normalization values computed from field lengths read
+        from the index, for an index whose field lengths aren't cached
+        (see LengthNorms).
+        """
+
+        def __init__(self, fieldName, normalize):
+            self._fieldName = fieldName
+            self._normalize = normalize
+
+        def __getitem__(self, docid):
+            return(self._normalize(Idx.getFieldLength(self._fieldName,
+                                                      docid)))
+
+
+    @staticmethod
+    def __getLengthNorms(fieldName, lengthNorms, normalize):
+        """
+        Get the length normalization values of a field.
+
+        fieldName: The name of a document field.
+        lengthNorms: The field's LengthNorms array, or None.
+        normalize: A function of a field length that returns its
+          normalization value, used if lengthNorms is None.
+
+        Returns a sequence of normalization values, indexed by internal
+        docid.
+        """
+        if lengthNorms is None:
+            lengthNorms = FlatEngine.ComputedLengthNorms(fieldName, normalize)
+        return(lengthNorms)
+
+
+    @staticmethod
+    def getFlatTerms(args):
+        """
+        Get the terms of a flat query, i.e., a query whose arguments
+        are all #SCORE operators over terms.  The TAAT and SAAT engines
+        use this method, too.
+
+        args: A list of query operators, e.g., the arguments of a query.
+
+        Returns a list of QryIopTerm, or None if an argument isn't a
+        #SCORE operator over a term.
+        """
+        terms = []
+        for q_i in args:
+            if (not isinstance(q_i, QrySopScore) or
+                not isinstance(q_i._args[0], QryIopTerm)):
+                return(None)
+            terms.append(q_i._args[0])
+
+        return(terms)
+
+
+    @staticmethod
+    def getPostings(q):
+        """
+        Get the docids and tfs of a term's inverted list.  The TAAT
+        engine uses this method, too.
+
+        q: An initialized QryIopTerm.
+
+        Returns a tuple of sequences (docids, tfs), or None if the
+        inverted list is streamed or compressed.
+        """
+        invList = q.invertedList
+
+        if isinstance(invList, (InvListStream, InvListCompressed)):
+            return(None)
+
+        return((invList.docids, invList.tfs))
+
+
+    def getRanking(self, q):
+        """
+        Evaluate a flat query.  The query is initialized only if it is
+        evaluated.
+
+        q: A query.
+
+        Returns a list of (score, externalId) in ranking order, or None
+        if the query isn't a flat query that this engine supports.
+        """
+        r = self._model
+
+        if (getattr(r, 'wand', False) or getattr(r, 'blockMaxWand', False) or
+            getattr(r, 'maxScore', False)):
+            return(None)
+
+        if isinstance(q, QrySopScore):
+            args = [q]
+        elif ((isinstance(r, RetrievalModelBM25) and type(q) is QrySopSum) or
+              (isinstance(r, RetrievalModelIndri) and type(q) is QrySopAnd) or
+              (isinstance(r, (RetrievalModelUnrankedBoolean,
+                              RetrievalModelRankedBoolean)) and
+               type(q) in (QrySopAnd, QrySopOr))):
+            args = q._args
+        else:
+            return(None)
+
+        terms = FlatEngine.getFlatTerms(args)
+
+        if terms is None or not all([self.isMaterialized(t) for t in terms]):
+            return(None)
+
+        q.initialize(r)
+        postings = [self.getPostings(t) for t in terms]
+
+        # A list from InvListCache may have been compressed with another
+        # minDf.  The query operator tree evaluates the query instead.
+        if None in postings:
+            return(None)
+
+        heap = ResultHeap(self._max_results)
+
+        if isinstance(r, RetrievalModelBM25):
+            self.__rankBM25(terms, postings, heap)
+        elif isinstance(r, RetrievalModelIndri):
+            self.__rankIndri(terms, postings, heap)
+        elif type(q) is QrySopAnd:
+            self.__rankBooleanAnd(postings, heap)
+        else:
+            self.__rankBooleanOr(postings, heap)
+
+        return(heap.get_ranking())
+
+
+    @staticmethod
+    def isMaterialized(q):
+        """
+        Predict whether a term's inverted list will be an array-based
+        InvList when the term is initialized, i.e., not streamed and
+        not compressed (see QryIopTerm.evaluate).  The TAAT engine uses
+        this method, too.
+
+        q: A QryIopTerm that isn't initialized.
+        """
+        if InvListStream.enabled:
+            return(False)
+
+        return(InvListCompressed.minDf is None or
+               Idx.getDocFreq(q._field, q._term) < InvListCompressed.minDf)
+
+
+    def __rankBM25(self, terms, postings, heap):
+        """
+        Evaluate a flat BM25 #SUM query.  Each document's score is the
+        sum of the scores of the terms that it contains.
+
+        terms: A list of QryIopTerm.
+        postings: A list of (docids, tfs) for each term.
+        heap: A ResultHeap that stores the top documents.
+        """
+        END = FlatEngine.END
+        threshold = heap.getThreshold()
+        k_1 = self._model.k_1
+        b = self._model.b
+        qtf = 1
+        user_weight = (self._model.k_3 + 1) * qtf / (self._model.k_3 + qtf)
+
+        # Per-term constants, as QrySopScore calculates them.
+        rsj_weights = [CollectionStats.getIdf(t.getDf()) for t in terms]
+        lengthNorms = []
+        for t in terms:
+            avg_doclen = CollectionStats.getAvgFieldLength(t._field)
+            lengthNorms.append(self.__getLengthNorms(
+                t._field, LengthNorms.getBM25(t._field, k_1, b),
+                lambda doclen, avg_doclen=avg_doclen:
+                    k_1 * ((1 - b) + b * (doclen / avg_doclen))))
+
+        n = len(terms)
+        docids = [d for d, _ in postings]
+        tfs = [f for _, f in postings]
+        sizes = [len(d) for d in docids]
+        ptrs = [0] * n
+        current = [d[0] if len(d) > 0 else END for d in docids]
+
+        while True:
+            docid = min(current)
+            if docid == END:
+                break
+
+            scores = []
+            for i in range(n):
+                if current[i] == docid:
+                    p = ptrs[i]
+                    tf = tfs[i][p]
+                    tf_weight = tf / (tf + lengthNorms[i][docid])
+                    scores.append(rsj_weights[i] * tf_weight * user_weight)
+
+                    p += 1
+                    ptrs[i] = p
+                    current[i] = docids[i][p] if p < sizes[i] else END
+
+            score = sum(scores)
+            if score >= threshold:
+                heap.add(docid, score)
+                threshold = heap.getThreshold()
+
+
+    def __rankBooleanAnd(self, postings, heap):
+        """
+        Evaluate a flat Boolean #AND query.  A document's score is 1.0
+        (unranked) or the smallest tf of the terms (ranked).  Docids
+        are proposed by the shortest inverted list and checked in the
+        others with binary search.
+
+        postings: A list of (docids, tfs) for each term.
+        heap: A ResultHeap that stores the top documents.
+        """
+        threshold = heap.getThreshold()
+        ranked = isinstance(self._model, RetrievalModelRankedBoolean)
+        order = sorted(range(len(postings)), key=lambda i: len(postings[i][0]))
+        first, others = postings[order[0]], [postings[i] for i in order[1:]]
+        ptrs = [0] * len(others)
+
+        for p_0, docid in enumerate(first[0]):
+            matched = True
+            for j, (docids, _) in enumerate(others):
+                p = bisect_left(docids, docid, ptrs[j])
+                ptrs[j] = p
+                if p == len(docids):
+                    return
+                if docids[p] != docid:
+                    matched = False
+                    break
+
+            if not matched:
+                continue
+
+            if ranked:
+                score = min([first[1][p_0]] +
+                            [tfs[ptrs[j]] for j, (_, tfs) in enumerate(others)])
+            else:
+                score = 1.0
+
+            if score >= threshold:
+                heap.add(docid, score)
+                threshold = heap.getThreshold()
+
+
+    def __rankBooleanOr(self, postings, heap):
+        """
+        Evaluate a flat Boolean #OR query.  A document's score is 1.0
+        (unranked) or the largest tf of the terms that it contains
+        (ranked).
+
+        postings: A list of (docids, tfs) for each term.
+        heap: A ResultHeap that stores the top documents.
+        """
+        END = FlatEngine.END
+        threshold = heap.getThreshold()
+        ranked = isinstance(self._model, RetrievalModelRankedBoolean)
+
+        n = len(postings)
+        docids = [d for d, _ in postings]
+        tfs = [f for _, f in postings]
+        sizes = [len(d) for d in docids]
+        ptrs = [0] * n
+        current = [d[0] if len(d) > 0 else END for d in docids]
+
+        while True:
+            docid = min(current)
+            if docid == END:
+                break
+
+            score = 0
+            for i in range(n):
+                if current[i] == docid:
+                    p = ptrs[i]
+                    if ranked:
+                        score = max(score, tfs[i][p])
+
+                    p += 1
+                    ptrs[i] = p
+                    current[i] = docids[i][p] if p < sizes[i] else END
+
+            if not ranked:
+                score = 1.0
+
+            if score >= threshold:
+                heap.add(docid, score)
+                threshold = heap.getThreshold()
+
+
+    def __rankIndri(self, terms, postings, heap):
+        """
+        Evaluate a flat Indri #AND query.  Each document's score is the
+        geometric mean of the term scores, where terms that it doesn't
+        contain contribute their default scores.  If the model scores
+        in log space, the score is the mean of the logs of the term
+        scores.
+
+        terms: A list of QryIopTerm.
+        postings: A list of (docids, tfs) for each term.
+        heap: A ResultHeap that stores the top documents.
+        """
+        END = FlatEngine.END
+        threshold = heap.getThreshold()
+        mu = self._model.mu
+        Lambda = self._model.Lambda
+        logSpace = self._model.logSpace
+        logScore = QrySop.logScore
+        a = 1-Lambda
+
+        # Per-term constants, as QrySopScore calculates them.  Default
+        # scores give terms that have ctf=0 extra smoothing.
+        ms = []
+        cs = []
+        default_ms = []
+        default_cs = []
+        for t in terms:
+            ctf = t.getCtf()
+            pMLE = CollectionStats.getPMLE(t._field, ctf)
+            ms.append(mu*pMLE)
+            cs.append(Lambda*pMLE)
+            pMLE = CollectionStats.getPMLE(t._field, ctf if ctf != 0 else 0.5)
+            default_ms.append(0+mu*pMLE)
+            default_cs.append(Lambda*pMLE)
+        lengthNorms = [self.__getLengthNorms(t._field,
+                                             LengthNorms.getIndri(t._field, mu),
+                                             lambda lengthd: lengthd + mu)
+                       for t in terms]
+
+        n = len(terms)
+        power = 1/n
+        docids = [d for d, _ in postings]
+        tfs = [f for _, f in postings]
+        sizes = [len(d) for d in docids]
+        ptrs = [0] * n
+        current = [d[0] if len(d) > 0 else END for d in docids]
+
+        while True:
+            docid = min(current)
+            if docid == END:
+                break
+
+            scores = []
+            for i in range(n):
+                lengthNorm = lengthNorms[i][docid]
+
+                if current[i] == docid:
+                    p = ptrs[i]
+                    if lengthNorm == 0 and mu == 0:
+                        scores.append(0)
+                    else:
+                        scores.append(a*((tfs[i][p]+ms[i])/lengthNorm)+cs[i])
+
+                    p += 1
+                    ptrs[i] = p
+                    current[i] = docids[i][p] if p < sizes[i] else END
+                elif lengthNorm == 0 and mu == 0:
+                    scores.append(0)
+                else:
+                    scores.append(a*(default_ms[i]/lengthNorm)+default_cs[i])
+
+            if logSpace:
+                score = sum([logScore(p) for p in scores]) / n
+            else:
+                score = math.pow(math.prod(scores), power)
+            if score >= threshold:
+                heap.add(docid, score)
+                threshold = heap.getThreshold()
@@ -2,12 +2,15 @@
 
 # Copyright (c) 2023, Carnegie Mellon University.  All Rights Reserved.
 
+from array import array
 import gzip
 import os
 import sys
 
 import PyLu
 
+from CollectionStats import CollectionStats
+
 
 class Idx:
     """
@@ -32,9 +35,11 @@ class Idx:
     # read this information from a file and store it in Python
     # space for fast access.
     _ldc_eid = None
+    _ldc_eid_ranks = None
     _ldc_field_lengths = None
     _ldc_filename_doclengths = 'Idx.pycache.flength.gz'
     _ldc_filename_eids = 'Idx.pycache.eid.gz'
+    _ldc_min_field_lengths = {}
 
     _externalIdField = 'externalId'
     _JexternalIdField = PyLu.JString(_externalIdField)
@@ -162,8 +167,9 @@ class Idx:
     @staticmethod
     def close():
         """
-        Close the open index.
+        Close the open index.  New collection statistics are saved.
         """
+        CollectionStats.close()
         Idx.indexReader.close()
 
 
@@ -187,7 +193,7 @@ class Idx:
 
         fieldName: The name of a document field.
         """
-        return(Idx.indexReader.getDocCount(PyLu.JString(fieldName)))
+        return(CollectionStats.getDocCount(fieldName))
   
   
     @staticmethod
@@ -199,9 +205,7 @@ class Idx:
         fieldName: The name of a document field.
         term: A lexically-processed term that may appear in the corpus.
         """
-        b = PyLu.LBytesRef(PyLu.JString(term))
-        t = PyLu.LTerm(PyLu.JString(fieldName), b)
-        return(Idx.indexReader.docFreq(t))
+        return(CollectionStats.getDocFreq(fieldName, term))
 
 
     @staticmethod
@@ -219,6 +223,28 @@ class Idx:
         return(str(d.get(Idx._JexternalIdField)))
 
 
+    @staticmethod
+    def getExternalDocidRanks():
+        """
+        Get the rank of each document's external id in sorted order,
+        indexed by internal docid.  Comparing two documents' ranks
+        gives the same result as comparing their external ids.  The
+        ranks are memoized.
+
+        Returns an array of ranks, or None if external ids aren't
+        cached.
+        """
+        if Idx._ldc_eid_ranks is None and Idx._ldc_eid is not None:
+            eids = Idx._ldc_eid
+            ranks = array('i', bytes(4 * len(eids)))
+            for rank, iid in enumerate(sorted(range(len(eids)),
+                                              key=eids.__getitem__)):
+                ranks[iid] = rank
+            Idx._ldc_eid_ranks = ranks
+
+        return(Idx._ldc_eid_ranks)
+
+
     @staticmethod
     def getFields():
         """
@@ -270,6 +296,23 @@ class Idx:
         return(field_length)
 
 
+    @staticmethod
+    def getFieldLengths(fieldName):
+        """
+        Get the lengths of a field in all documents, indexed by internal
+        docid, from the Lucene data cache.
+
+        fieldName: The name of a document field.
+
+        Returns a list of field lengths, or None if the Lucene data
+        cache isn't available.
+        """
+        if Idx._ldc_field_lengths is None:
+            return(None)
+
+        return(Idx._ldc_field_lengths.get(fieldName))
+
+
     @staticmethod
     def getInternalDocid(docid):
         """
@@ -293,12 +336,31 @@ class Idx:
         raise Exception('External id should exist, but is not found.')
 
 
+    @staticmethod
+    def getMinFieldLength(fieldName):
+        """
+        Get the smallest length of a field in any document.  The value
+        is memoized.
+
+        fieldName: The name of a document field.
+
+        Returns the smallest field length, or 0 if field lengths aren't
+        cached.
+        """
+        if fieldName not in Idx._ldc_min_field_lengths:
+            lengths = Idx.getFieldLengths(fieldName)
+            Idx._ldc_min_field_lengths[fieldName] = (
+                min(lengths, default=0) if lengths is not None else 0)
+
+        return(Idx._ldc_min_field_lengths[fieldName])
+
+
     @staticmethod
     def getNumDocs():
         """
         Get the total number of documents in the corpus.
         """
-        return Idx.indexReader.numDocs()
+        return(CollectionStats.getNumDocs())
 
 
     @staticmethod
@@ -313,7 +375,7 @@ class Idx:
         Returns the total number of term occurrences.
 
         """
-        return(Idx.indexReader.getSumTotalTermFreq(PyLu.JString(fieldName)))
+        return(CollectionStats.getSumOfFieldLengths(fieldName))
 
 
     @staticmethod
@@ -341,9 +403,7 @@ class Idx:
 
         Returns the total number of term occurrence.
         """
-        b = PyLu.LBytesRef(PyLu.JString(term))
-        t = PyLu.LTerm(PyLu.JString(fieldName), b)
-        return(Idx.indexReader.totalTermFreq(t))
+        return(CollectionStats.getTotalTermFreq(fieldName, term))
 
 
     @staticmethod
@@ -368,11 +428,17 @@ class Idx:
             dr = PyLu.LDirectoryReader.open(fsd)
             Idx.indexReader = dr
             Idx.LeafContextCache.open(dr)
+            Idx._ldc_min_field_lengths = {}
+            Idx._ldc_eid_ranks = None
 
             if Idxpycache:
                 Idx.__get_cache_eids(index_path)
                 Idx.__get_cache_fieldlengths(index_path)
 
+            # Collection statistics are fetched from Lucene once, and
+            # saved with the Idx.pycache.xxx files.
+            CollectionStats.open(dr, index_path if Idxpycache else None)
+
             # Open the index for access by Java code
             PyLu.QjIdx.open(index_path)
 
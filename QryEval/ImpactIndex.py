@@ -0,0 +1,275 @@
+"""
+A persistent BM25 impact-ordered index, stored next to the
+Idx.pycache.* files.  It is used by the score-at-a-time evaluator.
+"""
+
+# Copyright (c) 2026, Carnegie Mellon University.  All Rights Reserved.
+
+import hashlib
+import math
+import os
+import struct
+
+# NumPy is optional.  It is needed only by the impact index.
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from CollectionStats import CollectionStats
+from Idx import Idx
+from InvList import InvList
+
+
+class ImpactIndex:
+    """
+    A persistent BM25 impact-ordered index.  Each posting stores a
+    quantized BM25 term score (its impact) instead of a tf, and a
+    term's postings are grouped into segments of equal impact, from
+    highest to lowest.  Docids are in increasing order within a
+    segment.
+
+    Impacts are integers from 1 to LEVELS.  The quantization step
+    depends only on the number of documents in the corpus, because
+    log((N+1)/1.5) is an upper bound on any BM25 term score when
+    qtf=1.  Thus impacts from different terms can be added, and
+    impact lists built by different runs are compatible.  LEVELS is
+    large (16 bits) because frequent terms have small scores that
+    8-bit impacts can't distinguish.
+
+    Each (field, term) impact list is stored in its own file in the
+    Idx.pycache.impacts directory.  A file has a fixed-size header,
+    a table of (impact, count) for each segment, and the docids of
+    each segment.  Files are tagged with the version of the Lucene
+    index and the BM25 k_1 and b parameters that they were built
+    with.  Files that don't match are rebuilt.
+
+    The index is disabled until open is called.
+    """
+
+    # -------------- Constants and static variables -------- #
+
+    LEVELS = 65535			# The number of impact levels
+
+    _dirname = 'Idx.pycache.impacts'
+
+    # magic, index version, k_1, b, levels, df, and number of segments.
+    _header = struct.Struct('<4sqddiii')
+    _magic = b'QEIX'
+
+    _path = None
+    _index_version = None
+
+
+    # -------------- Methods (alphabetical) ---------------- #
+
+    @staticmethod
+    def build(fieldString, termString, k_1, b):
+        """
+        Build the impact list for a term from the Lucene index and
+        store it.
+
+        fieldString: The name of a document field.
+        termString: A lexically-processed term.
+        k_1: The BM25 k_1 parameter.
+        b: The BM25 b parameter.
+
+        Returns a list of (impact, docids) segments in decreasing
+        impact order, where docids is a NumPy array.
+        """
+        invList = InvList(fieldString, termString, InvList.FREQS)
+        docids = np.frombuffer(invList.docids, dtype=np.intc)
+        tfs = np.frombuffer(invList.tfs, dtype=np.intc)
+
+        if invList.df == 0:
+            segments = []
+        else:
+            # The same calculation as QrySopScore, with qtf=1.
+            lengths = Idx.getFieldLengths(fieldString)
+            if lengths is not None:
+                lengths = np.array(lengths, dtype=np.int64)[docids]
+            else:
+                lengths = np.array([Idx.getFieldLength(fieldString, int(d))
+                                    for d in docids], dtype=np.int64)
+
+            rsj_weight = CollectionStats.getIdf(invList.df)
+            avg_doclen = CollectionStats.getAvgFieldLength(fieldString)
+            tf_weight = tfs / (tfs + k_1 * ((1 - b) + b * (lengths / avg_doclen)))
+            scores = rsj_weight * tf_weight
+
+            impacts = np.clip(np.rint(scores / ImpactIndex.getScale()),
+                              1, ImpactIndex.LEVELS).astype(np.intc)
+
+            # A stable sort keeps docids in order within each impact.
+            order = np.argsort(-impacts, kind='stable')
+            impacts, docids = impacts[order], docids[order]
+            levels, starts = np.unique(-impacts, return_index=True)
+            ends = list(starts[1:]) + [len(docids)]
+            segments = [(int(-level), docids[start:end])
+                        for level, start, end in zip(levels, starts, ends)]
+
+        ImpactIndex.__write(fieldString, termString, k_1, b,
+                            invList.df, segments)
+        return(segments)
+
+
+    @staticmethod
+    def __filename(fieldString, termString):
+        """Get the impact index filename for a (field, term) pair."""
+        key = f'{fieldString}\0{termString}'.encode('utf-8')
+        return(hashlib.sha1(key).hexdigest() + '.bin')
+
+
+    @staticmethod
+    def get(fieldString, termString, k_1, b):
+        """
+        Get the impact list for a term.  It is read from its file, or
+        built and stored if the file is missing or out of date.
+
+        fieldString: The name of a document field.
+        termString: A lexically-processed term.
+        k_1: The BM25 k_1 parameter.
+        b: The BM25 b parameter.
+
+        Returns a list of (impact, docids) segments in decreasing
+        impact order, where docids is a NumPy array.
+        """
+        segments = ImpactIndex.__read(fieldString, termString, k_1, b)
+
+        if segments is None:
+            segments = ImpactIndex.build(fieldString, termString, k_1, b)
+
+        return(segments)
+
+
+    @staticmethod
+    def getScale():
+        """
+        Get the quantization step, i.e., the BM25 score of one impact
+        level.
+        """
+        N = Idx.getNumDocs()
+        return(math.log((N+1)/1.5) / ImpactIndex.LEVELS)
+
+
+    @staticmethod
+    def isOpen():
+        """True iff the impact index is open, otherwise False."""
+        return(ImpactIndex._path is not None)
+
+
+    @staticmethod
+    def open(index_path):
+        """
+        Open (or create) the impact index.  This must be done after
+        the index is opened.
+
+        index_path: The directory that contains the Idx.pycache.impacts
+          directory, usually the index directory.
+
+        Returns True if the impact index was opened, otherwise False.
+        """
+        if np is None:
+            raise Exception('Error: The impact index needs NumPy.')
+
+        path = os.path.join(index_path, ImpactIndex._dirname)
+
+        try:
+            os.makedirs(path, exist_ok=True)
+        except Exception as e:
+            print('Cannot open impact index', path)
+            print(str(e))
+            return(False)
+
+        ImpactIndex._path = path
+        ImpactIndex._index_version = Idx.indexReader.getVersion()
+        return(True)
+
+
+    @staticmethod
+    def __read(fieldString, termString, k_1, b):
+        """
+        Read the impact list for a term from its file.
+
+        fieldString: The name of a document field.
+        termString: A lexically-processed term.
+        k_1: The BM25 k_1 parameter.
+        b: The BM25 b parameter.
+
+        Returns a list of (impact, docids) segments, or None if the
+        file is missing or out of date.
+        """
+        if ImpactIndex._path is None:
+            return(None)
+
+        filename = ImpactIndex.__filename(fieldString, termString)
+        path = os.path.join(ImpactIndex._path, filename)
+        header = ImpactIndex._header
+
+        try:
+            with open(path, 'rb') as f:
+                buf = f.read()
+            (magic, version, file_k_1, file_b, levels,
+             df, count) = header.unpack_from(buf, 0)
+        except (OSError, struct.error):
+            return(None)
+
+        if (magic != ImpactIndex._magic or
+            version != ImpactIndex._index_version or
+            file_k_1 != k_1 or file_b != b or
+            levels != ImpactIndex.LEVELS):
+            return(None)
+
+        table = np.frombuffer(buf, dtype=np.intc, count=2*count,
+                              offset=header.size)
+        docids = np.frombuffer(buf, dtype=np.intc, count=df,
+                               offset=header.size + table.nbytes)
+
+        segments = []
+        start = 0
+        for impact, n in table.reshape(-1, 2):
+            segments.append((int(impact), docids[start:start+n]))
+            start += n
+
+        return(segments)
+
+
+    @staticmethod
+    def __write(fieldString, termString, k_1, b, df, segments):
+        """
+        Store the impact list for a term in its file.
+
+        fieldString: The name of a document field.
+        termString: A lexically-processed term.
+        k_1: The BM25 k_1 parameter.
+        b: The BM25 b parameter.
+        df: The number of postings.
+        segments: A list of (impact, docids) segments.
+        """
+        if ImpactIndex._path is None:
+            return
+
+        header = ImpactIndex._header.pack(
+            ImpactIndex._magic, ImpactIndex._index_version, k_1, b,
+            ImpactIndex.LEVELS, df, len(segments))
+        table = np.array([(impact, len(docids))
+                          for impact, docids in segments],
+                         dtype=np.intc)
+
+        # Write to a temporary file and rename it, so that concurrent
+        # runs never see a partial file.
+        filename = ImpactIndex.__filename(fieldString, termString)
+        path = os.path.join(ImpactIndex._path, filename)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(header)
+                f.write(table.tobytes())
+                for _, docids in segments:
+                    f.write(np.ascontiguousarray(docids,
+                                                 dtype=np.intc).tobytes())
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print('Cannot write impact index file', path)
+            print(str(e))
@@ -294,11 +294,13 @@ def listPostings (term, field, n=None):
 
     count = 0
 
-    for posting in inv_list.postings:
+    for i in range(0, inv_list.df):
         count += 1
         if count > n:
             break
 
+        posting = inv_list.getPosting(i)
+
         print(f'\tdocid: {posting.docid}')
         print(f'\ttf: {posting.tf}')
         positions = [str(p) for p in posting.positions]
@@ -5,9 +5,14 @@ list datatype is intended to be simpler to use than Lucene's.
 
 # Copyright (c) 2023, Carnegie Mellon University.  All Rights Reserved.
 
+import itertools
 import sys
 
+from array import array
+from bisect import bisect_left, bisect_right
+
 from Idx import Idx
+from PostingsCache import PostingsCache
 import PyLu
 
 
@@ -15,8 +20,33 @@ class InvList:
     """
     Create, access, and manipulate inverted lists.  This inverted
     list datatype is intended to be simpler to use than Lucene's.
+
+    Postings are stored in typed arrays instead of one Python object
+    per posting.  docids[n] and tfs[n] describe the n'th posting.  The
+    positions of all postings are stored in one flat positions array;
+    the positions of the n'th posting are
+    positions[offsets[n]:offsets[n+1]].
     """
 
+    # -------------- Constants and variables --------------- #
+
+    # Postings modes.  A list that no proximity operator consumes does
+    # not need locations, and some retrieval models don't need term
+    # frequencies either, so fewer values are fetched from Lucene.
+    DOCS = 'docs'		# docids; tfs are not needed
+    FREQS = 'freqs'		# docids and tfs
+    POSITIONS = 'positions'	# docids, tfs, and locations
+
+    _modeRank = { DOCS: 0, FREQS: 1, POSITIONS: 2 }
+
+    # Lucene PostingsEnum flags for each postings mode.
+    _luceneFlags = { DOCS: PyLu.LPostingsEnum.NONE,
+                     FREQS: PyLu.LPostingsEnum.FREQS,
+                     POSITIONS: PyLu.LPostingsEnum.POSITIONS }
+
+    # The number of postings in each block of getBlockMetadata.
+    BLOCK_SIZE = 128
+
     # ----------------- Nested classes --------------------- #
 
     class DocPosting:
@@ -25,41 +55,133 @@ class InvList:
 
         docid: An internal document id (an integer).
         locations: A list of document locations.
+        tf: The term frequency, if the locations aren't stored.
         """
 
-        def __init__(self, d, locations):
+        def __init__(self, d, locations, tf=None):
             self.docid = d
-            self.tf = len(locations)
+            self.tf = len(locations) if tf is None else tf
             self.positions = locations
 
 
     # -------------- Methods (alphabetical) ---------------- #
 
-    def __init__(self, fieldString, termString=None):
+    def __init__(self, fieldString, termString=None,
+                 postingsMode=POSITIONS):
         """
         If no TermString is provided, return an empty inverted list.
         Otherwise return an inverted list from the index.
 
         fieldString: The name of a document field.
         termString: A lexically-processed term that may be in the corpus.
+        postingsMode: InvList.POSITIONS, InvList.FREQS, or InvList.DOCS.
         """
 
         # Object initialization
         self._field = fieldString
         self.ctf = 0
         self.df = 0
-        self.postings = []
+        self.postingsMode = postingsMode
+        self.docids = array('i')
+        self.tfs = array('i')
+        self.offsets = array('q', [0])
+        self.positions = array('i')
+        self._maxTf = None		# Memoized by getMaxTf
+        self._minFieldLength = None	# Memoized by getMinFieldLength
+        self._blockMetadata = None	# Memoized by getBlockMetadata
 
         if termString is None:
             return
 
+        # The postings cache is fastest, so check it first.
+        if PostingsCache.read(self, termString):
+            return
+
         # Prepare to access the index.
         termBytes = PyLu.LBytesRef(PyLu.JString(termString))
         term = PyLu.LTerm(PyLu.JString(fieldString), termBytes)
 
         if Idx.indexReader.docFreq(term) < 1:
+            PostingsCache.write(self, termString)
             return
 
+        if postingsMode == InvList.POSITIONS:
+            self.__readPostingsPositions(term)
+        elif postingsMode == InvList.FREQS:
+            self.__readPostingsFreqs(term)
+        else:
+            self.__readPostingsDocs(term)
+
+        self.df = len(self.docids)
+        PostingsCache.write(self, termString)
+
+
+    def __readPostingsDocs(self, term):
+        """
+        Read docids from the index.  Lucene doesn't decode frequencies,
+        so each tf is 1, and the ctf comes from the term dictionary.
+
+        term: A Lucene Term.
+        """
+
+        docids = self.docids
+        NO_MORE_DOCS = PyLu.LDocIdSetIterator.NO_MORE_DOCS
+
+        for context in Idx.indexReader.leaves():
+
+            postings = context.reader().postings(term,
+                                                  PyLu.LPostingsEnum.NONE)
+
+            if postings != None:
+                docBase = context.docBase
+
+                while postings.nextDoc() != NO_MORE_DOCS:
+                    docids.append(docBase + postings.docID())
+
+        self.tfs = array('i', [1]) * len(docids)
+        self.ctf = Idx.indexReader.totalTermFreq(term)
+
+
+    def __readPostingsFreqs(self, term):
+        """
+        Read docids and term frequencies from the index.
+
+        term: A Lucene Term.
+        """
+
+        docids = self.docids
+        tfs = self.tfs
+        NO_MORE_DOCS = PyLu.LDocIdSetIterator.NO_MORE_DOCS
+
+        for context in Idx.indexReader.leaves():
+
+            postings = context.reader().postings(term,
+                                                  PyLu.LPostingsEnum.FREQS)
+
+            if postings != None:
+                docBase = context.docBase
+
+                while postings.nextDoc() != NO_MORE_DOCS:
+                    tf = postings.freq()
+                    docids.append(docBase + postings.docID())
+                    tfs.append(tf)
+                    self.ctf += tf
+
+
+    def __readPostingsPositions(self, term):
+        """
+        Read docids, term frequencies, and locations from the index.
+
+        term: A Lucene Term.
+        """
+
+        # Local references avoid attribute lookups in the inner loop.
+        docids = self.docids
+        tfs = self.tfs
+        offsets = self.offsets
+        positions = self.positions
+        NO_MORE_DOCS = PyLu.LDocIdSetIterator.NO_MORE_DOCS
+
         # Lucene indexes have segments, so postings must be retrieved
         # from each segment.  Some segments may have no postings.
         for context in Idx.indexReader.leaves():
@@ -74,17 +196,17 @@ class InvList:
                 # operators such as #SYN and #NEAR/n to be insulated from the
                 # details of Lucene inverted list implementations.
 
-                while postings.nextDoc() != PyLu.LDocIdSetIterator.NO_MORE_DOCS:
-                    docid = context.docBase + postings.docID()
+                docBase = context.docBase
+
+                while postings.nextDoc() != NO_MORE_DOCS:
                     tf = postings.freq()
-                    positions = [ None ] * tf
+                    docids.append(docBase + postings.docID())
+                    tfs.append(tf)
 
                     for j in range(0, tf):
-                        positions[j] = postings.nextPosition();
+                        positions.append(postings.nextPosition())
 
-                    posting = InvList.DocPosting(docid, positions) 
-                    self.postings.append(posting)
-                    self.df += 1
+                    offsets.append(len(positions))
                     self.ctf += tf
 
 
@@ -94,11 +216,12 @@ class InvList:
         s = '\tdf:  {}\n\tctf:  {}\n'.format(self.df, self.ctf)
 
         for i in range(0, self.df):
+            posting = self.getPosting(i)
             s += '\tdocid: {}\n\ttf: {}\n\tPositions: '.format(
-                self.postings[i].docid,
-                self.postings[i].tf)
-            for j in range(0, len(self.postings[i].positions)):
-                s += '{} '.format(self.postings[i].positions[j])
+                posting.docid,
+                posting.tf)
+            for p in posting.positions:
+                s += '{} '.format(p)
             s += '\n'
 
         return s
@@ -110,10 +233,11 @@ class InvList:
         s = 'df: {}, ctf: {}\n'.format(self.df, self.ctf)
 
         for i in range(0, self.df):
+            posting = self.getPosting(i)
             s += 'docid: {}, tf: {}, locs: {}\n'.format(
-                self.postings[i].docid,
-                self.postings[i].tf,
-                str(self.postings[i].positions))
+                posting.docid,
+                posting.tf,
+                str(posting.positions.tolist()))
 
         return s
 
@@ -132,17 +256,147 @@ class InvList:
         # A posting can only be appended if its docid is greater than
         # the last docid.
 
-        if ((self.df > 1) and
-            (self.postings[self.df-1].docid >= docid)):
+        if ((self.df > 0) and
+            (self.docids[self.df-1] >= docid)):
             return False
 
-        p = InvList.DocPosting(docid, positions)
-        self.postings.append(p)
+        self.docids.append(docid)
+        self.tfs.append(len(positions))
+        self.positions.extend(positions)
+        self.offsets.append(len(self.positions))
         self.df += 1
-        self.ctf += p.tf
+        self.ctf += len(positions)
+        self._maxTf = None
+        self._minFieldLength = None
+        self._blockMetadata = None
         return True
 
 
+    def appendPostings(self, docids, tfs, positions=None):
+        """
+        Append several postings to the posting list.  This is faster
+        than calling appendPosting for each posting.  Postings must be
+        appended in docid order, otherwise this method fails.
+
+        docids: A list of increasing internal document ids.
+        tfs: A list of the number of locations in each posting.
+        positions: A list of the locations of all of the postings, or
+          None if the inverted list doesn't store locations.
+
+        Returns True if the postings were added, otherwise False.
+        """
+        if len(docids) == 0:
+            return True
+
+        if ((self.df > 0) and
+            (self.docids[self.df-1] >= docids[0])):
+            return False
+
+        self.docids.extend(docids)
+        self.tfs.extend(tfs)
+        self.df += len(docids)
+        self.ctf += sum(tfs)
+
+        # Lists that aren't in POSITIONS mode store only counts.
+        if self.postingsMode == InvList.POSITIONS:
+            self.positions.extend(positions)
+            self.offsets.extend(itertools.islice(
+                itertools.accumulate(tfs, initial=self.offsets[-1]), 1, None))
+
+        self._maxTf = None
+        self._minFieldLength = None
+        self._blockMetadata = None
+        return True
+
+
+    def findDocid(self, docid, n=0):
+        """
+        Find the first posting at or after the n'th posting whose docid
+        is at least docid.  This is a binary search, so skipping over
+        many postings is cheap.
+
+        docid: An internal document id (an integer).
+        n: An integer from 0 to df that indicates where to start.
+
+        Returns an integer from n to df.
+        """
+        # The most common case is that the n'th posting matches.
+        if n >= self.df or self.docids[n] >= docid:
+            return(n)
+
+        return(bisect_left(self.docids, docid, n + 1, self.df))
+
+
+    def findDocidPast(self, docid, n=0):
+        """
+        Find the first posting at or after the n'th posting whose docid
+        is greater than docid.
+
+        docid: An internal document id (an integer).
+        n: An integer from 0 to df that indicates where to start.
+
+        Returns an integer from n to df.
+        """
+        if n >= self.df or self.docids[n] > docid:
+            return(n)
+
+        return(bisect_right(self.docids, docid, n + 1, self.df))
+
+
+    def findLocationPast(self, n, loc, j=0):
+        """
+        Find the first location at or after the j'th location of the
+        n'th document whose value is greater than loc.
+
+        n: An integer from 0 to df-1 that indicates which document
+           in the inverted list.
+        loc: A document location.
+        j: An integer from 0 to tf that indicates where to start.
+
+        Returns an integer from j to tf.
+        """
+        base = self.offsets[n]
+        end = self.offsets[n+1]
+
+        if base + j >= end or self.positions[base + j] > loc:
+            return(j)
+
+        return(bisect_right(self.positions, loc, base + j + 1, end) - base)
+
+
+    def getBlockMetadata(self):
+        """
+        Get metadata for consecutive blocks of BLOCK_SIZE postings: the
+        last docid, the largest tf, and the smallest field length in
+        each block.  Retrieval models use it to bound the scores of
+        the documents in a block.  The value is memoized, so it is
+        cheap for cached inverted lists.
+
+        Returns a tuple of three arrays (last docids, largest tfs,
+        smallest field lengths), or None if it isn't known.  Field
+        lengths are 0 if they aren't cached.
+        """
+        if self._blockMetadata is None:
+            lengths = Idx.getFieldLengths(self._field)
+            blockLast = array('i')
+            blockMaxTf = array('i')
+            blockMinLength = array('i')
+
+            for b in range(0, self.df, InvList.BLOCK_SIZE):
+                e = min(b + InvList.BLOCK_SIZE, self.df)
+                blockLast.append(self.docids[e-1])
+                blockMaxTf.append(max(self.tfs[b:e]))
+                if lengths is None:
+                    blockMinLength.append(0)
+                else:
+                    blockMinLength.append(
+                        min(map(lengths.__getitem__, self.docids[b:e])))
+
+            self._blockMetadata = (blockLast, blockMaxTf, blockMinLength)
+
+        return(self._blockMetadata)
+
+
     def getDocid(self, n):
         """
         Get the n'th document id from the inverted list.
@@ -152,7 +406,102 @@ class InvList:
 
         Returns the internal docid of the n'th document.
         """
-        return(self.postings[n].docid)
+        return(self.docids[n])
+
+
+    def getLocation(self, n, j):
+        """
+        Get the j'th location of the n'th document in the inverted list.
+        This does not copy the document's locations.
+
+        n: An integer from 0 to df-1 that indicates which document
+           in the inverted list.
+        j: An integer from 0 to tf-1 that indicates which location
+           in the document.
+
+        Returns the j'th location of the n'th document.
+        """
+        return(self.positions[self.offsets[n] + j])
+
+
+    def getMaxTf(self):
+        """
+        Get the largest term frequency in the inverted list.  The value
+        is memoized, so it is cheap for cached inverted lists.
+
+        Returns the largest tf, or None if it isn't known.
+        """
+        if self._maxTf is None:
+            self._maxTf = max(self.tfs, default=0)
+
+        return(self._maxTf)
+
+
+    def getMinFieldLength(self):
+        """
+        Get the smallest length of the inverted list's field in any
+        document in the inverted list.  The value is memoized.
+
+        Returns the smallest field length, or 0 if field lengths aren't
+        cached or the inverted list is empty.
+        """
+        if self._minFieldLength is None:
+            lengths = Idx.getFieldLengths(self._field)
+
+            if lengths is None or self.df == 0:
+                self._minFieldLength = 0
+            else:
+                self._minFieldLength = min(map(lengths.__getitem__,
+                                               self.docids))
+
+        return(self._minFieldLength)
+
+
+    def getPositions(self, n):
+        """
+        Get the locations of the n'th document in the inverted list.
+
+        n: An integer from 0 to df-1 that indicates which document
+           in the inverted list.
+
+        Returns an array of document locations.
+        """
+        if self.postingsMode != InvList.POSITIONS:
+            raise Exception('The inverted list does not store locations.')
+
+        return(self.positions[self.offsets[n]:self.offsets[n+1]])
+
+
+    def getPosting(self, n):
+        """
+        Get the n'th posting as a DocPosting object.  This is a
+        convenience for code that prefers objects to arrays; it
+        creates a new object each time it is called.
+
+        n: An integer from 0 to df-1 that indicates which document
+           in the inverted list.
+
+        Returns a DocPosting.  Its positions are empty if the inverted
+        list doesn't store locations.
+        """
+        if self.postingsMode != InvList.POSITIONS:
+            return(InvList.DocPosting(self.getDocid(n), array('i'),
+                                      self.getTf(n)))
+
+        return(InvList.DocPosting(self.getDocid(n), self.getPositions(n)))
+
+
+    def getSizeInBytes(self):
+        """
+        Get the approximate amount of memory used by the inverted list.
+
+        Returns the size in bytes.
+        """
+        size = 0
+        for a in (self.docids, self.tfs, self.offsets, self.positions):
+            size += len(a) * a.itemsize
+
+        return(size)
 
 
     def getTf(self, n):
@@ -164,5 +513,17 @@ class InvList:
 
         Returns the term frequency in the n'th document.
         """
-        return(self.postings[n].tf)
+        return(self.tfs[n])
+
+
+    def providesMode(self, postingsMode):
+        """
+        Indicate whether the inverted list has the information that a
+        postings mode needs, e.g., a POSITIONS list provides FREQS.
 
+        postingsMode: InvList.POSITIONS, InvList.FREQS, or InvList.DOCS.
+
+        Returns True if the inverted list provides the postings mode.
+        """
+        return(InvList._modeRank[self.postingsMode] >=
+               InvList._modeRank[postingsMode])
@@ -0,0 +1,111 @@
+"""
+An in-memory, least-recently-used cache of inverted lists that is
+shared by all of the queries in a run.
+"""
+
+# Copyright (c) 2026, Carnegie Mellon University.  All Rights Reserved.
+
+from collections import OrderedDict
+
+
+class InvListCache:
+    """
+    An in-memory, least-recently-used cache of InvList objects, keyed
+    by (field, term), with a budget in bytes.  Queries often share
+    terms, so a term's inverted list is read from the index once and
+    reused by later queries.
+
+    Cached inverted lists are shared, so they must not be modified.
+    QryIop operators keep their iterator positions in the operator,
+    not in the InvList, so several operators (in the same query or
+    in different queries) can iterate over one InvList.
+
+    The cache is disabled until open is called.
+    """
+
+    # -------------- Constants and static variables -------- #
+
+    _cache = OrderedDict()	# (field, term) -> InvList
+    _max_bytes = 0
+    _total_bytes = 0
+
+    hits = 0
+    misses = 0
+
+
+    # -------------- Methods (alphabetical) ---------------- #
+
+    @staticmethod
+    def get(fieldString, termString, postingsMode):
+        """
+        Get an inverted list from the cache.
+
+        fieldString: The name of a document field.
+        termString: A lexically-processed term.
+        postingsMode: InvList.POSITIONS, InvList.FREQS, or InvList.DOCS.
+
+        Returns the cached InvList, or None.
+        """
+        if InvListCache._max_bytes <= 0:
+            return(None)
+
+        key = (fieldString, termString)
+        invList = InvListCache._cache.get(key)
+
+        # A cached inverted list can serve any request that needs the
+        # same or less information.
+        if invList is None or not invList.providesMode(postingsMode):
+            InvListCache.misses += 1
+            return(None)
+
+        InvListCache.hits += 1
+        InvListCache._cache.move_to_end(key)
+        return(invList)
+
+
+    @staticmethod
+    def isOpen():
+        """True iff the cache is open, otherwise False."""
+        return(InvListCache._max_bytes > 0)
+
+
+    @staticmethod
+    def open(max_megabytes):
+        """
+        Open (or reset) the cache.
+
+        max_megabytes: The maximum size of the cache, in megabytes.
+        """
+        InvListCache._cache = OrderedDict()
+        InvListCache._max_bytes = int(max_megabytes * 1024 * 1024)
+        InvListCache._total_bytes = 0
+        InvListCache.hits = 0
+        InvListCache.misses = 0
+
+
+    @staticmethod
+    def put(termString, invList):
+        """
+        Store an inverted list in the cache.  The least recently used
+        inverted lists are discarded to stay within the budget.
+
+        termString: A lexically-processed term.
+        invList: An InvList read from the index.
+        """
+        size = invList.getSizeInBytes()
+
+        if size > InvListCache._max_bytes:
+            return			# Too large to cache
+
+        key = (invList._field, termString)
+        old = InvListCache._cache.pop(key, None)
+
+        if old is not None:
+            InvListCache._total_bytes -= old.getSizeInBytes()
+
+        InvListCache._cache[key] = invList
+        InvListCache._total_bytes += size
+
+        while InvListCache._total_bytes > InvListCache._max_bytes:
+            _, lru = InvListCache._cache.popitem(last=False)
+            InvListCache._total_bytes -= lru.getSizeInBytes()
@@ -0,0 +1,514 @@
+"""
+A compressed inverted list.  Postings are delta-encoded and packed
+into fixed-size blocks that are decoded one block at a time.
+"""
+
+# Copyright (c) 2026, Carnegie Mellon University.  All Rights Reserved.
+
+import itertools
+import operator
+import struct
+
+from array import array
+from bisect import bisect_left, bisect_right
+
+from InvList import InvList
+
+
+class InvListCompressed(InvList):
+    """
+    A compressed, read-only inverted list with the same access methods
+    as InvList.  Postings are stored in blocks of BLOCK_SIZE postings.
+    Each block stores docid gaps, tfs, and position gaps (the first
+    position of each document is stored as is), and each of those
+    sections is packed with the smallest width (1, 2, or 4 bytes) that
+    holds its largest value.  The packed sections are decoded with
+    array.frombytes, which is much faster in Python than varint
+    decoding.
+
+    Skip data (the last docid and the byte offset of each block) lets
+    findDocid jump over blocks without decoding them.  Only one block
+    is decoded at a time, and its positions are decoded only if a
+    location is requested.
+
+    The bytes produced by toBytes are also the wire format for
+    shipping inverted lists between processes; pickling uses it.
+    """
+
+    # -------------- Constants and variables --------------- #
+
+    BLOCK_SIZE = 128
+
+    # Inverted lists with at least this many postings are compressed
+    # by QryIopTerm.  None disables compression.
+    minDf = None
+
+    _header = struct.Struct('<4siiiqi')	# magic, mode, df, blocks, ctf, field
+    _magic = b'QEIC'
+    _modes = [InvList.DOCS, InvList.FREQS, InvList.POSITIONS]
+    _typecodes = {1: 'B', 2: 'H', 4: 'I'}
+
+
+    # -------------- Methods (alphabetical) ---------------- #
+
+    def __init__(self, invList=None):
+        """
+        Compress an inverted list.  If no inverted list is provided,
+        return an empty compressed inverted list.
+
+        invList: An InvList.
+        """
+        InvList.__init__(self, None if invList is None else invList._field,
+                         None,
+                         InvList.POSITIONS if invList is None else
+                         invList.postingsMode)
+
+        # The compressed list doesn't use the InvList arrays.
+        self.docids = None
+        self.tfs = None
+        self.offsets = None
+        self.positions = None
+
+        self._data = b''
+        self._blockLast = array('i')	# Last docid in each block
+        self._blockStart = array('q', [0])	# Byte offset of each block
+        self.__clearBlock()
+
+        if invList is None:
+            return
+
+        self.df = invList.df
+        self.ctf = invList.ctf
+        blocks = []
+        start = 0
+
+        for b in range(0, self.df, InvListCompressed.BLOCK_SIZE):
+            e = min(b + InvListCompressed.BLOCK_SIZE, self.df)
+            prev = invList.docids[b-1] if b > 0 else 0
+            block = self.__encodeBlock(invList, b, e, prev)
+            blocks.append(block)
+            start += len(block)
+            self._blockLast.append(invList.docids[e-1])
+            self._blockStart.append(start)
+
+        self._data = b''.join(blocks)
+
+
+    def __reduce__(self):
+        """Pickle compressed inverted lists in their wire format."""
+        return(InvListCompressed.fromBytes, (self.toBytes(),))
+
+
+    def __clearBlock(self):
+        """Forget the decoded block."""
+        self._curBlock = -1
+        self._curBase = 0		# Index of the block's first posting
+        self._curDocids = None
+        self._curTfs = None
+        self._curOffsets = None
+        self._curPositions = None
+        self._curPositionStart = 0	# Byte offset of the position section
+        self._curPositionWidth = 0
+
+
+    def __decodeBlock(self, block):
+        """
+        Decode the docids and tfs of a block, which becomes the
+        current block.  Its positions are decoded on demand.
+
+        block: The index of the block.
+        """
+        data = self._data
+        start = self._blockStart[block]
+        n = min(InvListCompressed.BLOCK_SIZE,
+                self.df - block * InvListCompressed.BLOCK_SIZE)
+        docWidth, tfWidth, positionWidth = data[start:start+3]
+        start += 3
+
+        gaps = array(InvListCompressed._typecodes[docWidth])
+        gaps.frombytes(data[start:start + n * docWidth])
+        start += n * docWidth
+        prev = self._blockLast[block-1] if block > 0 else 0
+        docids = array('i', itertools.accumulate(gaps, initial=prev))
+        del docids[0]
+
+        packed = array(InvListCompressed._typecodes[tfWidth])
+        packed.frombytes(data[start:start + n * tfWidth])
+        tfs = array('i', packed)
+        start += n * tfWidth
+
+        self._curBlock = block
+        self._curBase = block * InvListCompressed.BLOCK_SIZE
+        self._curDocids = docids
+        self._curTfs = tfs
+        self._curOffsets = None
+        self._curPositions = None
+        self._curPositionStart = start
+        self._curPositionWidth = positionWidth
+
+
+    def __decodePositions(self):
+        """Decode the positions of the current block."""
+        tfs = self._curTfs
+        offsets = array('q', itertools.accumulate(tfs, initial=0))
+        start = self._curPositionStart
+        width = self._curPositionWidth
+        gaps = array(InvListCompressed._typecodes[width])
+        gaps.frombytes(self._data[start:start + offsets[-1] * width])
+
+        # Positions restart in each document.
+        positions = array('i')
+        for i in range(len(tfs)):
+            positions.extend(
+                itertools.accumulate(gaps[offsets[i]:offsets[i+1]]))
+
+        self._curOffsets = offsets
+        self._curPositions = positions
+
+
+    @staticmethod
+    def __encodeBlock(invList, b, e, prev):
+        """
+        Encode postings b to e-1 of an inverted list as one block.
+
+        invList: An InvList.
+        b: The index of the first posting in the block.
+        e: The index after the last posting in the block.
+        prev: The docid before the block (0 for the first block).
+
+        Returns the encoded block.
+        """
+        docids = invList.docids[b:e]
+        gaps = array('i', map(operator.sub, docids,
+                              itertools.chain((prev,), docids)))
+
+        tfs = invList.tfs[b:e]
+
+        positionGaps = array('i')
+        if invList.postingsMode == InvList.POSITIONS:
+            for n in range(b, e):
+                p = invList.getPositions(n)
+                positionGaps.extend(map(operator.sub, p,
+                                        itertools.chain((0,), p)))
+
+        widths = []
+        sections = []
+        for values in (gaps, tfs, positionGaps):
+            width, packed = InvListCompressed.__pack(values)
+            widths.append(width)
+            sections.append(packed)
+
+        return(bytes(widths) + b''.join(sections))
+
+
+    def __getBlock(self, n):
+        """Make the block that contains the n'th posting current."""
+        block = n // InvListCompressed.BLOCK_SIZE
+        if block != self._curBlock:
+            self.__decodeBlock(block)
+
+
+    def __getStatistics(self):
+        """Memoize the statistics of the decoded postings."""
+        invList = self.decompress()
+        self._maxTf = invList.getMaxTf()
+        self._minFieldLength = invList.getMinFieldLength()
+        self._blockMetadata = invList.getBlockMetadata()
+
+
+    @staticmethod
+    def __pack(values):
+        """
+        Pack non-negative integers with the smallest width that holds
+        the largest one.
+
+        values: An array of non-negative integers.
+
+        Returns a tuple of (width, packed bytes).
+        """
+        largest = max(values) if len(values) > 0 else 0
+
+        if largest < 1 << 8:
+            width = 1
+        elif largest < 1 << 16:
+            width = 2
+        else:
+            width = 4
+
+        return((width,
+                array(InvListCompressed._typecodes[width], values).tobytes()))
+
+
+    def appendPosting(self, docid, positions):
+        """Compressed inverted lists are read-only."""
+        raise Exception('Compressed inverted lists cannot be modified.')
+
+
+    def decompress(self):
+        """
+        Decode all of the postings.
+
+        Returns an InvList.
+        """
+        invList = InvList(self._field, None, self.postingsMode)
+
+        for block in range(len(self._blockLast)):
+            self.__decodeBlock(block)
+            invList.docids.extend(self._curDocids)
+            invList.tfs.extend(self._curTfs)
+            if self.postingsMode == InvList.POSITIONS:
+                self.__decodePositions()
+                invList.positions.extend(self._curPositions)
+
+        if self.postingsMode == InvList.POSITIONS:
+            invList.offsets = array('q', itertools.accumulate(invList.tfs,
+                                                              initial=0))
+
+        invList.df = self.df
+        invList.ctf = self.ctf
+        self.__clearBlock()
+        return(invList)
+
+
+    def findDocid(self, docid, n=0):
+        """
+        Find the first posting at or after the n'th posting whose docid
+        is at least docid.  Blocks that end before docid are skipped
+        without being decoded.
+
+        docid: An internal document id (an integer).
+        n: An integer from 0 to df that indicates where to start.
+
+        Returns an integer from n to df.
+        """
+        if n >= self.df:
+            return(n)
+
+        BLOCK_SIZE = InvListCompressed.BLOCK_SIZE
+        block = bisect_left(self._blockLast, docid, n // BLOCK_SIZE)
+
+        if block >= len(self._blockLast):
+            return(self.df)
+
+        if block != self._curBlock:
+            self.__decodeBlock(block)
+
+        lo = max(n - self._curBase, 0)
+        return(self._curBase + bisect_left(self._curDocids, docid, lo))
+
+
+    def findDocidPast(self, docid, n=0):
+        """
+        Find the first posting at or after the n'th posting whose docid
+        is greater than docid.
+
+        docid: An internal document id (an integer).
+        n: An integer from 0 to df that indicates where to start.
+
+        Returns an integer from n to df.
+        """
+        if n >= self.df:
+            return(n)
+
+        BLOCK_SIZE = InvListCompressed.BLOCK_SIZE
+        block = bisect_right(self._blockLast, docid, n // BLOCK_SIZE)
+
+        if block >= len(self._blockLast):
+            return(self.df)
+
+        if block != self._curBlock:
+            self.__decodeBlock(block)
+
+        lo = max(n - self._curBase, 0)
+        return(self._curBase + bisect_right(self._curDocids, docid, lo))
+
+
+    def findLocationPast(self, n, loc, j=0):
+        """
+        Find the first location at or after the j'th location of the
+        n'th document whose value is greater than loc.
+
+        n: An integer from 0 to df-1 that indicates which document
+           in the inverted list.
+        loc: A document location.
+        j: An integer from 0 to tf that indicates where to start.
+
+        Returns an integer from j to tf.
+        """
+        self.__getBlock(n)
+        if self._curPositions is None:
+            self.__decodePositions()
+
+        i = n - self._curBase
+        base = self._curOffsets[i]
+        end = self._curOffsets[i+1]
+        return(bisect_right(self._curPositions, loc, base + j, end) - base)
+
+
+    @staticmethod
+    def fromBytes(buf):
+        """
+        Create a compressed inverted list from its wire format.
+
+        buf: Bytes produced by toBytes.
+
+        Returns an InvListCompressed.
+        """
+        header = InvListCompressed._header
+        magic, mode, df, blocks, ctf, fieldLength = header.unpack_from(buf, 0)
+
+        if magic != InvListCompressed._magic:
+            raise Exception('Not a compressed inverted list.')
+
+        start = header.size
+        field = bytes(buf[start:start + fieldLength]).decode('utf-8')
+        start += fieldLength
+
+        invList = InvListCompressed()
+        invList._field = field
+        invList.postingsMode = InvListCompressed._modes[mode]
+        invList.df = df
+        invList.ctf = ctf
+        invList._blockLast.frombytes(buf[start:start + 4 * blocks])
+        start += 4 * blocks
+        invList._blockStart = array('q')
+        invList._blockStart.frombytes(buf[start:start + 8 * (blocks + 1)])
+        start += 8 * (blocks + 1)
+        invList._data = bytes(buf[start:])
+
+        return(invList)
+
+
+    def getBlockMetadata(self):
+        """
+        Get metadata for consecutive blocks of InvList.BLOCK_SIZE
+        postings: the last docid, the largest tf, and the smallest
+        field length in each block.  The postings are decoded once;
+        the value is memoized.
+
+        Returns a tuple of three arrays (last docids, largest tfs,
+        smallest field lengths).
+        """
+        if self._blockMetadata is None:
+            self.__getStatistics()
+
+        return(self._blockMetadata)
+
+
+    def getDocid(self, n):
+        """
+        Get the n'th document id from the inverted list.
+
+        n: An integer from 0 to df-1 that indicates which document
+           in the inverted list.
+
+        Returns the internal docid of the n'th document.
+        """
+        self.__getBlock(n)
+        return(self._curDocids[n - self._curBase])
+
+
+    def getLocation(self, n, j):
+        """
+        Get the j'th location of the n'th document in the inverted list.
+
+        n: An integer from 0 to df-1 that indicates which document
+           in the inverted list.
+        j: An integer from 0 to tf-1 that indicates which location
+           in the document.
+
+        Returns the j'th location of the n'th document.
+        """
+        self.__getBlock(n)
+        if self._curPositions is None:
+            self.__decodePositions()
+
+        return(self._curPositions[self._curOffsets[n - self._curBase] + j])
+
+
+    def getMaxTf(self):
+        """
+        Get the largest term frequency in the inverted list.  The
+        postings are decoded once; the value is memoized.
+
+        Returns the largest tf.
+        """
+        if self._maxTf is None:
+            self.__getStatistics()
+
+        return(self._maxTf)
+
+
+    def getMinFieldLength(self):
+        """
+        Get the smallest length of the inverted list's field in any
+        document in the inverted list.  The postings are decoded once;
+        the value is memoized.
+
+        Returns the smallest field length, or 0 if field lengths aren't
+        cached or the inverted list is empty.
+        """
+        if self._minFieldLength is None:
+            self.__getStatistics()
+
+        return(self._minFieldLength)
+
+
+    def getPositions(self, n):
+        """
+        Get the locations of the n'th document in the inverted list.
+
+        n: An integer from 0 to df-1 that indicates which document
+           in the inverted list.
+
+        Returns an array of document locations.
+        """
+        if self.postingsMode != InvList.POSITIONS:
+            raise Exception('The inverted list does not store locations.')
+
+        self.__getBlock(n)
+        if self._curPositions is None:
+            self.__decodePositions()
+
+        i = n - self._curBase
+        return(self._curPositions[self._curOffsets[i]:self._curOffsets[i+1]])
+
+
+    def getSizeInBytes(self):
+        """
+        Get the approximate amount of memory used by the inverted list,
+        not including the decoded block.
+
+        Returns the size in bytes.
+        """
+        return(len(self._data) + len(self._blockLast) * 4 +
+               len(self._blockStart) * 8)
+
+
+    def getTf(self, n):
+        """
+        Get the term frequency in the n'th document of the inverted list.
+
+        n: An integer from 0 to df-1 that indicates which document
+           in the inverted list.
+
+        Returns the term frequency in the n'th document.
+        """
+        self.__getBlock(n)
+        return(self._curTfs[n - self._curBase])
+
+
+    def toBytes(self):
+        """
+        Get the wire format of the compressed inverted list.
+
+        Returns bytes.
+        """
+        field = self._field.encode('utf-8')
+        header = InvListCompressed._header.pack(
+            InvListCompressed._magic,
+            InvListCompressed._modes.index(self.postingsMode),
+            self.df, len(self._blockLast), self.ctf, len(field))
+
+        return(header + field + self._blockLast.tobytes() +
+               self._blockStart.tobytes() + self._data)
@@ -0,0 +1,297 @@
+"""
+An inverted list that a query operator (e.g., #NEAR or #SYN)
+produces lazily, one document at a time, as its consumer iterates
+over it.
+"""
+
+# Copyright (c) 2026, Carnegie Mellon University.  All Rights Reserved.
+
+from array import array
+from bisect import bisect_right
+
+from InvList import InvList
+
+
+class InvListLazy(InvList):
+    """
+    An inverted list that wraps a QryIop operator instead of
+    materializing its results.  When the consumer advances the list,
+    the operator advances its arguments to the next document that it
+    matches and computes the locations of that document only (see
+    QryIop._getNextMatch).  Thus the lists of a query hold one posting
+    per active iterator instead of all of the intermediate postings.
+
+    df, ctf, and the largest tf are computed by a counting pass the
+    first time that an operator is seen; the arguments are then reset
+    to their first documents.  The counts are
+    remembered, keyed by the operator's string, so later queries that
+    use the same operator skip the counting pass.
+
+    A lazy list can be read only once, in docid order, by one query
+    operator.  Like InvListStream, the posting indexes that findDocid
+    and findDocidPast return are cursors that increase as the list
+    advances, stay below df until it is exhausted, and are df
+    afterwards.
+    """
+
+    # -------------- Constants and variables --------------- #
+
+    # If True, QryIop operators that have arguments are evaluated
+    # lazily instead of materializing their inverted lists.
+    enabled = False
+
+    # (df, ctf, largest tf) of each operator, keyed by its string.
+    _stats = {}
+
+
+    # -------------- Methods (alphabetical) ---------------- #
+
+    def __init__(self, op, postingsMode=InvList.POSITIONS):
+        """
+        Create a lazy inverted list for a query operator whose
+        arguments are initialized.
+
+        op: A QryIop operator that has arguments.
+        postingsMode: InvList.POSITIONS, InvList.FREQS, or InvList.DOCS.
+        """
+        InvList.__init__(self, op._field, None, postingsMode)
+
+        # The lazy list doesn't use the InvList arrays.
+        self.docids = None
+        self.tfs = None
+        self.offsets = None
+        self.positions = None
+
+        self._op = op
+        self._n = 0			# The cursor
+        self._docid = None		# The current docid (None: exhausted)
+        self._positions = None
+
+        key = str(op)
+        stats = InvListLazy._stats.get(key)
+
+        if stats is None:
+            stats = self.__count()
+            InvListLazy._stats[key] = stats
+            self.__resetArgs()
+
+        self.df, self.ctf, self._maxTf = stats
+        self.__advance(0)
+
+
+    def __advance(self, target):
+        """
+        Move the list to the first document at or after target that
+        the operator matches.
+
+        target: An internal document id.
+        """
+        match = self._op._getNextMatch(target)
+
+        if match is None:
+            self._docid = None
+            self._positions = None
+        else:
+            self._docid, self._positions = match
+
+
+    def appendPosting(self, docid, positions):
+        """Lazy inverted lists are read-only."""
+        raise Exception('Lazy inverted lists cannot be modified.')
+
+
+    def __count(self):
+        """
+        Count the operator's matches one document at a time, without
+        storing them.
+
+        Returns (df, ctf, largest tf).
+        """
+        df = ctf = maxTf = 0
+        match = self._op._getNextMatch(0)
+
+        while match is not None:
+            docid, positions = match
+            df += 1
+            ctf += len(positions)
+            maxTf = max(maxTf, len(positions))
+            match = self._op._getNextMatch(docid + 1)
+
+        return((df, ctf, maxTf))
+
+
+    def findDocid(self, docid, n=0):
+        """
+        Advance to the first posting whose docid is at least docid.
+        The operator skips the documents in between.
+
+        docid: An internal document id (an integer).
+        n: The current posting index.
+
+        Returns the new posting index, or df if there is none.
+        """
+        if self._docid is None:
+            return(self.df)
+
+        if self._docid >= docid:
+            return(self._n)
+
+        self.__advance(docid)
+
+        if self._docid is None:
+            self._n = self.df
+        else:
+            self._n += 1
+
+        return(self._n)
+
+
+    def findDocidPast(self, docid, n=0):
+        """
+        Advance to the first posting whose docid is greater than docid.
+
+        docid: An internal document id (an integer).
+        n: The current posting index.
+
+        Returns the new posting index, or df if there is none.
+        """
+        return(self.findDocid(docid + 1, n))
+
+
+    def findLocationPast(self, n, loc, j=0):
+        """
+        Find the first location at or after the j'th location of the
+        current document whose value is greater than loc.
+
+        n: The current posting index.
+        loc: A document location.
+        j: An integer from 0 to tf that indicates where to start.
+
+        Returns an integer from j to tf.
+        """
+        self.__move(n)
+        return(bisect_right(self._positions, loc, j))
+
+
+    def getBlockMetadata(self):
+        """Block metadata isn't known for lazy lists."""
+        return(None)
+
+
+    def getDocid(self, n):
+        """
+        Get the docid of the current posting.
+
+        n: The current posting index.
+
+        Returns the internal docid of the current posting.
+        """
+        self.__move(n)
+        return(self._docid)
+
+
+    def getLocation(self, n, j):
+        """
+        Get the j'th location of the current posting.
+
+        n: The current posting index.
+        j: An integer from 0 to tf-1 that indicates which location
+           in the document.
+
+        Returns the j'th location of the current document.
+        """
+        self.__move(n)
+        return(self._positions[j])
+
+
+    def getMaxTf(self):
+        """Get the largest tf, from the counting pass."""
+        return(self._maxTf)
+
+
+    def getMinFieldLength(self):
+        """The field lengths aren't known for lazy lists."""
+        return(0)
+
+
+    def getPositions(self, n):
+        """
+        Get the locations of the current posting.
+
+        n: The current posting index.
+
+        Returns an array of document locations.
+        """
+        if self.postingsMode != InvList.POSITIONS:
+            raise Exception('The inverted list does not store locations.')
+
+        self.__move(n)
+        return(array('i', self._positions))
+
+
+    def getSizeInBytes(self):
+        """Lazy lists store only the current posting."""
+        return(0)
+
+
+    @staticmethod
+    def getStats(op):
+        """
+        Get the counts of a query operator from earlier lazy lists.
+
+        op: A QryIop operator.
+
+        Returns (df, ctf, largest tf), or None if they aren't known.
+        """
+        return(InvListLazy._stats.get(str(op)))
+
+
+    def getTf(self, n):
+        """
+        Get the term frequency of the current posting.
+
+        n: The current posting index.
+
+        Returns the term frequency in the current document.
+        """
+        self.__move(n)
+        return(len(self._positions))
+
+
+
+
+    @staticmethod
+    def hasStats(op):
+        """
+        True iff the counts of a query operator are known, so that its
+        arguments needn't be reset after a counting pass.
+
+        op: A QryIop operator.
+        """
+        return(InvListLazy.getStats(op) is not None)
+
+
+    def __move(self, n):
+        """
+        Check that a posting index refers to the current posting.
+
+        n: A posting index returned by the list.
+        """
+        if n != self._n:
+            raise Exception(
+                'Lazy inverted lists must be read in docid order.')
+
+
+    def reset(self):
+        """Move the list (and its operator's arguments) back to the start."""
+        self.__resetArgs()
+        self._n = 0
+        self.__advance(0)
+
+
+    def __resetArgs(self):
+        """Move the operator's arguments back to their first documents."""
+        for q_i in self._op._args:
+            q_i.docIteratorReset()
+
+        self._op._union = None		# Its positions are out of date
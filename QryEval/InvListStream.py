@@ -0,0 +1,269 @@
+"""
+An inverted list that is read from Lucene lazily, one posting at a
+time, as a query operator iterates over it.
+"""
+
+# Copyright (c) 2026, Carnegie Mellon University.  All Rights Reserved.
+
+from array import array
+from bisect import bisect_right
+
+from Idx import Idx
+from InvList import InvList
+import PyLu
+
+
+class InvListStream(InvList):
+    """
+    An inverted list that wraps Lucene's per-segment PostingsEnum
+    iterators instead of materializing the postings.  findDocid uses
+    Lucene's advance, so postings that a query operator skips are
+    never transferred to Python.  df and ctf come from the term
+    dictionary instead of from counting postings.
+
+    A stream can be read only once, in docid order, by one query
+    operator; it must not be shared (e.g., via InvListCache).  The
+    posting indexes that findDocid and findDocidPast return are
+    cursors, not exact positions in the inverted list: they increase
+    as the stream advances, stay below df until the stream is
+    exhausted, and are df afterwards.  That is all QryIop needs.
+    """
+
+    # -------------- Constants and variables --------------- #
+
+    # If True, QryIopTerm streams inverted lists that are not in the
+    # InvListCache instead of materializing them.
+    enabled = False
+
+
+    # -------------- Methods (alphabetical) ---------------- #
+
+    def __init__(self, fieldString, termString, postingsMode=InvList.FREQS):
+        """
+        Open a stream over the inverted list for a term in a field.
+
+        fieldString: The name of a document field.
+        termString: A lexically-processed term that may be in the corpus.
+        postingsMode: InvList.POSITIONS, InvList.FREQS, or InvList.DOCS.
+        """
+        InvList.__init__(self, fieldString, None, postingsMode)
+
+        # The stream doesn't use the InvList arrays.
+        self.docids = None
+        self.tfs = None
+        self.offsets = None
+        self.positions = None
+
+        self.df = Idx.getDocFreq(fieldString, termString)
+        self.ctf = Idx.getTotalTermFreq(fieldString, termString)
+
+        self._leaves = []		# (docBase, PostingsEnum) per segment
+        self._leaf = 0			# The current segment
+        self._n = 0			# The cursor
+        self._docid = None		# The current docid (None: exhausted)
+        self._tf = None
+        self._positions = None
+
+        if self.df < 1:
+            return
+
+        termBytes = PyLu.LBytesRef(PyLu.JString(termString))
+        term = PyLu.LTerm(PyLu.JString(fieldString), termBytes)
+        flags = InvList._luceneFlags[postingsMode]
+
+        for context in Idx.indexReader.leaves():
+            postings = context.reader().postings(term, flags)
+            if postings != None:
+                self._leaves.append((context.docBase, postings))
+
+        self.__advance(0)
+
+
+    def __advance(self, target):
+        """
+        Move the stream to the first posting whose docid is at least
+        target.  The current docid must be less than target.
+
+        target: An internal document id.
+        """
+        NO_MORE_DOCS = PyLu.LDocIdSetIterator.NO_MORE_DOCS
+        self._tf = None
+        self._positions = None
+
+        while self._leaf < len(self._leaves):
+            docBase, postings = self._leaves[self._leaf]
+            leafTarget = target - docBase
+
+            # Lucene's advance requires a target beyond the current doc.
+            if leafTarget <= postings.docID():
+                d = postings.nextDoc()
+            else:
+                d = postings.advance(leafTarget)
+
+            if d != NO_MORE_DOCS:
+                self._docid = docBase + d
+                return
+
+            self._leaf += 1
+
+        self._docid = None
+
+
+    def __getPositions(self):
+        """Read the locations of the current posting from Lucene."""
+        if self._positions is None:
+            postings = self._leaves[self._leaf][1]
+            tf = self.getTf(self._n)
+            self._positions = array('i', [postings.nextPosition()
+                                          for j in range(0, tf)])
+
+        return(self._positions)
+
+
+    def __move(self, n):
+        """
+        Check that a posting index refers to the current posting.
+
+        n: A posting index returned by the stream.
+        """
+        if n != self._n:
+            raise Exception(
+                'Streamed inverted lists must be read in docid order.')
+
+
+    def appendPosting(self, docid, positions):
+        """Streamed inverted lists are read-only."""
+        raise Exception('Streamed inverted lists cannot be modified.')
+
+
+    def findDocid(self, docid, n=0):
+        """
+        Advance to the first posting whose docid is at least docid.
+        Lucene skips the postings in between.
+
+        docid: An internal document id (an integer).
+        n: The current posting index.
+
+        Returns the new posting index, or df if there is none.
+        """
+        if self._docid is None:
+            return(self.df)
+
+        if self._docid >= docid:
+            return(self._n)
+
+        self.__advance(docid)
+
+        if self._docid is None:
+            self._n = self.df
+        else:
+            self._n += 1
+
+        return(self._n)
+
+
+    def findDocidPast(self, docid, n=0):
+        """
+        Advance to the first posting whose docid is greater than docid.
+
+        docid: An internal document id (an integer).
+        n: The current posting index.
+
+        Returns the new posting index, or df if there is none.
+        """
+        return(self.findDocid(docid + 1, n))
+
+
+    def findLocationPast(self, n, loc, j=0):
+        """
+        Find the first location at or after the j'th location of the
+        current document whose value is greater than loc.
+
+        n: The current posting index.
+        loc: A document location.
+        j: An integer from 0 to tf that indicates where to start.
+
+        Returns an integer from j to tf.
+        """
+        self.__move(n)
+        return(bisect_right(self.__getPositions(), loc, j))
+
+
+    def getBlockMetadata(self):
+        """Block metadata isn't known until the stream is read."""
+        return(None)
+
+
+    def getDocid(self, n):
+        """
+        Get the docid of the current posting.
+
+        n: The current posting index.
+
+        Returns the internal docid of the current posting.
+        """
+        self.__move(n)
+        return(self._docid)
+
+
+    def getLocation(self, n, j):
+        """
+        Get the j'th location of the current posting.
+
+        n: The current posting index.
+        j: An integer from 0 to tf-1 that indicates which location
+           in the document.
+
+        Returns the j'th location of the current document.
+        """
+        self.__move(n)
+        return(self.__getPositions()[j])
+
+
+    def getMaxTf(self):
+        """The largest tf isn't known until the stream is read."""
+        return(None)
+
+
+    def getMinFieldLength(self):
+        """The field lengths aren't known until the stream is read."""
+        return(0)
+
+
+    def getPositions(self, n):
+        """
+        Get the locations of the current posting.
+
+        n: The current posting index.
+
+        Returns an array of document locations.
+        """
+        if self.postingsMode != InvList.POSITIONS:
+            raise Exception('The inverted list does not store locations.')
+
+        self.__move(n)
+        return(array('i', self.__getPositions()))
+
+
+    def getSizeInBytes(self):
+        """Streams don't store postings."""
+        return(0)
+
+
+    def getTf(self, n):
+        """
+        Get the term frequency of the current posting.
+
+        n: The current posting index.
+
+        Returns the term frequency in the current document.
+        """
+        self.__move(n)
+
+        if self._tf is None:
+            if self.postingsMode == InvList.DOCS:
+                self._tf = 1
+            else:
+                self._tf = self._leaves[self._leaf][1].freq()
+
+        return(self._tf)
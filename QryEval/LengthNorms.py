@@ -0,0 +1,248 @@
+"""
+Per-document length normalization arrays for BM25 and Indri scoring,
+optionally stored next to the Idx.pycache.* files.
+"""
+
+# Copyright (c) 2026, Carnegie Mellon University.  All Rights Reserved.
+
+import hashlib
+import mmap
+import os
+import struct
+
+from array import array
+
+from CollectionStats import CollectionStats
+from Idx import Idx
+
+
+class LengthNorms:
+    """
+    Per-document length normalization values, indexed by internal
+    docid, for one field and one retrieval model configuration:
+
+      BM25:   k_1 * ((1 - b) + b * (doclen / avg_doclen))
+      Indri:  doclen + mu
+
+    so that scoring a posting needs one array lookup instead of a
+    field length lookup and the normalization arithmetic.  The values
+    are computed with the same expressions as QrySopScore and stored
+    as doubles, so scores don't change.  Arrays are built once per
+    (field, parameters) from the field length cache; if field lengths
+    aren't cached, there are no arrays and callers use field lengths.
+
+    If open is called, each array is stored in its own file in the
+    Idx.pycache.lengthnorms directory and read through mmap, so later
+    runs don't rebuild it and forked processes share one copy.  A file
+    has a fixed-size header followed by the doubles.  Files are tagged
+    with the version of the Lucene index and the model parameters.
+    Files that don't match are rebuilt.  Otherwise, arrays are kept in
+    memory.
+    """
+
+    # -------------- Constants and static variables -------- #
+
+    _dirname = 'Idx.pycache.lengthnorms'
+
+    # magic, index version, two model parameters, and number of docs.
+    # The header is padded to a multiple of 8 bytes.
+    _header = struct.Struct('<4s4xqddq')
+    _magic = b'QELN'
+
+    _path = None
+    _index_version = None
+    _norms = {}			# key -> (field lengths, normalization values)
+
+
+    # -------------- Methods (alphabetical) ---------------- #
+
+    @staticmethod
+    def __filename(key):
+        """Get the filename for an array key."""
+        return(hashlib.sha1(repr(key).encode('utf-8')).hexdigest() + '.bin')
+
+
+    @staticmethod
+    def __get(key, fieldName, p1, p2, normalize):
+        """
+        Get a normalization array, building it if necessary.
+
+        key: (model name, field name, p1, p2).
+        fieldName: The name of a document field.
+        p1, p2: The model parameters that the values depend on.
+        normalize: A function of a field length that returns its
+          normalization value.
+
+        Returns a sequence of doubles indexed by internal docid, or None
+        if field lengths aren't cached.
+        """
+        lengths = Idx.getFieldLengths(fieldName)
+
+        if lengths is None:
+            return(None)
+
+        # Arrays are rebuilt if the index (and its field length cache)
+        # is reopened.
+        cached = LengthNorms._norms.get(key)
+
+        if cached is not None and cached[0] is lengths:
+            return(cached[1])
+
+        norms = LengthNorms.__read(key, p1, p2, len(lengths))
+
+        if norms is None:
+            norms = array('d', [normalize(doclen) for doclen in lengths])
+            norms = LengthNorms.__write(key, p1, p2, norms)
+
+        LengthNorms._norms[key] = (lengths, norms)
+        return(norms)
+
+
+    @staticmethod
+    def getBM25(fieldName, k_1, b):
+        """
+        Get BM25 length normalization values for a field:
+        k_1 * ((1 - b) + b * (doclen / avg_doclen)).
+
+        fieldName: The name of a document field.
+        k_1: The BM25 k_1 parameter.
+        b: The BM25 b parameter.
+
+        Returns a sequence of doubles indexed by internal docid, or None
+        if field lengths aren't cached.
+        """
+        avg_doclen = CollectionStats.getAvgFieldLength(fieldName)
+        return(LengthNorms.__get(
+            ('BM25', fieldName, k_1, b), fieldName, k_1, b,
+            lambda doclen: k_1 * ((1 - b) + b * (doclen / avg_doclen))))
+
+
+    @staticmethod
+    def getIndri(fieldName, mu):
+        """
+        Get Indri length normalization values for a field: doclen + mu,
+        the denominator of the smoothed term probability.  A value is
+        0 iff doclen and mu are 0.
+
+        fieldName: The name of a document field.
+        mu: The Indri mu parameter.
+
+        Returns a sequence of doubles indexed by internal docid, or None
+        if field lengths aren't cached.
+        """
+        return(LengthNorms.__get(('Indri', fieldName, mu, 0.0), fieldName,
+                                 mu, 0.0, lambda doclen: doclen + mu))
+
+
+    @staticmethod
+    def isOpen():
+        """True iff arrays are stored in files, otherwise False."""
+        return(LengthNorms._path is not None)
+
+
+    @staticmethod
+    def open(index_path):
+        """
+        Store arrays in files, and read arrays that earlier runs
+        stored.  This must be done after the index is opened.
+
+        index_path: The directory that contains the
+          Idx.pycache.lengthnorms directory, usually the index directory.
+
+        Returns True if the directory was opened, otherwise False.
+        """
+        path = os.path.join(index_path, LengthNorms._dirname)
+
+        try:
+            os.makedirs(path, exist_ok=True)
+        except Exception as e:
+            print('Cannot open length normalization directory', path)
+            print(str(e))
+            return(False)
+
+        LengthNorms._path = path
+        LengthNorms._index_version = Idx.indexReader.getVersion()
+        LengthNorms._norms = {}
+        return(True)
+
+
+    @staticmethod
+    def __read(key, p1, p2, count):
+        """
+        Read an array from its file.
+
+        key: The array key.
+        p1, p2: The model parameters that the values depend on.
+        count: The number of documents.
+
+        Returns a memoryview of doubles, or None if the file is missing
+        or out of date.
+        """
+        if LengthNorms._path is None:
+            return(None)
+
+        path = os.path.join(LengthNorms._path, LengthNorms.__filename(key))
+        header = LengthNorms._header
+
+        try:
+            with open(path, 'rb') as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return(None)
+
+        try:
+            (magic, version, file_p1, file_p2,
+             file_count) = header.unpack_from(mm, 0)
+        except struct.error:
+            mm.close()
+            return(None)
+
+        if (magic != LengthNorms._magic or
+            version != LengthNorms._index_version or
+            file_p1 != p1 or file_p2 != p2 or file_count != count or
+            len(mm) != header.size + 8 * count):
+            mm.close()
+            return(None)
+
+        # The memoryview keeps the mapping open.
+        return(memoryview(mm)[header.size:].cast('d'))
+
+
+    @staticmethod
+    def __write(key, p1, p2, norms):
+        """
+        Store an array in its file, if arrays are stored in files.
+
+        key: The array key.
+        p1, p2: The model parameters that the values depend on.
+        norms: An array of doubles.
+
+        Returns the stored array, read through mmap, or norms if it
+        isn't stored.
+        """
+        if LengthNorms._path is None:
+            return(norms)
+
+        path = os.path.join(LengthNorms._path, LengthNorms.__filename(key))
+        header = LengthNorms._header.pack(
+            LengthNorms._magic, LengthNorms._index_version, p1, p2,
+            len(norms))
+
+        # Write a temporary file and rename it, so that other processes
+        # never see a partial file.  The temporary file is private to
+        # this process, so processes that build the same array at the
+        # same time don't write the same file.
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(header)
+                norms.tofile(f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print('Cannot write length normalization file', path)
+            print(str(e))
+            return(norms)
+
+        stored = LengthNorms.__read(key, p1, p2, len(norms))
+        return(stored if stored is not None else norms)
@@ -0,0 +1,306 @@
+"""
+A persistent, size-limited cache of inverted lists, stored next to
+the Idx.pycache.* files so that later runs don't need to read the
+same postings from Lucene again.
+"""
+
+# Copyright (c) 2026, Carnegie Mellon University.  All Rights Reserved.
+
+import hashlib
+import itertools
+import mmap
+import operator
+import os
+import struct
+import zlib
+
+from array import array
+
+from Idx import Idx
+
+
+class PostingsCache:
+    """
+    A persistent, size-limited cache of inverted lists.  Each
+    (field, term) inverted list is stored in its own file in the
+    Idx.pycache.postings directory.  A file has a fixed-size header
+    followed by zlib-compressed docid gaps, tfs, and positions.  Files
+    are read through mmap, so only the sections that a request needs
+    are decompressed.
+
+    Each file is tagged with the version of the Lucene index that it
+    was read from.  Files from other index versions are ignored and
+    replaced.  When the cache grows beyond its size limit, the least
+    recently used files are deleted.
+
+    The cache is disabled until open is called.
+    """
+
+    # -------------- Constants and static variables -------- #
+
+    _dirname = 'Idx.pycache.postings'
+
+    # magic, index version, mode, df, ctf, and the compressed sizes
+    # of the docid, tf, and position sections.
+    _header = struct.Struct('<4sqiiqqqq')
+    _magic = b'QEPC'
+
+    # Cached postings modes, from least to most information.  A
+    # cached inverted list can serve any request that needs the same
+    # or less information.
+    _modes = ['docs', 'freqs', 'positions']
+
+    _path = None
+    _index_version = None
+    _max_bytes = 0
+    _files = {}			# filename -> [size, last use]
+    _total_bytes = 0
+    _clock = 0
+
+    hits = 0
+    misses = 0
+
+
+    # -------------- Methods (alphabetical) ---------------- #
+
+    @staticmethod
+    def __evict():
+        """
+        Delete the least recently used files until the cache is
+        within its size limit.
+        """
+        if PostingsCache._total_bytes <= PostingsCache._max_bytes:
+            return
+
+        lru = sorted(PostingsCache._files.items(), key=lambda x: x[1][1])
+
+        for filename, (size, _) in lru:
+            if PostingsCache._total_bytes <= PostingsCache._max_bytes:
+                break
+
+            try:
+                os.remove(os.path.join(PostingsCache._path, filename))
+            except OSError:
+                pass
+
+            del PostingsCache._files[filename]
+            PostingsCache._total_bytes -= size
+
+
+    @staticmethod
+    def __filename(fieldString, termString):
+        """Get the cache filename for a (field, term) pair."""
+        key = f'{fieldString}\0{termString}'.encode('utf-8')
+        return(hashlib.sha1(key).hexdigest() + '.bin')
+
+
+    @staticmethod
+    def __readBuffer(invList, buf):
+        """
+        Initialize an inverted list from the contents of a cache file.
+
+        invList: An empty InvList.
+        buf: The file contents.
+
+        Returns True if the inverted list was initialized, otherwise False.
+        """
+        header = PostingsCache._header
+        (magic, version, mode, df, ctf,
+         docidBytes, tfBytes, positionBytes) = header.unpack_from(buf, 0)
+
+        if (magic != PostingsCache._magic or
+            version != PostingsCache._index_version):
+            return(False)
+
+        wanted = PostingsCache._modes.index(invList.postingsMode)
+
+        if mode < wanted:
+            return(False)
+
+        # Decode into local arrays, so that a damaged file doesn't leave
+        # the inverted list partly initialized.
+        tfs = array('i')
+        positions = array('i')
+        offsets = array('q', [0])
+        start = header.size
+
+        with memoryview(buf) as view:
+            gaps = array('i')
+            gaps.frombytes(zlib.decompress(view[start:start+docidBytes]))
+            start += docidBytes
+
+            if invList.postingsMode == invList.DOCS:
+                tfs = array('i', [1]) * df
+            else:
+                tfs.frombytes(zlib.decompress(view[start:start+tfBytes]))
+            start += tfBytes
+
+            if invList.postingsMode == invList.POSITIONS:
+                positions.frombytes(
+                    zlib.decompress(view[start:start+positionBytes]))
+                offsets = array('q', itertools.accumulate(tfs, initial=0))
+
+        invList.docids = array('i', itertools.accumulate(gaps))
+        invList.tfs = tfs
+        invList.positions = positions
+        invList.offsets = offsets
+        invList.df = df
+        invList.ctf = ctf
+        return(True)
+
+
+    @staticmethod
+    def __touch(filename, size):
+        """Record that a file was used."""
+        PostingsCache._clock += 1
+        PostingsCache._files[filename] = [size, PostingsCache._clock]
+
+
+    @staticmethod
+    def isOpen():
+        """True iff the cache is open, otherwise False."""
+        return(PostingsCache._path is not None)
+
+
+    @staticmethod
+    def open(cache_path, max_megabytes):
+        """
+        Open (or create) the postings cache.  This must be done after
+        the index is opened.
+
+        cache_path: The directory that contains the Idx.pycache.postings
+          directory, usually the index directory.
+        max_megabytes: The maximum size of the cache, in megabytes.
+
+        Returns True if the cache was opened, otherwise False.
+        """
+        path = os.path.join(cache_path, PostingsCache._dirname)
+
+        try:
+            os.makedirs(path, exist_ok=True)
+            entries = list(os.scandir(path))
+        except Exception as e:
+            print('Cannot open postings cache', path)
+            print(str(e))
+            return(False)
+
+        PostingsCache._path = path
+        PostingsCache._index_version = Idx.indexReader.getVersion()
+        PostingsCache._max_bytes = int(max_megabytes * 1024 * 1024)
+        PostingsCache._files = {}
+        PostingsCache._total_bytes = 0
+
+        # Files are ordered by their modification times, which is
+        # when they were last used by an earlier run.
+        entries = [e for e in entries if e.name.endswith('.bin')]
+        entries.sort(key=lambda e: e.stat().st_mtime)
+
+        for e in entries:
+            size = e.stat().st_size
+            PostingsCache.__touch(e.name, size)
+            PostingsCache._total_bytes += size
+
+        PostingsCache.__evict()
+        return(True)
+
+
+    @staticmethod
+    def read(invList, termString):
+        """
+        Initialize an inverted list from the cache, if possible.
+
+        invList: An empty InvList.  Its field and postingsMode
+          determine what is read.
+        termString: A lexically-processed term.
+
+        Returns True if the inverted list was found, otherwise False.
+        """
+        if PostingsCache._path is None:
+            return(False)
+
+        filename = PostingsCache.__filename(invList._field, termString)
+        path = os.path.join(PostingsCache._path, filename)
+
+        try:
+            with open(path, 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    found = PostingsCache.__readBuffer(invList, mm)
+        except (OSError, ValueError, zlib.error, struct.error):
+            found = False
+
+        if not found:
+            PostingsCache.misses += 1
+            return(False)
+
+        PostingsCache.hits += 1
+        PostingsCache.__touch(filename, size)
+
+        # File times record recent use for later runs.
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        return(True)
+
+
+    @staticmethod
+    def write(invList, termString):
+        """
+        Store an inverted list in the cache.
+
+        invList: An InvList read from the index.
+        termString: A lexically-processed term.
+        """
+        if PostingsCache._path is None:
+            return
+
+        mode = PostingsCache._modes.index(invList.postingsMode)
+
+        # Docids are stored as gaps, which compress much better.
+        docids = invList.docids
+        gaps = array('i', map(operator.sub, docids,
+                              itertools.chain((0,), docids)))
+        docidBytes = zlib.compress(gaps.tobytes())
+        tfBytes = b''
+        positionBytes = b''
+
+        if invList.postingsMode != invList.DOCS:
+            tfBytes = zlib.compress(invList.tfs.tobytes())
+
+        if invList.postingsMode == invList.POSITIONS:
+            positionBytes = zlib.compress(invList.positions.tobytes())
+
+        header = PostingsCache._header.pack(
+            PostingsCache._magic, PostingsCache._index_version, mode,
+            invList.df, invList.ctf,
+            len(docidBytes), len(tfBytes), len(positionBytes))
+
+        # Write to a temporary file and rename it, so that concurrent
+        # runs never see a partial file.
+        filename = PostingsCache.__filename(invList._field, termString)
+        path = os.path.join(PostingsCache._path, filename)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(header)
+                f.write(docidBytes)
+                f.write(tfBytes)
+                f.write(positionBytes)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print('Cannot write postings cache file', path)
+            print(str(e))
+            return
+
+        size = (PostingsCache._header.size + len(docidBytes) +
+                len(tfBytes) + len(positionBytes))
+
+        if filename in PostingsCache._files:
+            PostingsCache._total_bytes -= PostingsCache._files[filename][0]
+
+        PostingsCache.__touch(filename, size)
+        PostingsCache._total_bytes += size
+        PostingsCache.__evict()
@@ -45,11 +45,13 @@ cached so that it can be accessed efficiently by getMatch and
 getScore methods.
 
 The inverted lists of query operators in the QryIop hierarchy are
-materialized when the query operator is initialized.  It is not
-possible to produce them in a document-at-a-time mode because
-the df and ctf statistics are not known until the inverted list
-is fully constructed.  QryIop operators provide a document-at-a-time
-interface to the inverted lists via docIterators.
+materialized when the query operator is initialized, unless lazy
+evaluation is enabled (see InvListLazy).  QryIop operators provide a
+document-at-a-time interface to the inverted lists via docIterators.
+
+Conjunctive operators (docIteratorHasMatchAll) visit their arguments
+in the order chosen by QryPlanner, rarest first, which needn't be
+the order in the query string.  The query string is unchanged.
 
 The data structure that stores query arguments (args) is accessible
 by subclasses.  If it is accessed via a standard Java iterator, the
@@ -60,6 +62,15 @@ query evaluation, which reduces computational efficiency.
 # Copyright (c) 2023, Carnegie Mellon University.  All Rights Reserved.
 
 import sys
+from bisect import bisect_left
+
+# NumPy is optional.  It is needed only for small-vs-small intersection.
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from UnionIterator import UnionIterator
 
 class Qry:
     """
@@ -77,6 +88,17 @@ class Qry:
         self._args = []	# Arguments to this query operator.
         self._displayName = ''	# The name to display when rendering to string
 
+        # The evaluation plan of a conjunction (see QryPlanner): the
+        # order in which docIteratorHasMatchAll visits the arguments,
+        # and whether it intersects them small-vs-small.
+        self._argOrder = None
+        self._svs = False
+        self._svsCandidates = None
+
+        # The union of the arguments' matches, for disjunctive operators
+        # (see docIteratorHasMatchMin).
+        self._union = None
+
         # docIteratorHasMatch caches the matching docid so that
         # docIteratorGetMatch and getScore don't have to recompute it.
         __docIteratorMatchCache = Qry.INVALID_DOCID
@@ -154,8 +176,11 @@ class Qry:
 
         docid: An internal document id.
         """
-        for q_i in self._args:
-            q_i.docIteratorAdvancePast(docid)
+        if self._union is not None:
+            self._union.advancePast(docid)
+        else:
+            for q_i in self._args:
+                q_i.docIteratorAdvancePast(docid)
 
         self.docIteratorClearMatchCache()
 
@@ -167,8 +192,11 @@ class Qry:
 
         docid: An internal document id.
         """
-        for q_i in self._args:
-            q_i.docIteratorAdvanceTo(docid)
+        if self._union is not None:
+            self._union.advanceTo(docid)
+        else:
+            for q_i in self._args:
+                q_i.docIteratorAdvanceTo(docid)
 
         self.docIteratorClearMatchCache()
 
@@ -219,13 +247,23 @@ class Qry:
         Returns True if the query matches, otherwise False.
         """
 
+        # Small-vs-small needs the arguments' docid arrays, which are
+        # known after they are initialized.
+        if self._svs and self._svsCandidates is None:
+            self._svsCandidates = self.__getSvsCandidates()
+            self._svs = self._svsCandidates is not None
+
+        if self._svs:
+            return(self.__docIteratorHasMatchSvs(r))
+
+        args = self._args if self._argOrder is None else self._argOrder
         matchFound = False
         
         # Keep trying until a match is found or no match is possible.
         while not matchFound:
 
             # Get the docid of the first query argument.
-            q_0 = self._args[ 0 ]
+            q_0 = args[ 0 ]
 
             if not q_0.docIteratorHasMatch(r):
                 return(False)
@@ -236,7 +274,7 @@ class Qry:
             # first query argument.
             matchFound = True
 
-            for q_i in self._args[ 1: ]:
+            for q_i in args[ 1: ]:
 
                 q_i.docIteratorAdvanceTo(docid_0)
 
@@ -282,26 +320,50 @@ class Qry:
         An instantiation of docIteratorHasMatch that is true if the
         query has a document that matches at least one query argument;
         the match is the smallest docid to match; some subclasses may
-        choose to use this implementation.
+        choose to use this implementation.  The arguments are merged by
+        a UnionIterator, which also advances them, so only arguments
+        that match the current docid are probed and moved.  Code that
+        advances the arguments directly must discard it (_union).
 
         r: The retrieval model that determines what is a match
         Returns True if the query matches, otherwise False.
         """
 
-        minDocid = None
+        if self._union is None:
+            self._union = UnionIterator(self._args, r)
+
+        if not self._union.hasMatch():
+            return False
+
+        self.docIteratorSetMatchCache(self._union.getDocid())
+        return True
+
+
+    def __docIteratorHasMatchSvs(self, r):
+        """
+        docIteratorHasMatchAll for a conjunction whose matches were
+        found by a small-vs-small intersection of its arguments' docids.
+        The arguments skip directly to the next match.
+
+        r: The retrieval model that determines what is a match.
+        Returns True if the query matches, otherwise False.
+        """
+        q_0 = self._argOrder[ 0 ]
+
+        if not q_0.docIteratorHasMatch(r):
+            return(False)
+
+        candidates = self._svsCandidates
+        i = bisect_left(candidates, q_0.docIteratorGetMatch())
+
+        if i == len(candidates):
+            return(False)
 
         for q_i in self._args:
-            if q_i.docIteratorHasMatch(r):
-                if minDocid is None:
-                    minDocid = q_i.docIteratorGetMatch()
-                else:
-                    minDocid = min(minDocid, q_i.docIteratorGetMatch())
+            q_i.docIteratorAdvanceTo(candidates[i])
 
-        if minDocid is None:
-            return False
-        else:
-            self.docIteratorSetMatchCache(minDocid)
-            return True
+        self.docIteratorSetMatchCache(candidates[i])
+        return(True)
 
 
     def docIteratorHasMatchCache(self):
@@ -320,6 +382,15 @@ class Qry:
         self.docIteratorMatchCache = docid
 
 
+    def _getDocidArray(self):
+        """
+        Get the docids that the query operator matches as a sorted NumPy
+        array, for small-vs-small intersection.  Operators whose
+        matches aren't materialized return None.
+        """
+        return(None)
+
+
     def getDisplayName(self):
         """
         Every operator has a display name that can be used by
@@ -330,6 +401,24 @@ class Qry:
         return(self._displayName)
 
 
+    def __getSvsCandidates(self):
+        """
+        Intersect the arguments' docids small-vs-small.
+
+        Returns a sorted list of the docids that all of the arguments
+        match, or None if an argument's docids aren't materialized.
+        """
+        if np is None:
+            return(None)
+
+        docids = [q_i._getDocidArray() for q_i in self._args]
+
+        if any(d is None for d in docids):
+            return(None)
+
+        return(Qry._intersectDocids(docids).tolist())
+
+
     def initialize(self, RetrievalModel):
         """
         Initialize the query operator (and its arguments), including any
@@ -345,6 +434,32 @@ class Qry:
             retrievalModel.__class__.__name__))
                          
 
+    @staticmethod
+    def _intersectDocids(docids):
+        """
+        Intersect sorted arrays of docids small-vs-small: the smallest
+        array is intersected with the next smallest, and so on.  Each
+        step binary searches the larger array for the docids that
+        survived, so the cost depends mostly on the smallest array.
+
+        docids: A list of sorted NumPy arrays of unique docids.
+
+        Returns a sorted NumPy array of the docids that are in all of
+        the arrays.
+        """
+        docids = sorted(docids, key=len)
+        result = docids[0]
+
+        for d in docids[1:]:
+            if len(result) == 0 or len(d) == 0:
+                return(result[:0])
+
+            j = np.minimum(np.searchsorted(d, result), len(d) - 1)
+            result = result[d[j] == result]
+
+        return(result)
+
+
     def delArg(self, i):
         """
         Delete the i'th argument from the list of query operator arguments.
@@ -6,6 +6,13 @@ import sys
 import Util
 
 from Idx import Idx
+from ImpactIndex import ImpactIndex
+from InvListCache import InvListCache
+from InvListCompressed import InvListCompressed
+from InvListLazy import InvListLazy
+from InvListStream import InvListStream
+from LengthNorms import LengthNorms
+from PostingsCache import PostingsCache
 from Ranker import Ranker
 from Reranker import Reranker
 from TeIn import TeIn
@@ -27,6 +34,24 @@ def main ():
     # Initialize the index and experiment parameters.
     parameters = readParameterFile()
     Idx.open(parameters['indexPath'])
+    if 'postingsCacheSize' in parameters:
+        PostingsCache.open(parameters.get('postingsCachePath',
+                                          parameters['indexPath']),
+                           parameters['postingsCacheSize'])
+    if 'invListCacheSize' in parameters:
+        InvListCache.open(parameters['invListCacheSize'])
+    if 'compressPostingsMinDf' in parameters:
+        InvListCompressed.minDf = parameters['compressPostingsMinDf']
+    if 'streamPostings' in parameters:
+        InvListStream.enabled = parameters['streamPostings']
+    if 'lazyQryIop' in parameters:
+        InvListLazy.enabled = parameters['lazyQryIop']
+    if parameters.get('lengthNormsCache', False):
+        LengthNorms.open(parameters.get('lengthNormsPath',
+                                        parameters['indexPath']))
+    if parameters.get('ranker', {}).get('evaluationEngine') == 'saat':
+        ImpactIndex.open(parameters.get('impactIndexPath',
+                                        parameters['indexPath']))
     queries = Util.read_queries(parameters['queryFilePath'])
     teIn = TeIn(parameters['trecEvalOutputPath'],
                 parameters['trecEvalOutputLength'])
@@ -58,6 +83,17 @@ def main ():
     for q in results:
         teIn.appendQuery(q, results[q], 'Your_RunId_here')
     
+    # Report pruning and cache statistics, which help to tune the
+    # ranker and size the caches.
+    if ranker.blocksSkipped is not None:
+        print(f'Block-Max WAND: {ranker.blocksSkipped} blocks skipped')
+    if InvListCache.isOpen():
+        print(f'InvList cache: {InvListCache.hits} hits,',
+              f'{InvListCache.misses} misses')
+    if PostingsCache.isOpen():
+        print(f'Postings cache: {PostingsCache.hits} hits,',
+              f'{PostingsCache.misses} misses')
+
     # Clean up
     teIn.close()
     Idx.close()
@@ -11,7 +11,10 @@ list, and information from the inverted list is accessible.  Document
 and location information are accessed via Qry.docIterator and
 QryIop.locIterator.  Corpus-level information, for example, 
 document frequency (df) and collection term frequency (ctf), are
-available via specific methods (e.g., getDf and getCtf).
+available via specific methods (e.g., getDf and getCtf).  If
+InvListLazy.enabled is True, operators that have arguments (e.g.,
+#NEAR) cache an InvListLazy instead, which finds the operator's
+matches one document at a time as the consumer iterates over it.
 
 QryIop operators support iteration over the locations in the
 document that Qry.docIteratorHasMatch matches.  The semantics
@@ -24,12 +27,27 @@ IMPLEMENTATION NOTES:
 Iteration in QryIop and QrySop is very different.  In QryIop,
 docIterator and locIterator iterate over the cached inverted
 list, NOT recursively over the query arguments.
+
+The iterator positions are stored in the query operator, not in
+the inverted list.  Inverted lists may be shared by several query
+operators (e.g., via InvListCache), so they must not be modified
+after they are evaluated.
 """
 
 # Copyright (c) 2023, Carnegie Mellon University.  All Rights Reserved.
 
 import sys
 
+# NumPy is optional.  It is needed only for vectorized evaluation.
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from InvList import InvList
+from InvListCompressed import InvListCompressed
+from InvListLazy import InvListLazy
+from InvListStream import InvListStream
 from Qry import Qry
 
 class QryIop(Qry):
@@ -48,10 +66,66 @@ class QryIop(Qry):
         Qry.__init__(self)		# Inherit from Qry
         self._field = None
         self._invertedList = None
+        self._postingsMode = InvList.POSITIONS
         self._docIteratorIndex = QryIop.INVALID_ITERATOR_INDEX
         self._locIteratorIndex = QryIop.INVALID_ITERATOR_INDEX
 
 
+    def _appendLocations(self, docids, keys, stride):
+        """
+        Append postings for vectorized matches to the inverted list.
+
+        docids: A NumPy array of docids, indexed by document rank.
+        keys: A sorted NumPy array of match locations encoded as keys
+          (see _getArgLocations).  Only their counts are recorded if
+          the inverted list is count-only (see _createInvList).
+        stride: The key stride.
+        """
+        if len(keys) == 0:
+            return
+
+        ranks = keys // stride
+        starts = np.flatnonzero(np.append(True, ranks[1:] != ranks[:-1]))
+        tfs = np.diff(np.append(starts, len(ranks)))
+
+        if self.invertedList.postingsMode == InvList.POSITIONS:
+            positions = (keys - ranks * stride).tolist()
+        else:
+            positions = None
+
+        self.invertedList.appendPostings(docids[ranks[starts]].tolist(),
+                                         tfs.tolist(), positions)
+
+
+    def _canReset(self):
+        """
+        True iff the iterators of the operator's (initialized)
+        arguments can be moved back to the first document, i.e., no
+        inverted list below the operator is streamed.
+        """
+        for q_i in self._args:
+            if (isinstance(q_i.invertedList, InvListStream) or
+                not q_i._canReset()):
+                return(False)
+
+        return(True)
+
+
+    def _createInvList(self):
+        """
+        Create an empty inverted list for the operator's results.  If
+        the consumer doesn't need locations (e.g., #SCORE, see
+        setPostingsMode), the list is count-only: it records just the
+        docid and the number of matches of each posting.
+
+        Returns an empty InvList.
+        """
+        if self._postingsMode != InvList.POSITIONS:
+            return(InvList(self._field, None, InvList.FREQS))
+
+        return(InvList(self._field))
+
+
     def docIteratorAdvancePast(self, docid):
         """
         Advance the query operator's internal iterator beyond the
@@ -59,11 +133,8 @@ class QryIop(Qry):
 
         docid: The document's internal document id.
         """
-        while ((self.docIteratorIndex < self.invertedList.df) and
-               (self.invertedList.getDocid(self.docIteratorIndex) <=
-                 docid)):
-            self.docIteratorIndex += 1
-           
+        self.docIteratorIndex = self.invertedList.findDocidPast(
+            docid, self.docIteratorIndex)
         self.locIteratorIndex = 0
 
 
@@ -74,11 +145,8 @@ class QryIop(Qry):
 
         docid: The document's internal document id.
         """
-        while ((self.docIteratorIndex < self.invertedList.df) and
-               (self.invertedList.getDocid(self.docIteratorIndex) <
-                 docid)):
-            self.docIteratorIndex += 1
-
+        self.docIteratorIndex = self.invertedList.findDocid(
+            docid, self.docIteratorIndex)
         self.locIteratorIndex = 0
 
 
@@ -87,7 +155,7 @@ class QryIop(Qry):
         Advance the query operator's internal iterator beyond the
         any possible document.
         """
-        self.docIteratorIndex = len(self.invertedList.postings)
+        self.docIteratorIndex = self.invertedList.df
 
 
     def docIteratorGetMatch(self):
@@ -108,7 +176,29 @@ class QryIop(Qry):
         now, or throw an error if the docIterator doesn't point at a document.
         Returns a document posting.
         """
-        return(self.invertedList.postings[self.docIteratorIndex])
+        return(self.invertedList.getPosting(self.docIteratorIndex))
+
+
+    def docIteratorGetMatchPositions(self):
+        """
+        Return the locations in the document that the docIterator points
+        to now.  This is cheaper than docIteratorGetMatchPosting when
+        only the locations are needed.
+
+        Returns an array of document locations.
+        """
+        return(self.invertedList.getPositions(self.docIteratorIndex))
+
+
+    def docIteratorGetMatchTf(self):
+        """
+        Return the term frequency (tf) of the document that the docIterator
+        points to now.  This is cheaper than docIteratorGetMatchPosting
+        when only the tf is needed.
+
+        Returns the term frequency.
+        """
+        return(self.invertedList.getTf(self.docIteratorIndex))
 
 
     def docIteratorHasMatch(self, r):
@@ -121,6 +211,116 @@ class QryIop(Qry):
         return(self.docIteratorIndex < self.invertedList.df)
 
 
+    def docIteratorReset(self):
+        """
+        Move the query operator's internal iterator back to the first
+        document.  Lazy inverted lists also reset their arguments.
+        Streamed inverted lists can't be reset (see _canReset).
+        """
+        if isinstance(self.invertedList, InvListLazy):
+            self.invertedList.reset()
+
+        self.docIteratorIndex = 0
+        self.locIteratorIndex = 0
+
+
+    def _getArgInvLists(self):
+        """
+        Get the arguments' inverted lists as InvList objects, for
+        vectorized evaluation.  Compressed lists are decompressed.
+
+        Returns a list of InvList, or None if NumPy isn't available or
+        an argument's inverted list is streamed or lazy.
+        """
+        if np is None:
+            return(None)
+
+        invLists = []
+        for q_i in self._args:
+            invList = q_i.invertedList
+            if isinstance(invList, (InvListStream, InvListLazy)):
+                return(None)
+            if isinstance(invList, InvListCompressed):
+                invList = invList.decompress()
+            invLists.append(invList)
+
+        return(invLists)
+
+
+    def _getArgLocations(self, slack):
+        """
+        Get the locations of the arguments in the documents that all of
+        them match, for vectorized evaluation.  Each location is encoded
+        as a key, rank * stride + location, where rank is the document's
+        rank among the matched documents.  Thus one sorted array per
+        argument holds the locations in all of the documents, and
+        locations in different documents are more than slack apart.
+        The argument iterators must not have been used yet.
+
+        slack: The largest location difference that an operator
+          compares.
+
+        Returns (docids, keys, stride), where docids is a NumPy array
+        of the matched docids and keys is a list of NumPy arrays, one
+        per argument.  Returns None if NumPy isn't available or an
+        argument's inverted list is streamed or lazy.
+        """
+        invLists = self._getArgInvLists()
+        if invLists is None:
+            return(None)
+
+        docids = Qry._intersectDocids(
+            [np.frombuffer(invList.docids, dtype=np.intc)
+             for invList in invLists])
+
+        # Gather each argument's locations in the matched documents.
+        ranks = []
+        locations = []
+        for invList in invLists:
+            n = np.searchsorted(np.frombuffer(invList.docids, dtype=np.intc),
+                                docids)
+            tfs = np.frombuffer(invList.tfs, dtype=np.intc)[n]
+            starts = np.frombuffer(invList.offsets, dtype=np.int64)[n]
+            ends = np.cumsum(tfs, dtype=np.int64)
+            j = (np.repeat(starts - (ends - tfs), tfs) +
+                 np.arange(ends[-1] if len(ends) > 0 else 0))
+            ranks.append(np.repeat(np.arange(len(docids), dtype=np.int64),
+                                   tfs))
+            locations.append(np.frombuffer(invList.positions,
+                                           dtype=np.intc)[j].astype(np.int64))
+
+        stride = max([int(l.max()) for l in locations if len(l) > 0],
+                     default=0) + max(slack, 0) + 1
+        keys = [r * stride + l for r, l in zip(ranks, locations)]
+        return((docids, keys, stride))
+
+
+    def _getDocidArray(self):
+        """
+        Get the docids of the inverted list as a NumPy array, for
+        small-vs-small intersection.
+
+        Returns a NumPy array, or None if NumPy isn't available or the
+        inverted list is compressed, streamed, or lazy.
+        """
+        if np is None or isinstance(self.invertedList, (
+                InvListCompressed, InvListStream, InvListLazy)):
+            return(None)
+
+        return(np.frombuffer(self.invertedList.docids, dtype=np.intc))
+
+
+    def getBlockMetadata(self):
+        """
+        Get the block metadata of this query operator's inverted list
+        (see InvList.getBlockMetadata).  It is an error to call this
+        method before the object's initialize method is called.
+
+        Returns a tuple of three arrays, or None if it isn't known.
+        """
+        return(self.invertedList.getBlockMetadata())
+
+
     def getCtf(self):
         """
         Get the collection term frequency (ctf) associated with this
@@ -143,6 +343,61 @@ class QryIop(Qry):
         return(self.invertedList.df)
 
 
+    def _getDocLocations(self, keys, rank, stride):
+        """
+        Get the locations of the arguments in one document from the
+        keys of _getArgLocations.
+
+        keys: A list of NumPy arrays of keys, one per argument.
+        rank: The document's rank.
+        stride: The key stride.
+
+        Returns a list of location lists, one per argument.
+        """
+        base = rank * stride
+        return([(k[np.searchsorted(k, base):
+                   np.searchsorted(k, base + stride)] - base).tolist()
+                for k in keys])
+
+
+    def getMaxTf(self):
+        """
+        Get the largest term frequency in this query operator's inverted
+        list.  It is an error to call this method before the object's
+        initialize method is called.
+
+        Returns the largest tf, or None if it isn't known.
+        """
+        return(self.invertedList.getMaxTf())
+
+
+    def getMinFieldLength(self):
+        """
+        Get the smallest field length of any document in this query
+        operator's inverted list.  It is an error to call this method
+        before the object's initialize method is called.
+
+        Returns the smallest field length (0 if it isn't known).
+        """
+        return(self.invertedList.getMinFieldLength())
+
+
+    def _getNextMatch(self, docid):
+        """
+        Advance the arguments to the first document at or after docid
+        that the operator matches, and find its locations.  This is
+        how InvListLazy evaluates an operator one document at a time.
+        Operators that have arguments must implement it.
+
+        docid: An internal document id.
+
+        Returns (docid, locations), where locations is a sorted list,
+        or None if there are no more matches.
+        """
+        raise Exception('Error: ' + type(self).__name__ +
+                        ' cannot be evaluated lazily.')
+
+
     def initialize(self, r):
         """
         Initialize the query operator (and its arguments), including any
@@ -152,12 +407,20 @@ class QryIop(Qry):
         r: A retrieval model (that is ignored)
         """
 
-        # Initialize the query arguments (if any).
+        # Initialize the query arguments (if any).  Operators that have
+        # arguments combine their locations, so the arguments need them.
         for q_i in self._args:
+            q_i.setPostingsMode(InvList.POSITIONS)
             q_i.initialize(r)
 
-        # Evaluate the operator.
-        self.evaluate()
+        # Evaluate the operator, or let the consumer drive it lazily.
+        # A lazy list resets its arguments after its counting pass,
+        # which streamed lists don't allow, unless its counts are known.
+        if (InvListLazy.enabled and len(self._args) > 0 and
+            (InvListLazy.hasStats(self) or self._canReset())):
+            self.invertedList = InvListLazy(self, self._postingsMode)
+        else:
+            self.evaluate()
 
         # Initialize the internal iterators.
         self.docIteratorIndex = 0
@@ -178,12 +441,8 @@ class QryIop(Qry):
         specified location.
         loc: The location to advance beyond.
         """
-        tf = self.invertedList.postings[self.docIteratorIndex].tf
-        positions = self.invertedList.postings[self.docIteratorIndex].positions
-
-        while (self.locIteratorIndex < tf and
-                positions[self.locIteratorIndex] <= loc):
-            self.locIteratorIndex += 1
+        self.locIteratorIndex = self.invertedList.findLocationPast(
+            self.docIteratorIndex, loc, self.locIteratorIndex)
 
 
     def locIteratorFinish(self):
@@ -191,7 +450,7 @@ class QryIop(Qry):
         Advance the query operator's internal iterator beyond
         any possible location.
         """
-        self.locIteratorIndex = self.invertedList.postings[self.docIteratorIndex].tf
+        self.locIteratorIndex = self.invertedList.getTf(self.docIteratorIndex)
 
 
     def locIteratorGetMatch(self):
@@ -202,8 +461,8 @@ class QryIop(Qry):
         iterator doesn't point to a location, an invalid document
         location is returned.
         """
-        locations = self.docIteratorGetMatchPosting().positions
-        return(locations[self.locIteratorIndex])
+        return(self.invertedList.getLocation(self.docIteratorIndex,
+                                             self.locIteratorIndex))
 
 
     def locIteratorHasMatch(self):
@@ -214,3 +473,15 @@ class QryIop(Qry):
         """
         return(self.locIteratorIndex <
                 self.invertedList.getTf(self.docIteratorIndex))
+
+
+    def setPostingsMode(self, postingsMode):
+        """
+        Declare what the consumer of this operator's inverted list
+        needs: InvList.POSITIONS, InvList.FREQS, or InvList.DOCS.  The
+        default is InvList.POSITIONS, which is always safe.  This must
+        be called before the operator is initialized.
+
+        postingsMode: The postings mode.
+        """
+        self._postingsMode = postingsMode
@@ -1,5 +1,13 @@
 """The NEAR operator for all retrieval models."""
 
+from bisect import bisect_left
+
+# NumPy is optional.  It is needed only for vectorized evaluation.
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 from InvList import InvList
 from QryIop import QryIop
 
@@ -21,84 +29,173 @@ class QryIopNear(QryIop):
         throws IOException: Error accessing the Lucene index.
         """
 
-        # Create an empty inverted list.
-        self.invertedList = InvList(self._field)
+        # Create an empty inverted list.  It is count-only if the
+        # consumer doesn't need locations.
+        self.invertedList = self._createInvList()
+        countOnly = self.invertedList.postingsMode != InvList.POSITIONS
 
         # Should not occur if the query optimizer did its job
-        if len(self._args) == 0:	
-            return		
-        
-        # Advance all doc iterators until they point to the same document
-        while self.docIteratorHasMatchAll(None):
-        
-            # Initialize i = 0, locations with a empty list
-            i = 0
-            locations = []
-            break_outer_loop = False
-
-            # Begin Loop
-            while i < len(self._args)-1:
-                
-                # Ending criteria: any of the loc iterators is exhausted
-                for q in self._args:
-                    if not q.locIteratorHasMatch():
-                        break_outer_loop = True
-                        break
-                
-                if break_outer_loop:
-                    break
+        if len(self._args) == 0:
+            return
+
+        # The common two-argument case is vectorized, if possible.
+        if len(self._args) == 2:
+            located = self._getArgLocations(self.distance)
+            if located is not None:
+                self.__evaluateVectorized(*located)
+                return
+
+        # Save the right most locations of each match, or just count them
+        match = self._getNextMatch(0)
+        while match is not None:
+            docid, locations = match
+            if countOnly:
+                self.invertedList.appendPostings([docid], [len(locations)])
+            else:
+                self.invertedList.appendPosting(docid,locations)
+            match = self._getNextMatch(docid + 1)
+
+
+    def __evaluateVectorized(self, docids, keys, stride):
+        """
+        Evaluate a two-argument NEAR operator for all documents at once.
+        For each location a of the first argument, searchsorted finds
+        the first location b of the second argument that is at least a.
+        If b - a <= distance, b is a match.  This is what the greedy
+        search finds, unless b also is the first location for the next
+        location of the first argument; the greedy search then moves
+        that one to the next b.  Documents where that happens are
+        evaluated by __getMatches.
+
+        docids: A NumPy array of the matched docids.
+        keys: A list of two NumPy arrays of location keys.
+        stride: The key stride.
+        """
+        a, b = keys
+
+        if len(a) == 0 or len(b) == 0:
+            return
+
+        f = np.searchsorted(b, a)
+        found = f < len(b)
+        match = np.zeros(len(a), dtype=bool)
+        match[found] = a[found] + self.distance >= b[f[found]]
+
+        # Documents where two locations would match the same b.
+        conflicts = match[:-1] & (f[1:] == f[:-1])
+        conflictRanks = np.unique(a[1:][conflicts] // stride)
+
+        matches = b[f[match]]
 
-                # Initialize q[i], q[i+1]
-                q_i,q_i_plus_1 = self._args[i],self._args[i+1]
-                q_i_loc,q_i_plus_1_loc = q_i.locIteratorGetMatch(),q_i_plus_1.locIteratorGetMatch()
-                docid = q_i.docIteratorGetMatch()
-
-                # Advance q[i+1].loc to q[i].loc
-                while q_i_plus_1_loc < q_i_loc:
-                    q_i_plus_1.locIteratorAdvance()
-                    if q_i_plus_1.locIteratorHasMatch():
-                        q_i_plus_1_loc = q_i_plus_1.locIteratorGetMatch()
-                    else:
-                        break_outer_loop = True
+        if len(conflictRanks) > 0:
+            matches = [matches[~np.isin(matches // stride, conflictRanks)]]
+            for rank in conflictRanks.tolist():
+                locations = self.__getMatches(
+                    self._getDocLocations(keys, rank, stride))
+                matches.append(np.array(locations, dtype=np.int64) +
+                               rank * stride)
+            matches = np.concatenate(matches)
+
+        if len(matches) == 0:
+            return
+
+        # Sort and save right most locations
+        matches = np.sort(matches)
+        matches = matches[np.append(True, matches[1:] != matches[:-1])]
+        self._appendLocations(docids, matches, stride)
+
+
+    def __getMatches(self, positions):
+        """
+        Find the NEAR matches in one document.  Each argument's
+        locations are in a sorted buffer that is indexed directly, and
+        a binary search (bisect_left) advances argument i+1 to argument
+        i's location, instead of a loop of locIterator calls.  The
+        matches are the same as a locIterator walk: a greedy,
+        left-to-right search that backtracks to argument i-1 when
+        argument i+1 is too far from argument i, and that stops when
+        any argument runs out of locations.
+
+        positions: A list of sorted location arrays, one per argument.
+
+        Returns a list of the right most locations of the matches.
+        """
+        n = len(positions)
+        lengths = [len(p) for p in positions]
+        cursors = [0] * n
+        locations = []
+        i = 0
+
+        # Ending criteria: any of the loc iterators is exhausted
+        if n < 2 or min(lengths) == 0:
+            return(locations)
+
+        while True:
+            q_i_loc = positions[i][cursors[i]]
+
+            # Advance q[i+1].loc to q[i].loc
+            j = bisect_left(positions[i+1], q_i_loc, cursors[i+1])
+            cursors[i+1] = j
+            if j == lengths[i+1]:
+                break
+            q_i_plus_1_loc = positions[i+1][j]
+
+            # distance constraint satisfied
+            if q_i_loc + self.distance >= q_i_plus_1_loc:
+
+                # i + 1 is not the last argument
+                if i + 1 != n-1:
+                    i += 1
+
+                # i + 1 is the last argument
+                else:
+                    locations.append(q_i_plus_1_loc)
+                    exhausted = False
+                    for k in range(n):
+                        cursors[k] += 1
+                        exhausted = exhausted or cursors[k] == lengths[k]
+                    if exhausted:
                         break
+                    i = 0
 
-                if break_outer_loop:
+            # distance constraint not satisfied
+            else:
+                cursors[i] += 1
+                if cursors[i] == lengths[i]:
                     break
-                
-                # distance constraint satisfied
-                if q_i_loc + self.distance >= q_i_plus_1_loc:
-
-                    # i + 1 is not the last argument
-                    if i + 1 != len(self._args)-1:
-                        i += 1
-
-                    # i + 1 is the last argument
-                    else:
-                        locations.append(q_i_plus_1_loc)
-                        for q in self._args:
-                            q.locIteratorAdvance()
-                        i = 0
-
-                # distance constraint not satisfied
-                else:
-                    q_i.locIteratorAdvance()
-                    i = max(0,i-1)
-            
-            # Sort and save right most locations
-            if len(locations) > 0:
-                locations = sorted(set(locations))
-                self.invertedList.appendPosting(docid,locations)
-            
-            # Advance all doc iterators
-            for q in self._args:
-                q.docIteratorAdvancePast(docid)
+                i = max(0,i-1)
+
+        return(locations)
+
 
+    def _getNextMatch(self, docid):
+        """
+        Advance the arguments to the first document at or after docid
+        that has a NEAR match, and find its matches.
+
+        docid: An internal document id.
 
+        Returns (docid, locations), where locations is a sorted list of
+        the right most locations of the matches, or None if there are
+        no more matches.
+        """
+        for q in self._args:
+            q.docIteratorAdvanceTo(docid)
+
+        # Advance all doc iterators until they point to the same document
+        while self.docIteratorHasMatchAll(None):
+            docid = self._args[0].docIteratorGetMatch()
 
-                
-                    
-                     
+            # Match the argument locations in position buffers
+            locations = self.__getMatches(
+                [q.docIteratorGetMatchPositions() for q in self._args])
 
+            # Sort the right most locations
+            if len(locations) > 0:
+                return((docid, sorted(set(locations))))
 
+            # Advance all doc iterators
+            for q in self._args:
+                q.docIteratorAdvancePast(docid)
 
-            
+        return(None)
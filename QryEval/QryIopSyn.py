@@ -2,8 +2,15 @@
 
 # Copyright (c) 2023, Carnegie Mellon University.  All Rights Reserved.
 
+# NumPy is optional.  It is needed only for vectorized evaluation.
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 from InvList import InvList
 from QryIop import QryIop
+from UnionIterator import UnionIterator
 
 class QryIopSyn(QryIop):
     """The SYN operator for all retrieval models."""
@@ -23,37 +30,103 @@ class QryIopSyn(QryIop):
         throws IOException: Error accessing the Lucene index.
         """
 
-        # Create an empty inverted list.
-        self.invertedList = InvList(self._field)
+        # Create an empty inverted list.  It is count-only if the
+        # consumer doesn't need locations.
+        self.invertedList = self._createInvList()
+        countOnly = self.invertedList.postingsMode != InvList.POSITIONS
 
         if len(self._args) == 0:	# Should not occur if the
             return			# query optimizer did its job
 
-        # Each pass of the loop adds 1 document to result inverted list
-        # until all of the argument inverted lists are depleted.
-        while True:
+        invLists = self._getArgInvLists()
+        if invLists is not None:
+            self.__evaluateVectorized(invLists)
+            return
 
-            # Locations will be merged for the minimum next document id.
-            minDocid = None
+        # A k-way merge of the arguments' docids, so the minimum docid
+        # is found in O(log k) time.
+        union = UnionIterator(self._args, None)
 
-            for q_i in self._args:
-                if q_i.docIteratorHasMatch(None):
-                    q_iDocid = q_i.docIteratorGetMatch()
-                    if minDocid == None or minDocid > q_iDocid:
-                        minDocid = q_iDocid
+        # Each pass of the loop adds 1 document to result inverted list
+        # until all of the argument inverted lists are depleted.
+        while union.hasMatch():
+            minDocid = union.getDocid()
 
-            if minDocid == None:
-                break			# All docids were processed. Done.
-      
             # Create and save a new posting that is the union of the
             # posting lists for minDocid.  Locations that appear in
             # multiple arguments (e.g., #SYN(cat cat dog)) are fine.
             positions = []
-            for q_i in self._args:
-                if (q_i.docIteratorHasMatch(None) and
-                    q_i.docIteratorGetMatch() == minDocid):
-                    positions += q_i.docIteratorGetMatchPosting().positions
-                    q_i.docIteratorAdvancePast(minDocid)
-
-            positions = sorted(set(positions))	# sorted & unique
-            self.invertedList.appendPosting (minDocid, positions)
+            for i in union.getMatches():
+                positions += self._args[i].docIteratorGetMatchPositions()
+
+            union.advancePast(minDocid)
+
+            if countOnly:
+                self.invertedList.appendPostings([minDocid],
+                                                 [len(set(positions))])
+            else:
+                positions = sorted(set(positions))	# sorted & unique
+                self.invertedList.appendPosting (minDocid, positions)
+
+
+    def __evaluateVectorized(self, invLists):
+        """
+        Evaluate the operator for all documents at once.  Each location
+        is encoded as a key, (docid << 32) | location, so the sorted,
+        unique keys of all of the arguments are the postings of the
+        result in docid order, with sorted, unique locations.
+
+        invLists: A list of the arguments' InvList objects.
+        """
+        keys = []
+        for invList in invLists:
+            tfs = np.frombuffer(invList.tfs, dtype=np.intc)
+            docids = np.repeat(
+                np.frombuffer(invList.docids, dtype=np.intc).astype(np.int64),
+                tfs)
+            positions = np.frombuffer(invList.positions, dtype=np.intc)
+            keys.append((docids << 32) | positions[:len(docids)])
+
+        keys = np.sort(np.concatenate(keys))
+        if len(keys) == 0:
+            return
+
+        keys = keys[np.append(True, keys[1:] != keys[:-1])]
+        docids = keys >> 32
+        starts = np.flatnonzero(np.append(True, docids[1:] != docids[:-1]))
+        tfs = np.diff(np.append(starts, len(docids)))
+
+        if self.invertedList.postingsMode == InvList.POSITIONS:
+            positions = (keys & 0xffffffff).tolist()
+        else:
+            positions = None
+
+        self.invertedList.appendPostings(docids[starts].tolist(), tfs.tolist(),
+                                         positions)
+
+
+    def _getNextMatch(self, docid):
+        """
+        Advance the arguments to docid, and find the union of their
+        locations in the first document at or after docid that any of
+        them matches.
+
+        docid: An internal document id.
+
+        Returns (docid, locations), where locations is a sorted list,
+        or None if there are no more matches.
+        """
+        if self._union is None:
+            self._union = UnionIterator(self._args, None)
+
+        self._union.advanceTo(docid)
+
+        if not self._union.hasMatch():
+            return(None)
+
+        positions = []
+        for i in self._union.getMatches():
+            positions += self._args[i].docIteratorGetMatchPositions()
+
+        return((self._union.getDocid(),
+                sorted(set(positions))))	# sorted & unique
@@ -11,6 +11,9 @@ queries with nested query operators.
 import sys
 
 from InvList import InvList
+from InvListCache import InvListCache
+from InvListCompressed import InvListCompressed
+from InvListStream import InvListStream
 from QryIop import QryIop
 
 class QryIopTerm(QryIop):
@@ -47,7 +50,27 @@ class QryIopTerm(QryIop):
 
         @throws IOException: Error accessing the Lucene index.
         """
-        self.invertedList = InvList(self._field, self._term)
+        self.invertedList = InvListCache.get(self._field, self._term,
+                                             self._postingsMode)
+
+        if self.invertedList is not None:
+            return
+
+        # A streamed inverted list is read lazily, and only once, so it
+        # is not cached.
+        if InvListStream.enabled:
+            self.invertedList = InvListStream(self._field, self._term,
+                                              self._postingsMode)
+        else:
+            self.invertedList = InvList(self._field, self._term,
+                                        self._postingsMode)
+
+            # Long inverted lists may be compressed to save memory.
+            if (InvListCompressed.minDf is not None and
+                self.invertedList.df >= InvListCompressed.minDf):
+                self.invertedList = InvListCompressed(self.invertedList)
+
+            InvListCache.put(self._term, self.invertedList)
 
 
 
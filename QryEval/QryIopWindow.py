@@ -1,5 +1,13 @@
 """The WINDOW operator for all retrieval models."""
 
+import heapq
+
+# NumPy is optional.  It is needed only for vectorized evaluation.
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 from InvList import InvList
 from QryIop import QryIop
 
@@ -14,48 +22,169 @@ class QryIopWindow(QryIop):
         self.window = window
 
     def evaluate(self):
-        self.invertedList = InvList(self._field)
+        # The inverted list is count-only if the consumer doesn't need
+        # locations.
+        self.invertedList = self._createInvList()
+        countOnly = self.invertedList.postingsMode != InvList.POSITIONS
 
         if len(self._args) == 0:
             return
 
+        # The common two-argument case is vectorized, if possible.
+        if len(self._args) == 2:
+            located = self._getArgLocations(self.window)
+            if located is not None:
+                self.__evaluateVectorized(*located)
+                return
+
+        match = self._getNextMatch(0)
+        while match is not None:
+            docid, positions = match
+            if countOnly:
+                self.invertedList.appendPostings([docid], [len(positions)])
+            else:
+                self.invertedList.appendPosting(docid, positions)
+            match = self._getNextMatch(docid + 1)
+
+
+    def __evaluateVectorized(self, docids, keys, stride):
+        """
+        Evaluate a two-argument WINDOW operator for all documents at
+        once.  The locations of both arguments are merged (ties put the
+        first argument first).  When the sliding window's minimum is
+        location k of the merged list, its maximum is the next location
+        of the other argument.  If that is location k+1 and the window
+        is small enough, k and k+1 match and neither starts another
+        window, so the matches in a run of consecutive matching pairs
+        are every other pair, starting with the first.  If the next
+        location of the other argument is farther away (e.g., a a b),
+        the window consumes a location that a later window would use.
+        Documents where that happens are evaluated by __getMatches.
+
+        docids: A NumPy array of the matched docids.
+        keys: A list of two NumPy arrays of location keys.
+        stride: The key stride.
+        """
+        if self.window <= 0:		# No window is small enough
+            return
+
+        merged = np.concatenate(keys)
+        labels = np.repeat([0, 1], [len(keys[0]), len(keys[1])])
+        order = np.lexsort((labels, merged))
+        merged, labels = merged[order], labels[order]
+        n = len(merged)
+        k = np.arange(n)
+
+        # The index of the next location of the other argument.
+        partners = np.full(n, n)
+        for label in (0, 1):
+            mine = labels == label
+            others = np.flatnonzero(~mine)
+            j = np.searchsorted(others, k[mine], side='right')
+            partners[mine] = np.append(others, n)[j]
+
+        found = partners < n
+        match = np.zeros(n, dtype=bool)
+        match[found] = merged[partners[found]] - merged[found] < self.window
+
+        conflicts = match & (partners != k + 1)
+        conflictRanks = np.unique(merged[conflicts] // stride)
+
+        if len(conflictRanks) > 0:
+            match &= ~np.isin(merged // stride, conflictRanks)
+
+        # Every other pair in each run of matching pairs.
+        starts = match & ~np.append(False, match[:-1])
+        runStarts = np.maximum.accumulate(np.where(starts, k, 0))
+        match &= (k - runStarts) % 2 == 0
+
+        matches = merged[np.flatnonzero(match) + 1]
+
+        if len(conflictRanks) > 0:
+            matches = [matches]
+            for rank in conflictRanks.tolist():
+                positions = self.__getMatches(
+                    self._getDocLocations(keys, rank, stride))
+                matches.append(np.array(positions, dtype=np.int64) +
+                               rank * stride)
+            matches = np.sort(np.concatenate(matches))
+
+        self._appendLocations(docids, matches, stride)
+
+
+    def __getMatches(self, positions):
+        """
+        Find the WINDOW matches in one document.  A window slides over
+        the merged argument locations.  Its minimum is the top of a
+        heap of (location, argument) pairs, one for the current
+        location of each argument, and its maximum is a running
+        maximum, because locations only increase.  If the window is
+        small enough, its maximum is a match and every argument
+        advances; otherwise the argument at the minimum (the first one,
+        if there are ties) advances.  Matching stops when any argument
+        runs out of locations.
+
+        positions: A list of sorted location arrays, one per argument.
+
+        Returns a list of the right most locations of the matches.
+        """
+        lengths = [len(p) for p in positions]
+        cursors = [0] * len(positions)
+        matches = []
+
+        if min(lengths) == 0:
+            return(matches)
+
+        while True:
+            heads = [(p[c], i)
+                     for i, (p, c) in enumerate(zip(positions, cursors))]
+            heapq.heapify(heads)
+            max_pos = max(heads)[0]
+
+            # Advance the minimum until the window is small enough.
+            while max_pos - heads[0][0] >= self.window:
+                i = heads[0][1]
+                cursors[i] += 1
+                if cursors[i] == lengths[i]:
+                    return(matches)
+
+                pos = positions[i][cursors[i]]
+                heapq.heapreplace(heads, (pos, i))
+                if pos > max_pos:
+                    max_pos = pos
+
+            # Save the match and advance every argument.
+            matches.append(max_pos)
+            for i in range(len(cursors)):
+                cursors[i] += 1
+                if cursors[i] == lengths[i]:
+                    return(matches)
+
+
+    def _getNextMatch(self, docid):
+        """
+        Advance the arguments to the first document at or after docid
+        that has a WINDOW match, and find its matches.
+
+        docid: An internal document id.
+
+        Returns (docid, locations), where locations is a sorted list of
+        the right most locations of the matches, or None if there are
+        no more matches.
+        """
+        for q in self._args:
+            q.docIteratorAdvanceTo(docid)
+
         while self.docIteratorHasMatchAll(None):
             docid = self._args[0].docIteratorGetMatch()
-            positions = []
-
-            while True:
-                min_pos = float('inf')
-                max_pos = float('-inf')
-                min_arg_idx = 0
-                max_arg_idx = 0
-
-                done = False
-                for i, q in enumerate(self._args):
-                    if not q.locIteratorHasMatch():
-                        done = True
-                        break
-
-                    pos = q.locIteratorGetMatch()
-                    if pos < min_pos:
-                        min_pos = pos
-                        min_arg_idx = i
-                    if pos > max_pos:
-                        max_pos = pos
-                        max_arg_idx = i
-                
-                if done:
-                    break
-
-                if max_pos >= min_pos and max_pos - min_pos < self.window:
-                    positions.append(self._args[max_arg_idx].locIteratorGetMatch())
-                    for q in self._args:
-                        q.locIteratorAdvance()
-                else:
-                    self._args[min_arg_idx].locIteratorAdvance()
+            positions = self.__getMatches(
+                [q.docIteratorGetMatchPositions() for q in self._args])
 
             if positions:
                 positions.sort()
-                self.invertedList.appendPosting(docid, positions)
-            
+                return((docid, positions))
+
             for q in self._args:
                 q.docIteratorAdvancePast(docid)
+
+        return(None)
@@ -16,6 +16,7 @@ from QrySopAnd import QrySopAnd
 from QrySopScore import QrySopScore
 from QrySopSum import QrySopSum
 from QryIopWindow import QryIopWindow
+from QryPlanner import QryPlanner
 from QrySopWSum import QrySopWSum
 from QrySopWAnd import QrySopWAnd
 
@@ -140,11 +141,13 @@ class QryParser:
 
 
     @staticmethod
-    def getQuery(queryString):
+    def getQuery(queryString, retrievalModel=None):
         """
         Parse a query string into a query tree.
 
         queryString: The query string, in an Indri-style query language.
+        retrievalModel: The retrieval model that will evaluate the
+          query, which determines how it is planned (see QryPlanner).
 
         Returns:  The query tree for the parsed query.
 
@@ -155,6 +158,10 @@ class QryParser:
         QryParser.__init()
         q = QryParser.parseString(queryString)	# An exact parse
         q = QryParser.optimizeQuery(q)		# An optimized parse
+
+        if q is not None:
+            QryPlanner.plan(q, retrievalModel)	# An evaluation plan
+
         return(q)
 
 
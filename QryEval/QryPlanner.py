@@ -0,0 +1,117 @@
+"""
+QryPlanner chooses how the conjunctions in an optimized query tree
+are evaluated.
+"""
+
+# Copyright (c) 2026, Carnegie Mellon University.  All Rights Reserved.
+
+from Idx import Idx
+from InvListLazy import InvListLazy
+from QryIop import QryIop
+from QryIopNear import QryIopNear
+from QryIopTerm import QryIopTerm
+from QryIopWindow import QryIopWindow
+from QrySopAnd import QrySopAnd
+from RetrievalModelIndri import RetrievalModelIndri
+
+
+class QryPlanner:
+    """
+    QryPlanner chooses how the conjunctions in a query tree are
+    evaluated.  It runs after QryParser.optimizeQuery and before the
+    query is initialized.
+
+    Qry.docIteratorHasMatchAll finds a match by letting its first
+    argument propose a docid and advancing the other arguments to it.
+    The planner estimates the df of each argument and orders the
+    arguments rarest first, so the shortest list proposes docids and
+    the next shortest rejects most of them.  Conjunctions that have
+    many arguments use a small-vs-small intersection of their
+    arguments' docids instead, if the arguments' inverted lists are
+    materialized.
+
+    Indri's #AND matches documents that match any argument (see
+    QrySopAnd.docIteratorHasMatch), so it isn't a conjunction and isn't
+    planned.  dfs are estimated only for the arguments of conjunctions,
+    so queries that have no conjunctions don't read any dfs.
+
+    The plan is stored in each operator (Qry._argOrder and Qry._svs).
+    The operator's arguments (Qry._args) are not reordered, so
+    position-sensitive operators such as #NEAR and the query string
+    (__str__) are unchanged.
+
+    df estimates come from the index (Idx.getDocFreq) for terms, from
+    InvListLazy's statistics for operators that it has counted, and
+    from simple bounds otherwise: the smallest argument df for
+    conjunctions, and the sum of the argument dfs (at most the number
+    of documents) for other operators.
+    """
+
+    # -------------- Constants and variables --------------- #
+
+    SVS_MIN_ARGS = 3		# Conjunctions this large use small-vs-small
+
+
+    # -------------- Methods (alphabetical) ---------------- #
+
+    @staticmethod
+    def __isConjunction(q, r):
+        """
+        True iff q matches with docIteratorHasMatchAll.
+
+        q: A query operator.
+        r: A retrieval model, or None.
+        """
+        if isinstance(q, QrySopAnd):
+            return(not isinstance(r, RetrievalModelIndri))
+
+        return(isinstance(q, (QryIopNear, QryIopWindow)))
+
+
+    @staticmethod
+    def plan(q, r=None):
+        """
+        Plan the evaluation of the conjunctions in a query tree.
+
+        q: An optimized query tree.
+        r: The retrieval model that will evaluate the query, or None.
+        """
+        QryPlanner.__plan(q, r, False)
+
+
+    @staticmethod
+    def __plan(q, r, needDf):
+        """
+        Plan the evaluation of the conjunctions in a query subtree, and
+        estimate its df if a conjunction above it needs the estimate.
+
+        q: An optimized query tree.
+        r: The retrieval model that will evaluate the query, or None.
+        needDf: True iff the df of q is needed.
+
+        Returns the estimated df of q, or None if it isn't needed.
+        """
+        if isinstance(q, QryIopTerm):
+            return(Idx.getDocFreq(q._field, q._term) if needDf else None)
+
+        isConjunction = QryPlanner.__isConjunction(q, r)
+        planned = isConjunction and len(q._args) > 1
+        dfs = [QryPlanner.__plan(q_i, r, needDf or planned)
+               for q_i in q._args]
+
+        if planned:
+            order = sorted(range(len(dfs)), key=lambda i: dfs[i])
+            q._argOrder = [q._args[i] for i in order]
+            q._svs = len(dfs) >= QryPlanner.SVS_MIN_ARGS
+
+        if not needDf:
+            return(None)
+
+        stats = InvListLazy.getStats(q) if isinstance(q, QryIop) else None
+
+        if stats is not None:
+            return(stats[0])
+        elif isConjunction:
+            return(min(dfs, default=0))
+        else:
+            return(min(sum(dfs), Idx.getNumDocs()))
@@ -11,8 +11,10 @@ common to all query operators that calculate document scores.
 
 # Copyright (c) 2023, Carnegie Mellon University.  All Rights Reserved.
 
+import math
 import sys
 
+from Idx import Idx
 from Qry import Qry
 
 class QrySop(Qry):
@@ -22,6 +24,10 @@ class QrySop(Qry):
 
     # -------------- Constants and variables --------------- #
 
+    # Score operators that prune use this much slack when comparing
+    # score upper bounds to the threshold, because upper bounds and
+    # scores are summed in different orders.
+    _SCORE_BOUND_EPSILON = 1e-9
 
 
     # -------------- Methods (alphabetical) ---------------- #
@@ -30,6 +36,347 @@ class QrySop(Qry):
     def __init__(self):
         Qry.__init__(self)		# Inherit from Qry
 
+        # Data for docIteratorHasMatchWand.  See initializeWand.
+        self._maxScores = None		# Upper bounds of argument scores
+        self._maxScoreBase = 0.0
+        self._maxScoreWeights = None
+        self._maxDefaultScores = None
+        self._blockMax = False
+        self._scoreThreshold = -math.inf
+        self._blocksSkipped = 0
+
+        # Data for docIteratorHasMatchMaxScore.  See initializeMaxScore.
+        self._logMaxScores = None	# Upper bounds of log score increments
+
+        # Data for getDefaultScore.  See _cacheDefaultScores.
+        self._defaultScoreField = None	# The field that the scores use
+        self._defaultScoreCache = None
+
+
+    def __getScoreIncrement(self, i, maxScore):
+        """
+        Get an upper bound on how much the i'th argument adds to the
+        score of a document that it matches, given an upper bound on
+        its score.
+        """
+        if self._maxScoreWeights is None:
+            return(maxScore)
+
+        return(self._maxScoreWeights[i] *
+               max(0.0, maxScore - self._maxDefaultScores[i]))
+
+
+    def __splitEssential(self, logThreshold):
+        """
+        Split the arguments into essential and non-essential arguments
+        for docIteratorHasMatchMaxScore.  A document that matches only
+        non-essential arguments cannot reach the threshold.
+
+        logThreshold: The log of the score threshold.
+        """
+        bound = self._logMaxScoreBase
+        k = 0
+
+        for i in self._maxScoreOrder:
+            if bound + self._logMaxScores[i] >= logThreshold:
+                break
+            bound += self._logMaxScores[i]
+            k += 1
+
+        self._essential = self._maxScoreOrder[k:]
+        self._nonEssential = self._maxScoreOrder[k-1::-1] if k > 0 else []
+        self._nonEssentialMaxScore = bound - self._logMaxScoreBase
+        self._maxScoreLogThreshold = logThreshold
+
+
+    def _cacheDefaultScores(self, defaultScore):
+        """
+        Memoize a function that returns default scores.  A default
+        score depends on the document only through its field lengths.
+        If every #SCORE operator in the subtree uses the same field, the
+        scores are cached in a table indexed by the document's length
+        of that field, which is shared by all documents of that length.
+        Otherwise, the score of the most recent document is cached.
+
+        defaultScore: A function of a docid that returns its default score.
+
+        Returns a function of a docid that returns its default score.
+        """
+        field = self._defaultScoreField
+
+        if field is None:
+            recent = [None, None]		# docid, score
+
+            def cachedByDocid(docid):
+                if recent[0] != docid:
+                    recent[1] = defaultScore(docid)
+                    recent[0] = docid
+                return(recent[1])
+
+            return(cachedByDocid)
+
+        lengths = Idx.getFieldLengths(field)
+        if lengths is not None:
+            getLength = lengths.__getitem__
+        else:
+            getLength = lambda docid: Idx.getFieldLength(field, docid)
+        table = {}			# field length -> score
+
+        def cachedByLength(docid):
+            length = getLength(docid)
+            score = table.get(length)
+            if score is None:
+                score = defaultScore(docid)
+                table[length] = score
+            return(score)
+
+        return(cachedByLength)
+
+
+    def compileDefaultScore(self, retrievalModel):
+        """
+        Compile getDefaultScore into a closure (see compileScore).
+        Operators that don't override this method use getDefaultScore.
+
+        retrievalModel: retrieval model parameters
+
+        Returns a function of a docid that returns the default score.
+        """
+        return(lambda docid: self.getDefaultScore(retrievalModel, docid))
+
+
+    def compileScore(self, retrievalModel):
+        """
+        Compile getScore into a closure for one retrieval model.  The
+        closure binds the model parameters, normalized weights,
+        per-term constants (e.g., idf and pMLE), and the compiled
+        closures of the arguments, so scoring a document is only
+        arithmetic.  It computes the same values as getScore, in the
+        same order.  This must be called after the operator is
+        initialized.  Operators that don't override this method use
+        getScore.
+
+        retrievalModel: retrieval model parameters
+
+        Returns a function of the docid that docIteratorHasMatch
+        matched that returns the document score.
+        """
+        return(lambda docid: self.getScore(retrievalModel))
+
+
+    def docIteratorHasMatchMaxScore(self, r):
+        """
+        An instantiation of docIteratorHasMatch that uses MaxScore
+        pruning.  It is true if the query has a document that matches
+        at least one query argument AND whose score might reach the
+        score threshold; the match is the smallest such docid.
+        initializeMaxScore must be called first.
+
+        Arguments whose score bounds together cannot reach the threshold
+        are non-essential; only documents that match an essential
+        argument are candidates.  A candidate's score bound is then
+        tightened by checking whether it matches the non-essential
+        arguments, and it is dropped as soon as the bound falls below
+        the threshold, before it is scored.  Documents are dropped only
+        if they cannot reach the threshold, so pruning is rank-safe.
+
+        r: The retrieval model that determines what is a match
+        Returns True if the query matches, otherwise False.
+        """
+        # In log space, the threshold is already a log score.
+        if r.logSpace:
+            if self._scoreThreshold == -math.inf:
+                return(self.docIteratorHasMatchMin(r))
+            logThreshold = self._scoreThreshold
+        else:
+            if self._scoreThreshold <= 0:
+                return(self.docIteratorHasMatchMin(r))
+            logThreshold = math.log(self._scoreThreshold)
+
+        self._union = None		# Arguments are advanced directly
+
+        logThreshold -= QrySop._SCORE_BOUND_EPSILON * max(1.0, abs(logThreshold))
+
+        if logThreshold != self._maxScoreLogThreshold:
+            self.__splitEssential(logThreshold)
+
+        if len(self._essential) == 0:
+            return(False)
+
+        while True:
+
+            # The candidate is the smallest docid of an essential argument.
+            candidate = None
+            for i in self._essential:
+                q_i = self._args[i]
+                if q_i.docIteratorHasMatch(r):
+                    docid = q_i.docIteratorGetMatch()
+                    if candidate is None or docid < candidate:
+                        candidate = docid
+
+            if candidate is None:
+                return(False)
+
+            # Bound the candidate's log score, assuming that it matches
+            # every non-essential argument.
+            bound = self._logMaxScoreBase + self._nonEssentialMaxScore
+            for i in self._essential:
+                q_i = self._args[i]
+                if (q_i.docIteratorHasMatch(r) and
+                    q_i.docIteratorGetMatch() == candidate):
+                    bound += self._logMaxScores[i]
+
+            # Tighten the bound with the non-essential arguments, largest
+            # bounds first, until it falls below the threshold.
+            for i in self._nonEssential:
+                if bound < logThreshold:
+                    break
+
+                q_i = self._args[i]
+                q_i.docIteratorAdvanceTo(candidate)
+                if not (q_i.docIteratorHasMatch(r) and
+                        q_i.docIteratorGetMatch() == candidate):
+                    bound -= self._logMaxScores[i]
+
+            if bound >= logThreshold:
+
+                # getScore expects every argument to be at or after
+                # the match.
+                for q_i in self._args:
+                    q_i.docIteratorAdvanceTo(candidate)
+
+                self.docIteratorSetMatchCache(candidate)
+                return(True)
+
+            for i in self._essential:
+                self._args[i].docIteratorAdvancePast(candidate)
+
+
+    def docIteratorHasMatchWand(self, r):
+        """
+        An instantiation of docIteratorHasMatch that uses WAND (weak
+        AND) pruning.  It is true if the query has a document that
+        matches at least one query argument AND whose score might reach
+        the score threshold; the match is the smallest such docid.
+        initializeWand must be called first.  If it enabled block
+        bounds (Block-Max WAND), documents are also skipped a block at
+        a time when the score bounds of the arguments' current blocks
+        cannot reach the threshold.  Documents are skipped only if they
+        cannot reach the threshold, so pruning is rank-safe.
+
+        r: The retrieval model that determines what is a match
+        Returns True if the query matches, otherwise False.
+        """
+        if self._scoreThreshold == -math.inf:
+            return(self.docIteratorHasMatchMin(r))
+
+        self._union = None		# Arguments are advanced directly
+
+        # Score bounds are probabilities, so a log space threshold is
+        # converted to a probability.
+        scoreThreshold = self._scoreThreshold
+        if getattr(r, 'logSpace', False):
+            scoreThreshold = math.exp(scoreThreshold)
+
+        threshold = (scoreThreshold - self._maxScoreBase -
+                     QrySop._SCORE_BOUND_EPSILON *
+                     max(1.0, abs(scoreThreshold)))
+
+        while True:
+
+            # Sort the arguments that have matches by their docids.
+            matches = []
+            for i, q_i in enumerate(self._args):
+                if q_i.docIteratorHasMatch(r):
+                    matches.append((q_i.docIteratorGetMatch(), i))
+
+            matches.sort()
+
+            # The pivot is the first docid where the sum of the score
+            # upper bounds of the arguments so far reaches the threshold.
+            # No document before the pivot can reach the threshold.
+            pivot = None
+            maxScore = 0.0
+
+            for docid, i in matches:
+                maxScore += self._maxScores[i]
+                if maxScore >= threshold:
+                    pivot = docid
+                    break
+
+            if pivot is None:
+                return(False)
+
+            # Block bounds of the arguments at or before the pivot hold
+            # until the end of the shortest block, or until the next
+            # argument's docid.  If they can't reach the threshold, no
+            # document in that range can.
+            if self._blockMax:
+                blockMaxScore = 0.0
+                nextDocid = math.inf
+
+                for docid, i in matches:
+                    if docid > pivot:
+                        nextDocid = min(nextDocid, docid)
+                        break
+
+                    block = self._args[i].getBlockMaxScore(r, pivot)
+
+                    if block is None:
+                        blockMaxScore += self._maxScores[i]
+                    else:
+                        blockMaxScore += self.__getScoreIncrement(i, block[0])
+                        nextDocid = min(nextDocid, block[1] + 1)
+
+                if blockMaxScore < threshold:
+                    self._blocksSkipped += 1
+
+                    if nextDocid == math.inf:
+                        return(False)
+
+                    for docid, i in matches:
+                        if docid >= nextDocid:
+                            break
+                        self._args[i].docIteratorAdvanceTo(nextDocid)
+                    continue
+
+            if matches[0][0] == pivot:
+                self.docIteratorSetMatchCache(pivot)
+                return(True)
+
+            for docid, i in matches:
+                if docid >= pivot:
+                    break
+                self._args[i].docIteratorAdvanceTo(pivot)
+
+
+    def getBlockMaxScore(self, retrievalModel, docid):
+        """
+        Get an upper bound on the scores that getScore can return for a
+        block of documents that starts at or before docid.  Score
+        operators that store block metadata override this method.
+
+        retrievalModel: retrieval model parameters
+        docid: An internal document id.
+
+        Returns a tuple (upper bound, last docid in the block), or None
+        if scores are not bounded by blocks.
+        """
+        return(None)
+
+
+    def getBlocksSkipped(self):
+        """
+        Get the number of times that this query operator and the score
+        operators below it skipped a block of documents because of
+        block score bounds.
+
+        Returns the number of blocks skipped.
+        """
+        return(self._blocksSkipped +
+               sum(q_i.getBlocksSkipped() for q_i in self._args
+                   if isinstance(q_i, QrySop)))
+
 
     def getDefaultScore(retrievalModel,  docid):
         """
@@ -47,6 +394,53 @@ class QrySop(Qry):
                          sys._getframe().f_code.co_name)
 
 
+    def _getMatchedArgs(self, r):
+        """
+        Get the arguments that match the document that
+        docIteratorHasMatch matched.  If docIteratorHasMatchMin found
+        the match, its UnionIterator knows them; otherwise each
+        argument is checked.
+
+        r: The retrieval model that determines what is a match.
+        Returns a sorted list of argument indexes.
+        """
+        docid = self.docIteratorGetMatch()
+        union = self._union
+
+        if (union is not None and union.getMatches() is not None and
+            union.getDocid() == docid):
+            return(union.getMatches())
+
+        return([i for i, q_i in enumerate(self._args)
+                if q_i.docIteratorHasMatch(r) and
+                q_i.docIteratorGetMatch() == docid])
+
+
+    def getMaxDefaultScore(self, retrievalModel):
+        """
+        Get an upper bound on the scores that getDefaultScore can
+        return.  Score operators that support pruning override this
+        method.
+
+        retrievalModel: retrieval model parameters
+
+        Returns the upper bound, or None if default scores are not bounded.
+        """
+        return(None)
+
+
+    def getMaxScore(self, retrievalModel):
+        """
+        Get an upper bound on the scores that getScore can return.
+        Score operators that support pruning override this method.
+
+        retrievalModel: retrieval model parameters
+
+        Returns the upper bound, or None if scores are not bounded.
+        """
+        return(None)
+
+
     def getScore(self, retrievalModel):
         """
         Get a score for the document that docIteratorHasMatch matched.
@@ -74,3 +468,142 @@ class QrySop(Qry):
         """
         for q_i in self._args:
             q_i.initialize(retrievalModel)
+
+        # Default scores are cached by field length if all arguments
+        # use the same field.
+        fields = set([q_i._defaultScoreField for q_i in self._args])
+        self._defaultScoreField = fields.pop() if len(fields) == 1 else None
+        self._defaultScoreCache = None
+
+
+    def initializeMaxScore(self, retrievalModel, weights):
+        """
+        Prepare to use docIteratorHasMatchMaxScore.  The operator's
+        score must be the weighted geometric mean of the scores of all
+        arguments, where arguments that don't match contribute their
+        default scores (e.g., the Indri #AND and #WAND operators).
+        Score bounds are kept in log space, where the score is a
+        weighted sum.  The arguments' bounds are probabilities, even if
+        the model scores in log space.  This must be called after the
+        arguments are initialized.
+
+        retrievalModel: retrieval model parameters
+        weights: Normalized argument weights.
+
+        Returns True if MaxScore can be used, i.e., the scores and the
+        default scores of all of the arguments are bounded and positive,
+        otherwise False.
+        """
+        self._logMaxScores = None
+
+        maxScores = [q_i.getMaxScore(retrievalModel) for q_i in self._args]
+        maxDefaultScores = [q_i.getMaxDefaultScore(retrievalModel)
+                            for q_i in self._args]
+
+        if None in maxScores or None in maxDefaultScores:
+            return(False)
+
+        if min(maxDefaultScores) <= 0:
+            return(False)
+
+        # Every document gets at least the default scores.  A matching
+        # argument adds at most its log score increment.
+        logMaxScores = []
+        for w, s, d in zip(weights, maxScores, maxDefaultScores):
+            if s > d:
+                logMaxScores.append(w * (math.log(s) - math.log(d)))
+            else:
+                logMaxScores.append(0.0)
+
+        self._logMaxScoreBase = sum(
+            w * math.log(d) for w, d in zip(weights, maxDefaultScores))
+        self._logMaxScores = logMaxScores
+        self._maxScoreOrder = sorted(range(len(self._args)),
+                                     key=lambda i: logMaxScores[i])
+        self.__splitEssential(-math.inf)
+        return(True)
+
+
+    def initializeWand(self, retrievalModel, weights=None, blockMax=False):
+        """
+        Prepare to use docIteratorHasMatchWand.  The operator's score
+        must be the sum of the scores of the arguments that match or,
+        if weights are given, the weighted sum of the scores of all
+        arguments, where arguments that don't match contribute their
+        default scores.  Score bounds are probabilities, even if the
+        model scores in log space (see docIteratorHasMatchWand).  This
+        must be called after the arguments are initialized.
+
+        retrievalModel: retrieval model parameters
+        weights: Normalized argument weights, or None.
+        blockMax: If True, also use block score bounds (Block-Max WAND).
+
+        Returns True if WAND can be used, i.e., the scores of all of the
+        arguments are bounded, otherwise False.
+        """
+        self._maxScores = None
+        self._maxScoreWeights = weights
+        self._maxScoreBase = 0.0
+        self._maxDefaultScores = None
+        self._blockMax = blockMax
+        self._blocksSkipped = 0
+
+        maxScores = [q_i.getMaxScore(retrievalModel) for q_i in self._args]
+        if None in maxScores:
+            return(False)
+
+        if weights is not None:
+            self._maxDefaultScores = [q_i.getMaxDefaultScore(retrievalModel)
+                                      for q_i in self._args]
+            if None in self._maxDefaultScores:
+                return(False)
+
+            # Every document gets at least the default scores.
+            self._maxScoreBase = sum(
+                w * s for w, s in zip(weights, self._maxDefaultScores))
+
+        self._maxScores = [self.__getScoreIncrement(i, s)
+                           for i, s in enumerate(maxScores)]
+        return(True)
+
+
+    @staticmethod
+    def logScore(score):
+        """
+        Get the log of a probability, for models that score in log
+        space.  The log of 0 is -math.inf.
+
+        score: A probability.
+        """
+        if score > 0:
+            return(math.log(score))
+        return(-math.inf)
+
+
+    @staticmethod
+    def logWeightedSum(logScores, weights):
+        """
+        Get the log of a weighted sum of probabilities from their logs,
+        log(sum(w_i * exp(l_i))).  The largest log is factored out, so
+        probabilities that are too small for a float don't underflow.
+
+        logScores: A list of log probabilities.
+        weights: A list of weights.
+        """
+        m = max(logScores)
+        if m == -math.inf:
+            return(-math.inf)
+        return(m + QrySop.logScore(sum([w * math.exp(l - m)
+                                        for l, w in zip(logScores, weights)])))
+
+
+    def setScoreThreshold(self, threshold):
+        """
+        Tell the query operator that only documents whose scores reach
+        threshold are of interest, e.g., because the caller already has
+        enough documents with higher scores.  Operators that prune use
+        the threshold to skip documents; others ignore it.
+
+        threshold: A document score.
+        """
+        self._scoreThreshold = threshold
@@ -23,6 +23,73 @@ class QrySopAnd(QrySop):
         QrySop.__init__(self)		# Inherit from QrySop
 
 
+    def compileDefaultScore(self, r):
+        """
+        Compile getDefaultScore into a closure (see QrySop.compileScore).
+
+        r: The retrieval model that determines how scores are calculated.
+        Returns a function of a docid that returns the default score.
+        """
+        if not isinstance(r, RetrievalModelIndri):
+            return QrySop.compileDefaultScore(self, r)
+
+        defaults = [q_i.compileDefaultScore(r) for q_i in self._args]
+        power = 1/len(self._args)
+        n = len(self._args)
+
+        if r.logSpace:
+            def defaultScore(docid):
+                return sum([d(docid) for d in defaults]) / n
+        else:
+            def defaultScore(docid):
+                return math.pow(math.prod([d(docid) for d in defaults]), power)
+
+        return self._cacheDefaultScores(defaultScore)
+
+
+    def compileScore(self, retrievalModel):
+        """
+        Compile getScore into a closure (see QrySop.compileScore).
+
+        retrievalModel: retrieval model parameters
+
+        Returns a function of the matched docid that returns its score.
+        """
+        scorers = [q_i.compileScore(retrievalModel) for q_i in self._args]
+        getMatchedArgs = self._getMatchedArgs
+
+        # A Boolean match matches every argument.
+        if isinstance(retrievalModel, (RetrievalModelUnrankedBoolean,
+                                       RetrievalModelRankedBoolean)):
+            def score(docid):
+                return min([s(docid) for s in scorers])
+
+        elif isinstance(retrievalModel, RetrievalModelIndri):
+            defaults = [q_i.compileDefaultScore(retrievalModel)
+                        for q_i in self._args]
+            power = 1/len(self._args)
+            n = len(self._args)
+
+            # In log space, the geometric mean is the mean of the logs.
+            if retrievalModel.logSpace:
+                def score(docid):
+                    matched = set(getMatchedArgs(retrievalModel))
+                    return sum(
+                        [(scorers[i] if i in matched else defaults[i])(docid)
+                         for i in range(n)]) / n
+            else:
+                def score(docid):
+                    matched = set(getMatchedArgs(retrievalModel))
+                    return math.pow(math.prod(
+                        [(scorers[i] if i in matched else defaults[i])(docid)
+                         for i in range(n)]), power)
+
+        else:
+            return QrySop.compileScore(self, retrievalModel)
+
+        return score
+
+
     def docIteratorHasMatch(self, r):
         """
         Indicates whether the query has a match.
@@ -32,6 +99,8 @@ class QrySopAnd(QrySop):
         """
         # For Indri, matches if any arguments match
         if isinstance(r, RetrievalModelIndri):
+            if self._logMaxScores is not None:
+                return self.docIteratorHasMatchMaxScore(r)
             return self.docIteratorHasMatchMin(r)
         return self.docIteratorHasMatchAll(r)
 
@@ -90,20 +159,76 @@ class QrySopAnd(QrySop):
         """ 
         scores = []
         docid = self.docIteratorGetMatch()
+        matched = set(self._getMatchedArgs(r))
 
-        for q_i in self._args:
-            if (q_i.docIteratorHasMatch(r) and q_i.docIteratorGetMatch() == docid):  # if qi has a match for document d
+        for i, q_i in enumerate(self._args):
+            if i in matched:  # if qi has a match for document d
                 scores.append(q_i.getScore(r))  # call qi.getScore
             else:
                 scores.append(q_i.getDefaultScore(r, docid))  # else, call qi.getDefaultScore
-        
+
+        if r.logSpace:
+            return sum(scores) / len(self._args)
+
         scores = math.prod(scores)
         return math.pow(scores, 1/len(self._args))
     
     def getDefaultScore(self, r, docid):
         if isinstance(r, RetrievalModelIndri):
-            scores = []
-            for q_i in self._args:
-                scores.append(q_i.getDefaultScore(r, docid))  # call the ith query argument's getDefaultScore method  
-            scores = math.prod(scores)
-            return math.pow(scores, 1/len(self._args))
\ No newline at end of file
+            if self._defaultScoreCache is None:
+                self._defaultScoreCache = self._cacheDefaultScores(
+                    lambda docid: self.__getDefaultScoreIndri(r, docid))
+            return self._defaultScoreCache(docid)
+
+
+    def __getDefaultScoreIndri(self, r, docid):
+        """
+        getDefaultScore for Indri retrieval model.
+
+        r: The retrieval model that determines how scores are calculated.
+        docid: An internal document id.
+        Returns the default score.
+        """
+        scores = []
+        for q_i in self._args:
+            scores.append(q_i.getDefaultScore(r, docid))  # call the ith query argument's getDefaultScore method  
+
+        if r.logSpace:
+            return sum(scores) / len(self._args)
+
+        scores = math.prod(scores)
+        return math.pow(scores, 1/len(self._args))
+
+
+    def initialize(self, retrievalModel):
+        """
+        Initialize the query operator (and its arguments), including any
+        internal iterators.  If MaxScore is enabled for Indri and every
+        argument's scores are bounded, docIteratorHasMatch uses
+        docIteratorHasMatchMaxScore.
+
+        retrievalModel: A retrieval model that guides initialization
+
+        throws IOException: Error accessing the Lucene index.
+        """
+        QrySop.initialize(self, retrievalModel)
+        self._logMaxScores = None
+
+        if (isinstance(retrievalModel, RetrievalModelIndri) and
+            retrievalModel.maxScore):
+            n = len(self._args)
+            self.initializeMaxScore(retrievalModel, [1 / n] * n)
+
+
+    def setScoreThreshold(self, threshold):
+        """
+        Tell the query operator that only documents whose scores reach
+        threshold are of interest.  An #AND with one argument has its
+        argument's scores, so the argument gets the threshold too.
+
+        threshold: A document score.
+        """
+        QrySop.setScoreThreshold(self, threshold)
+
+        if len(self._args) == 1:
+            self._args[0].setScoreThreshold(threshold)
@@ -23,6 +23,28 @@ class QrySopOr(QrySop):
         QrySop.__init__(self)		# Inherit from QrySop
 
 
+    def compileScore(self, retrievalModel):
+        """
+        Compile getScore into a closure (see QrySop.compileScore).
+
+        retrievalModel: retrieval model parameters
+
+        Returns a function of the matched docid that returns its score.
+        """
+        if not isinstance(retrievalModel, (RetrievalModelUnrankedBoolean,
+                                           RetrievalModelRankedBoolean)):
+            return QrySop.compileScore(self, retrievalModel)
+
+        scorers = [q_i.compileScore(retrievalModel) for q_i in self._args]
+        getMatchedArgs = self._getMatchedArgs
+
+        def score(docid):
+            return max([scorers[i](docid)
+                        for i in getMatchedArgs(retrievalModel)])
+
+        return score
+
+
     def docIteratorHasMatch(self, r):
         """
         Indicates whether the query has a match.
@@ -62,15 +84,11 @@ class QrySopOr(QrySop):
         throws IOException: Error accessing the Lucene index
         """
 
-        # Return the maximum of its query argument scores.  The
-        # document matches, but we don't know which query arguments
-        # match, so check each query argument.
+        # Return the maximum of the scores of the query arguments that
+        # match the document.
         scores = []
-        docid = self.docIteratorGetMatch()
 
-        for q_i in self._args:
-            if (q_i.docIteratorHasMatch(r) and
-                q_i.docIteratorGetMatch() == docid):
-                scores.append(q_i.getScore(r))
+        for i in self._getMatchedArgs(r):
+            scores.append(self._args[i].getScore(r))
 
         return max(scores)
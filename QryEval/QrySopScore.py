@@ -4,10 +4,14 @@ The SCORE operator for all retrieval models.
 
 # Copyright (c) 2023, Carnegie Mellon University.  All Rights Reserved.
 
+import bisect
 import math
 import sys
 
+from CollectionStats import CollectionStats
 from Idx import Idx
+from InvList import InvList
+from LengthNorms import LengthNorms
 from QrySop import QrySop
 from RetrievalModelUnrankedBoolean import RetrievalModelUnrankedBoolean
 from RetrievalModelRankedBoolean import RetrievalModelRankedBoolean
@@ -24,9 +28,112 @@ class QrySopScore(QrySop):
 
     def __init__(self):
         QrySop.__init__(self)		# Inherit from QrySop
-        self.cache_bm25 = {'N':None,'avg_doclen':None}    # N and avg_doclen are constant, so we can cache them
-        self.cache_indri = {'lengthC':None,'ctf':{}}    # lengthC is a constant
-        self.cache_default = {'lengthC':None}
+        self._blockMaxScores = None	# Upper bounds of block scores
+        self._blockLast = None		# Last docid of each block
+        self._block = 0			# The current block
+        self._lengthNorms = None	# See LengthNorms
+
+    def compileDefaultScore(self, r):
+        """
+        Compile getDefaultScore into a closure (see QrySop.compileScore).
+
+        r: The retrieval model that determines how scores are calculated.
+        Returns a function of a docid that returns the default score.
+        """
+        if not isinstance(r, RetrievalModelIndri):
+            return QrySop.compileDefaultScore(self, r)
+
+        mu = r.mu
+        q = self._args[0]
+        ctf = q.getCtf()
+        # Extra smoothing for terms that have ctf=0
+        if ctf == 0:
+            ctf = 0.5
+        pMLE = CollectionStats.getPMLE(q._field, ctf)
+        getLengthNorm = QrySopScore.__getLengthNormFunction(
+            q._field, LengthNorms.getIndri(q._field, mu),
+            lambda length: length + mu)
+
+        # (1-Lambda)*((0+mu*pMLE)/(length+mu))+Lambda*pMLE
+        a = 1-r.Lambda
+        m = 0+mu*pMLE
+        c = r.Lambda*pMLE
+
+        def defaultScore(docid):
+            lengthNorm = getLengthNorm(docid)
+            if lengthNorm == 0 and mu == 0:
+                return 0
+            return a*(m/lengthNorm)+c
+
+        if r.logSpace:
+            logScore = QrySop.logScore
+            return self._cacheDefaultScores(
+                lambda docid: logScore(defaultScore(docid)))
+
+        return self._cacheDefaultScores(defaultScore)
+
+
+    def compileScore(self, r):
+        """
+        Compile getScore into a closure (see QrySop.compileScore).  The
+        idf, pMLE, and length normalization values are computed once.
+
+        r: The retrieval model that determines how scores are calculated.
+        Returns a function of the matched docid that returns its score.
+        """
+        q = self._args[0]
+        getTf = q.docIteratorGetMatchTf
+
+        if isinstance(r, RetrievalModelUnrankedBoolean):
+            return lambda docid: 1.0
+
+        elif isinstance(r, RetrievalModelRankedBoolean):
+            return lambda docid: getTf()
+
+        elif isinstance(r, RetrievalModelBM25):
+            k_1 = r.k_1
+            b = r.b
+            rsj_weight = CollectionStats.getIdf(q.getDf())
+            avg_doclen = CollectionStats.getAvgFieldLength(q._field)
+            qtf = 1
+            user_weight = (r.k_3 + 1) * qtf / (r.k_3 + qtf)
+            getLengthNorm = QrySopScore.__getLengthNormFunction(
+                q._field, LengthNorms.getBM25(q._field, k_1, b),
+                lambda doclen: k_1 * ((1 - b) + b * (doclen / avg_doclen)))
+
+            def score(docid):
+                tf = getTf()
+                tf_weight = tf / (tf + getLengthNorm(docid))
+                return rsj_weight * tf_weight * user_weight
+
+            return score
+
+        elif isinstance(r, RetrievalModelIndri):
+            mu = r.mu
+            pMLE = CollectionStats.getPMLE(q._field, q.getCtf())
+            getLengthNorm = QrySopScore.__getLengthNormFunction(
+                q._field, LengthNorms.getIndri(q._field, mu),
+                lambda lengthd: lengthd + mu)
+
+            # (1-Lambda)*((tf+mu*pMLE)/(lengthd+mu))+Lambda*pMLE
+            a = 1-r.Lambda
+            m = mu*pMLE
+            c = r.Lambda*pMLE
+
+            def score(docid):
+                lengthNorm = getLengthNorm(docid)
+                if lengthNorm == 0 and mu == 0:
+                    return 0
+                return a*((getTf()+m)/lengthNorm)+c
+
+            if r.logSpace:
+                logScore = QrySop.logScore
+                return lambda docid: logScore(score(docid))
+
+            return score
+
+        return QrySop.compileScore(self, r)
+
 
     def docIteratorHasMatch(self, r):
         """
@@ -38,6 +145,118 @@ class QrySopScore(QrySop):
         return(self.docIteratorHasMatchFirst(r))
 
 
+    def getBlockMaxScore(self, r, docid):
+        """
+        Get an upper bound on the scores that getScore can return for
+        the documents in one block of the inverted list: the block that
+        contains the first posting at or after docid.  Calls must be in
+        docid order, because the block is found by searching forward
+        from the previous block.
+
+        r: The retrieval model that determines how scores are calculated.
+        docid: An internal document id.
+        Returns a tuple (upper bound, last docid in the block), or None
+        if the inverted list has no block metadata.
+        """
+        if self._blockMaxScores is None:
+            self.__initializeBlockMaxScores(r)
+
+        if self._blockLast is None:
+            return None
+
+        self._block = bisect.bisect_left(self._blockLast, docid, self._block)
+
+        if self._block == len(self._blockLast):
+            return (0.0, math.inf)	# No postings at or after docid
+
+        return (self._blockMaxScores[self._block],
+                self._blockLast[self._block])
+
+
+    def _getDocidArray(self):
+        """
+        Get the docids that the query operator matches, which are the
+        docids of its argument (see Qry._getDocidArray).
+        """
+        return(self._args[0]._getDocidArray())
+
+
+    @staticmethod
+    def __getLengthNormFunction(field, lengthNorms, normalize):
+        """
+        Get a function of a docid that returns its length normalization
+        value (see LengthNorms).
+
+        field: The name of a document field.
+        lengthNorms: The field's LengthNorms array, or None.
+        normalize: A function of a field length that returns its
+          normalization value, used if lengthNorms is None.
+        """
+        if lengthNorms is not None:
+            return lengthNorms.__getitem__
+
+        return lambda docid: normalize(Idx.getFieldLength(field, docid))
+
+
+    def __getLengthNormIndri(self, mu, docid):
+        """
+        Get the Indri length normalization value (lengthd + mu) of a
+        document, precomputed if field lengths are cached.
+
+        mu: The Indri mu parameter.
+        docid: An internal document id.
+        """
+        lengthNorms = self._lengthNorms
+
+        if lengthNorms is not None:
+            return lengthNorms[docid]
+        return Idx.getFieldLength(self._args[0]._field, docid) + mu
+
+
+    def getMaxDefaultScore(self, r):
+        """
+        Get an upper bound on the scores that getDefaultScore can return.
+
+        r: The retrieval model that determines how scores are calculated.
+        Returns the upper bound, or None if default scores are not bounded.
+        """
+        if not isinstance(r, RetrievalModelIndri):
+            return None
+
+        # The default score is largest in the shortest document.
+        mu = r.mu
+        Lambda = r.Lambda
+
+        q = self._args[0]
+        ctf = q.getCtf()
+        if ctf == 0:
+            ctf = 0.5
+        pMLE = CollectionStats.getPMLE(q._field, ctf)
+
+        if mu == 0:
+            return Lambda*pMLE
+        length = Idx.getMinFieldLength(q._field)
+        return (1-Lambda)*((0+mu*pMLE)/(length+mu))+Lambda*pMLE
+
+
+    def getMaxScore(self, r):
+        """
+        Get an upper bound on the scores that getScore can return.
+
+        r: The retrieval model that determines how scores are calculated.
+        Returns the upper bound, or None if scores are not bounded.
+        """
+        if not isinstance(r, (RetrievalModelBM25, RetrievalModelIndri)):
+            return None
+
+        q = self._args[0]
+
+        if q.getDf() == 0:
+            return 0.0
+
+        return self.__getScoreBound(r, q.getMaxTf(), q.getMinFieldLength())
+
+
     def getScore(self, r):
         """
         Get a score for the document that docIteratorHasMatch matched.
@@ -51,9 +270,11 @@ class QrySopScore(QrySop):
         elif isinstance(r, RetrievalModelRankedBoolean):
             return self.__getScoreRankedBoolean(r)
         elif isinstance(r, RetrievalModelBM25):
-            return self.__getScoreBM25(r,self.cache_bm25)
+            return self.__getScoreBM25(r)
         elif isinstance(r, RetrievalModelIndri):
-            return self.__getScoreIndri(r,self.cache_indri)
+            if r.logSpace:
+                return QrySop.logScore(self.__getScoreIndri(r))
+            return self.__getScoreIndri(r)
         else:
             raise Exception(
                 '{} does not support the #SCORE operator.'.format(
@@ -84,9 +305,9 @@ class QrySopScore(QrySop):
         if not self.docIteratorHasMatchCache():
             return 0.0
         else:
-            return self._args[0].docIteratorGetMatchPosting().tf
+            return self._args[0].docIteratorGetMatchTf()
     
-    def __getScoreBM25(self, r, cache):
+    def __getScoreBM25(self, r):
         """
         getScore for BM25 model.
         """
@@ -102,20 +323,19 @@ class QrySopScore(QrySop):
         q = self._args[0]
         
         # Part 1: Modified RSJ weight
-        # N is a constant, so we use cache
-        if not cache['N']:
-            cache['N'] = Idx.getNumDocs()
-        N, df = cache['N'], q.getDf()
-        rsj_weight = math.log((N+1)/(df+0.5))
-
-        # Part 2: TF weight
-        tf = q.docIteratorGetMatchPosting().tf
-        doclen = Idx.getFieldLength(q._field, q.docIteratorGetMatch())
-        # avg_doclen is a constant, so we use cache
-        if not cache['avg_doclen']:
-            cache['avg_doclen'] = Idx.getSumOfFieldLengths(q._field) / Idx.getDocCount(q._field)
-        avg_doclen = cache['avg_doclen']
-        tf_weight = tf / (tf + k_1 * ((1 - b) + b * (doclen / avg_doclen)))
+        rsj_weight = CollectionStats.getIdf(q.getDf())
+
+        # Part 2: TF weight.  The length normalization is precomputed
+        # if field lengths are cached.
+        tf = q.docIteratorGetMatchTf()
+        docid = q.docIteratorGetMatch()
+        lengthNorms = self._lengthNorms
+        if lengthNorms is not None:
+            tf_weight = tf / (tf + lengthNorms[docid])
+        else:
+            doclen = Idx.getFieldLength(q._field, docid)
+            avg_doclen = CollectionStats.getAvgFieldLength(q._field)
+            tf_weight = tf / (tf + k_1 * ((1 - b) + b * (doclen / avg_doclen)))
 
         # Part 3: User Weight
         qtf = 1
@@ -123,7 +343,7 @@ class QrySopScore(QrySop):
 
         return rsj_weight * tf_weight * user_weight
     
-    def __getScoreIndri(self, r, cache):
+    def __getScoreIndri(self, r):
         """
         getScore for Indri model.
         """
@@ -137,41 +357,132 @@ class QrySopScore(QrySop):
         q = self._args[0]
 
         # Two-stage smoothing to compute term weights
-        if not cache['lengthC']:
-            cache['lengthC'] = Idx.getSumOfFieldLengths(q._field)
-        if not cache['ctf'].get(q):
-            cache['ctf'][q] = q.getCtf()
-        ctf, lengthC = cache['ctf'][q], cache['lengthC'] 
-        pMLE = ctf / lengthC
-
-        tf = q.docIteratorGetMatchPosting().tf
+        pMLE = CollectionStats.getPMLE(q._field, q.getCtf())
+
+        tf = q.docIteratorGetMatchTf()
         docid = q.docIteratorGetMatch()
-        lengthd = Idx.getFieldLength(q._field, docid)
-        if lengthd == 0 and mu == 0:
+        lengthNorm = self.__getLengthNormIndri(mu, docid)
+        if lengthNorm == 0 and mu == 0:
             return 0
         else:
-            return (1-Lambda)*((tf+mu*pMLE)/(lengthd+mu))+Lambda*pMLE
+            return (1-Lambda)*((tf+mu*pMLE)/lengthNorm)+Lambda*pMLE
     
-    # Calculates a score for a term
-    def getDefaultScore(self, r, docid):
-        if isinstance(r, RetrievalModelIndri):
-            # Model Parameters
+    def __getScoreBound(self, r, max_tf, min_doclen):
+        """
+        Get an upper bound on the term score of documents whose tf is at
+        most max_tf and whose length is at least min_doclen.  BM25 and
+        Indri term scores increase with tf and decrease with document
+        length (BM25 requires b >= 0).  If max_tf is None, the bound
+        holds for any tf.  Returns None if scores are not bounded.
+        """
+        q = self._args[0]
+
+        if isinstance(r, RetrievalModelBM25):
+            k_1 = r.k_1
+            b = r.b
+            k_3 = r.k_3
+
+            if b < 0:
+                return None
+
+            rsj_weight = CollectionStats.getIdf(q.getDf())
+            avg_doclen = CollectionStats.getAvgFieldLength(q._field)
+
+            # tf / (tf + ...) is at most 1.
+            if max_tf is None:
+                tf_weight = 1.0
+            else:
+                tf_weight = max_tf / (max_tf + k_1 * ((1 - b) + b * (min_doclen / avg_doclen)))
+
+            qtf = 1
+            user_weight = (k_3 + 1) * qtf / (k_3 + qtf)
+
+            return rsj_weight * tf_weight * user_weight
+
+        elif isinstance(r, RetrievalModelIndri):
             mu = r.mu
             Lambda = r.Lambda
-            
-            q = self._args[0]
-            ctf = q.getCtf()
-            # Extra smoothing for terms that have ctf=0
-            if ctf == 0:
-                ctf = 0.5
-            if not self.cache_default['lengthC']:
-                self.cache_default['lengthC'] = Idx.getSumOfFieldLengths(q._field)
-            pMLE = ctf / self.cache_default['lengthC']
-            length = Idx.getFieldLength(q._field, docid)
-            if length == 0 and mu == 0:
-                return 0
+            pMLE = CollectionStats.getPMLE(q._field, q.getCtf())
+
+            # tf <= lengthd, so (tf+mu*pMLE)/(lengthd+mu) is at most 1.
+            # A document that contains the term has a length of at least 1.
+            if max_tf is None:
+                p = 1.0
             else:
-                return (1-Lambda)*((0+mu*pMLE)/(length+mu))+Lambda*pMLE
+                lengthd = max(min_doclen, 1)
+                p = min(1.0, (max_tf+mu*pMLE)/(lengthd+mu))
+
+            return (1-Lambda)*p+Lambda*pMLE
+
+        return None
+
+
+    def __initializeBlockMaxScores(self, r):
+        """
+        Compute score upper bounds for the blocks of the inverted list
+        from its block metadata.
+        """
+        self._blockMaxScores = []
+        self._blockLast = None
+        self._block = 0
+
+        metadata = self._args[0].getBlockMetadata()
+
+        if metadata is None:
+            return
+
+        blockLast, blockMaxTf, blockMinLength = metadata
+        bounds = [self.__getScoreBound(r, tf, length)
+                  for tf, length in zip(blockMaxTf, blockMinLength)]
+
+        if None in bounds:
+            return
+
+        self._blockMaxScores = bounds
+        self._blockLast = blockLast
+
+
+    # Calculates a score for a term
+    def getDefaultScore(self, r, docid):
+        if isinstance(r, RetrievalModelIndri):
+            # Default scores depend only on the document length, so
+            # they are cached by length (see QrySop._cacheDefaultScores).
+            if self._defaultScoreCache is None:
+                if r.logSpace:
+                    defaultScore = lambda docid: QrySop.logScore(
+                        self.__getDefaultScoreIndri(r, docid))
+                else:
+                    defaultScore = lambda docid: self.__getDefaultScoreIndri(
+                        r, docid)
+                self._defaultScoreCache = self._cacheDefaultScores(
+                    defaultScore)
+            return self._defaultScoreCache(docid)
+
+
+    def __getDefaultScoreIndri(self, r, docid):
+        """
+        getDefaultScore for Indri retrieval model.
+
+        r: The retrieval model that determines how scores are calculated.
+        docid: An internal document id.
+        Returns the default score.
+        """
+        # Model Parameters
+        mu = r.mu
+        Lambda = r.Lambda
+
+        q = self._args[0]
+        ctf = q.getCtf()
+        # Extra smoothing for terms that have ctf=0
+        if ctf == 0:
+            ctf = 0.5
+        pMLE = CollectionStats.getPMLE(q._field, ctf)
+        lengthNorm = self.__getLengthNormIndri(mu, docid)
+        if lengthNorm == 0 and mu == 0:
+            return 0
+        else:
+            return (1-Lambda)*((0+mu*pMLE)/lengthNorm)+Lambda*pMLE
+
 
     def initialize(self, r):
         """
@@ -184,4 +495,30 @@ class QrySopScore(QrySop):
         throws IOException: Error accessing the Lucene index.
         """
         q = self._args[ 0 ]
+
+        # Block score bounds are computed on demand by getBlockMaxScore.
+        self._blockMaxScores = None
+        self._blockLast = None
+        self._block = 0
+
+        # Scores use only tf, df, and ctf, so locations are not fetched.
+        # The unranked Boolean model doesn't use tf either.
+        if isinstance(r, RetrievalModelUnrankedBoolean):
+            q.setPostingsMode(InvList.DOCS)
+        else:
+            q.setPostingsMode(InvList.FREQS)
+
         q.initialize(r)
+
+        # The length normalization array is found once per query, not
+        # once per posting.
+        if isinstance(r, RetrievalModelBM25):
+            self._lengthNorms = LengthNorms.getBM25(q._field, r.k_1, r.b)
+        elif isinstance(r, RetrievalModelIndri):
+            self._lengthNorms = LengthNorms.getIndri(q._field, r.mu)
+        else:
+            self._lengthNorms = None
+
+        # Default scores are cached by the length of the field.
+        self._defaultScoreField = q._field
+        self._defaultScoreCache = None
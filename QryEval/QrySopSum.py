@@ -15,16 +15,57 @@ class QrySopSum(QrySop):
     def __init__(self):
         QrySop.__init__(self)		# Inherit from QrySop
 
+    def compileScore(self, retrievalModel):
+        """
+        Compile getScore into a closure (see QrySop.compileScore).
+
+        retrievalModel: retrieval model parameters
+
+        Returns a function of the matched docid that returns its score.
+        """
+        if not isinstance(retrievalModel, RetrievalModelBM25):
+            return QrySop.compileScore(self, retrievalModel)
+
+        scorers = [q_i.compileScore(retrievalModel) for q_i in self._args]
+        getMatchedArgs = self._getMatchedArgs
+
+        def score(docid):
+            return sum([scorers[i](docid)
+                        for i in getMatchedArgs(retrievalModel)])
+
+        return score
+
+
     def docIteratorHasMatch(self, r):
         """
-        Indicates whether the query has a match.
+        Indicates whether the query has a match.  If WAND is enabled,
+        documents that cannot reach the score threshold don't match.
 
         r: The retrieval model that determines what is a match.
         Returns True if the query matches, otherwise False.
         """
+        if self._maxScores is not None:
+            return self.docIteratorHasMatchWand(r)
         return self.docIteratorHasMatchMin(r)
 
 
+    def getMaxScore(self, retrievalModel):
+        """
+        Get an upper bound on the scores that getScore can return.
+
+        retrievalModel: retrieval model parameters
+
+        Returns the upper bound, or None if scores are not bounded.
+        """
+        if not isinstance(retrievalModel, RetrievalModelBM25):
+            return None
+
+        maxScores = [q_i.getMaxScore(retrievalModel) for q_i in self._args]
+        if None in maxScores:
+            return None
+        return sum(maxScores)
+
+
     def getScore(self, retrievalModel):
         """
         Get a score for the document that docIteratorHasMatch matched.
@@ -54,10 +95,29 @@ class QrySopSum(QrySop):
         throws IOException: Error accessing the Lucene index
         """
 
-        # Return the sum of its query argument scores.
+        # Return the sum of the scores of the query arguments that
+        # match the document.
         scores = []
-        docid = self.docIteratorGetMatch()
-        for q_i in self._args:
-            if (q_i.docIteratorHasMatch(r) and q_i.docIteratorGetMatch() == docid):
-                scores.append(q_i.getScore(r))
-        return sum(scores)
\ No newline at end of file
+        for i in self._getMatchedArgs(r):
+            scores.append(self._args[i].getScore(r))
+        return sum(scores)
+
+
+    def initialize(self, retrievalModel):
+        """
+        Initialize the query operator (and its arguments), including any
+        internal iterators.  If WAND or Block-Max WAND is enabled and
+        every argument's scores are bounded, docIteratorHasMatch uses
+        docIteratorHasMatchWand.
+
+        retrievalModel: A retrieval model that guides initialization
+
+        throws IOException: Error accessing the Lucene index.
+        """
+        QrySop.initialize(self, retrievalModel)
+        self._maxScores = None
+
+        if (isinstance(retrievalModel, RetrievalModelBM25) and
+            (retrievalModel.wand or retrievalModel.blockMaxWand)):
+            self.initializeWand(retrievalModel, None,
+                                retrievalModel.blockMaxWand)
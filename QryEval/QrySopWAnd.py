@@ -31,6 +31,73 @@ class QrySopWAnd(QrySop):
         self.weights.append(weight)
 
 
+    def compileDefaultScore(self, r):
+        """
+        Compile getDefaultScore into a closure (see QrySop.compileScore).
+
+        r: The retrieval model that determines how scores are calculated.
+        Returns a function of a docid that returns the default score.
+        """
+        if not isinstance(r, RetrievalModelIndri):
+            return QrySop.compileDefaultScore(self, r)
+
+        total_weight = sum(self.weights)
+        weights = [w / total_weight for w in self.weights]
+        defaults = [q_i.compileDefaultScore(r) for q_i in self._args]
+
+        if r.logSpace:
+            defaults, weights = self.__getWeightedArgs(defaults, weights)
+
+            def defaultScore(docid):
+                return sum([d(docid) * w for d, w in zip(defaults, weights)])
+        else:
+            def defaultScore(docid):
+                return math.prod([math.pow(d(docid), w)
+                                  for d, w in zip(defaults, weights)])
+
+        return self._cacheDefaultScores(defaultScore)
+
+
+    def compileScore(self, retrievalModel):
+        """
+        Compile getScore into a closure (see QrySop.compileScore).  The
+        normalized weights are computed once.
+
+        retrievalModel: retrieval model parameters
+
+        Returns a function of the matched docid that returns its score.
+        """
+        if not isinstance(retrievalModel, RetrievalModelIndri):
+            return QrySop.compileScore(self, retrievalModel)
+
+        total_weight = sum(self.weights)
+        weights = [w / total_weight for w in self.weights]
+        scorers = [q_i.compileScore(retrievalModel) for q_i in self._args]
+        defaults = [q_i.compileDefaultScore(retrievalModel)
+                    for q_i in self._args]
+        getMatchedArgs = self._getMatchedArgs
+        n = len(self._args)
+
+        # In log space, the weighted geometric mean is a weighted sum.
+        if retrievalModel.logSpace:
+            args = self.__getWeightedArgs(range(n), weights)
+
+            def score(docid):
+                matched = set(getMatchedArgs(retrievalModel))
+                return sum([
+                    (scorers[i] if i in matched else defaults[i])(docid) * w
+                    for i, w in zip(*args)])
+        else:
+            def score(docid):
+                matched = set(getMatchedArgs(retrievalModel))
+                return math.prod([
+                    math.pow((scorers[i] if i in matched else defaults[i])(docid),
+                             weights[i])
+                    for i in range(n)])
+
+        return score
+
+
     def docIteratorHasMatch(self, r):
         """
         Indicates whether the query has a match.
@@ -38,6 +105,8 @@ class QrySopWAnd(QrySop):
         r: The retrieval model that determines what is a match.
         Returns True if the query matches, otherwise False.
         """
+        if self._logMaxScores is not None:
+            return self.docIteratorHasMatchMaxScore(r)
         return self.docIteratorHasMatchMin(r)
 
 
@@ -70,11 +139,25 @@ class QrySopWAnd(QrySop):
         """ 
         scores = []
         docid = self.docIteratorGetMatch()
+        matched = set(self._getMatchedArgs(r))
         total_weight = sum(self.weights)
 
+        # In log space, the weighted geometric mean is a weighted sum.
+        if r.logSpace:
+            for i, q_i in enumerate(self._args):
+                weight = self.weights[i]
+                if weight == 0:
+                    continue
+                if i in matched:
+                    score = q_i.getScore(r)
+                else:
+                    score = q_i.getDefaultScore(r, docid)
+                scores.append(score * (weight/total_weight))
+            return sum(scores)
+
         for i, q_i in enumerate(self._args):
             weight = self.weights[i]
-            if (q_i.docIteratorHasMatch(r) and q_i.docIteratorGetMatch() == docid):  
+            if i in matched:
                 score = q_i.getScore(r)
                 scores.append(math.pow(score, weight/total_weight))  
             else:
@@ -85,11 +168,71 @@ class QrySopWAnd(QrySop):
     
     def getDefaultScore(self, r, docid):
         if isinstance(r, RetrievalModelIndri):
-            scores = []
-            total_weight = sum(self.weights)
+            if self._defaultScoreCache is None:
+                self._defaultScoreCache = self._cacheDefaultScores(
+                    lambda docid: self.__getDefaultScoreIndri(r, docid))
+            return self._defaultScoreCache(docid)
+
+
+    def __getDefaultScoreIndri(self, r, docid):
+        """
+        getDefaultScore for Indri retrieval model.
+
+        r: The retrieval model that determines how scores are calculated.
+        docid: An internal document id.
+        Returns the default score.
+        """
+        scores = []
+        total_weight = sum(self.weights)
+
+        if r.logSpace:
             for i, q_i in enumerate(self._args):
                 weight = self.weights[i]
-                score = q_i.getDefaultScore(r, docid)
-                scores.append(math.pow(score, weight/total_weight))    
+                if weight != 0:
+                    score = q_i.getDefaultScore(r, docid)
+                    scores.append(score * (weight/total_weight))
+            return sum(scores)
+
+        for i, q_i in enumerate(self._args):
+            weight = self.weights[i]
+            score = q_i.getDefaultScore(r, docid)
+            scores.append(math.pow(score, weight/total_weight))    
+
+        return math.prod(scores)
 
-            return math.prod(scores)
\ No newline at end of file
+
+    @staticmethod
+    def __getWeightedArgs(args, weights):
+        """
+        Drop the arguments that have weight 0 from a log space weighted
+        sum.  Their probabilities are raised to the power 0, so they
+        contribute nothing, but 0 * log(0) isn't 0.
+
+        args: A sequence of arguments (e.g., scorers or indexes).
+        weights: Normalized argument weights.
+
+        Returns a tuple of lists (args, weights).
+        """
+        weighted = [(a, w) for a, w in zip(args, weights) if w != 0]
+        return(([a for a, _ in weighted], [w for _, w in weighted]))
+
+
+    def initialize(self, retrievalModel):
+        """
+        Initialize the query operator (and its arguments), including any
+        internal iterators.  If MaxScore is enabled and every argument's
+        scores are bounded, docIteratorHasMatch uses
+        docIteratorHasMatchMaxScore.
+
+        retrievalModel: A retrieval model that guides initialization
+
+        throws IOException: Error accessing the Lucene index.
+        """
+        QrySop.initialize(self, retrievalModel)
+        self._logMaxScores = None
+
+        if (isinstance(retrievalModel, RetrievalModelIndri) and
+            retrievalModel.maxScore):
+            total_weight = sum(self.weights)
+            weights = [w / total_weight for w in self.weights]
+            self.initializeMaxScore(retrievalModel, weights)
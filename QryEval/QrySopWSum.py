@@ -25,13 +25,78 @@ class QrySopWSum(QrySop):
         """
         self.weights.append(weight)
 
+    def compileDefaultScore(self, r):
+        """
+        Compile getDefaultScore into a closure (see QrySop.compileScore).
+
+        r: The retrieval model that determines how scores are calculated.
+        Returns a function of a docid that returns the default score.
+        """
+        total_weight = sum(self.weights)
+        weights = [w / total_weight for w in self.weights]
+        defaults = [q_i.compileDefaultScore(r) for q_i in self._args]
+
+        if getattr(r, 'logSpace', False):
+            logWeightedSum = QrySop.logWeightedSum
+
+            def defaultScore(docid):
+                return logWeightedSum([d(docid) for d in defaults], weights)
+        else:
+            def defaultScore(docid):
+                return sum([d(docid)*w for d, w in zip(defaults, weights)])
+
+        return self._cacheDefaultScores(defaultScore)
+
+
+    def compileScore(self, retrievalModel):
+        """
+        Compile getScore into a closure (see QrySop.compileScore).  The
+        normalized weights are computed once.
+
+        retrievalModel: retrieval model parameters
+
+        Returns a function of the matched docid that returns its score.
+        """
+        if not isinstance(retrievalModel, RetrievalModelIndri):
+            return QrySop.compileScore(self, retrievalModel)
+
+        total_weight = sum(self.weights)
+        weights = [w / total_weight for w in self.weights]
+        scorers = [q_i.compileScore(retrievalModel) for q_i in self._args]
+        defaults = [q_i.compileDefaultScore(retrievalModel)
+                    for q_i in self._args]
+        getMatchedArgs = self._getMatchedArgs
+        n = len(self._args)
+
+        # In log space, the arguments' scores are log probabilities.
+        if retrievalModel.logSpace:
+            logWeightedSum = QrySop.logWeightedSum
+
+            def score(docid):
+                matched = set(getMatchedArgs(retrievalModel))
+                return logWeightedSum(
+                    [(scorers[i] if i in matched else defaults[i])(docid)
+                     for i in range(n)], weights)
+        else:
+            def score(docid):
+                matched = set(getMatchedArgs(retrievalModel))
+                return sum([(scorers[i] if i in matched else defaults[i])(docid) *
+                            weights[i] for i in range(n)])
+
+        return score
+
+
     def docIteratorHasMatch(self, r):
         """
-        Indicates whether the query has a match.
+        Indicates whether the query has a match.  If Block-Max WAND is
+        enabled, documents that cannot reach the score threshold don't
+        match.
 
         r: The retrieval model that determines what is a match.
         Returns True if the query matches, otherwise False.
         """
+        if self._maxScores is not None:
+            return self.docIteratorHasMatchWand(r)
         return self.docIteratorHasMatchMin(r)
 
 
@@ -67,19 +132,72 @@ class QrySopWSum(QrySop):
         # Return the sum of its query argument scores.
         scores = []
         docid = self.docIteratorGetMatch()
+        matched = set(self._getMatchedArgs(r))
         total_weight = sum(self.weights)
+
+        # In log space, the arguments' scores are log probabilities.
+        if r.logSpace:
+            for i, q_i in enumerate(self._args):
+                if i in matched:
+                    scores.append(q_i.getScore(r))
+                else:
+                    scores.append(q_i.getDefaultScore(r, docid))
+            return QrySop.logWeightedSum(
+                scores, [w / total_weight for w in self.weights])
+
         for i, q_i in enumerate(self._args):
             weight = self.weights[i]
-            if (q_i.docIteratorHasMatch(r) and q_i.docIteratorGetMatch() == docid):
+            if i in matched:
                 scores.append(q_i.getScore(r)*(weight/total_weight))
             else:
                 scores.append(q_i.getDefaultScore(r, docid)*(weight/total_weight))
         return sum(scores)
     
     def getDefaultScore(self, r, docid):
+        if self._defaultScoreCache is None:
+            self._defaultScoreCache = self._cacheDefaultScores(
+                lambda docid: self.__getDefaultScoreIndri(r, docid))
+        return self._defaultScoreCache(docid)
+
+
+    def __getDefaultScoreIndri(self, r, docid):
+        """
+        getDefaultScore for Indri model.
+
+        r: The retrieval model that determines how scores are calculated.
+        docid: An internal document id.
+        Returns the default score.
+        """
         scores = []
         total_weight = sum(self.weights)
+
+        if getattr(r, 'logSpace', False):
+            scores = [q_i.getDefaultScore(r, docid) for q_i in self._args]
+            return QrySop.logWeightedSum(
+                scores, [w / total_weight for w in self.weights])
+
         for i, q_i in enumerate(self._args):
             weight = self.weights[i] 
             scores.append(q_i.getDefaultScore(r, docid)*(weight/total_weight))
-        return sum(scores)
\ No newline at end of file
+        return sum(scores)
+
+
+    def initialize(self, retrievalModel):
+        """
+        Initialize the query operator (and its arguments), including any
+        internal iterators.  If Block-Max WAND is enabled and every
+        argument's scores are bounded, docIteratorHasMatch uses
+        docIteratorHasMatchWand.
+
+        retrievalModel: A retrieval model that guides initialization
+
+        throws IOException: Error accessing the Lucene index.
+        """
+        QrySop.initialize(self, retrievalModel)
+        self._maxScores = None
+
+        if (isinstance(retrievalModel, RetrievalModelIndri) and
+            retrievalModel.blockMaxWand):
+            total_weight = sum(self.weights)
+            weights = [w / total_weight for w in self.weights]
+            self.initializeWand(retrievalModel, weights, True)
@@ -6,19 +6,21 @@ unranked boolean, Indri, BM25).
 
 # Copyright (c) 2023, Carnegie Mellon University.  All Rights Reserved.
 
-import heapq
 import itertools
 
 from collections import OrderedDict
 
 import Util
 
-from Idx import Idx
+from FlatEngine import FlatEngine
 from QryParser import QryParser
+from ResultHeap import ResultHeap
 from RetrievalModelUnrankedBoolean import RetrievalModelUnrankedBoolean
 from RetrievalModelRankedBoolean import RetrievalModelRankedBoolean
 from RetrievalModelBM25 import RetrievalModelBM25
 from RetrievalModelIndri import RetrievalModelIndri
+from SaatEngine import SaatEngine
+from TaatEngine import TaatEngine
 
 class Ranker:
     """
@@ -28,28 +30,14 @@ class Ranker:
 
     """
 
-    class heap_item:
-        """
-        A utility class to provide control over heap __lt__.
-        """
-
-        def __init__(self, score, externalId):
-            self.externalId = externalId
-            self.score = score
-
-        def __lt__(self, other):
-            return(self.score < other.score or
-                   (self.score == other.score and
-                    self.externalId > other.externalId))
-
-
-
     # -------------- Methods (alphabetical) ---------------- #
 
     def __init__(self, parameters):
         self._model = None
         self._inRank_path = None
         self._max_results = 1000       		# default
+        self._engine = None
+        self._compileScorers = parameters.get('compileScorers', False)
 
         if 'outputLength' in parameters:
             self._max_results = parameters['outputLength']
@@ -64,14 +52,101 @@ class Ranker:
             self._model = RetrievalModelRankedBoolean(parameters)
         elif parameters['retrievalAlgorithm'] == 'BM25':
             k_1, b, k_3 = parameters['BM25:k_1'],parameters['BM25:b'],parameters['BM25:k_3']
-            self._model = RetrievalModelBM25(k_1, b, k_3)
+            self._model = RetrievalModelBM25(
+                k_1, b, k_3, parameters.get('BM25:wand', False),
+                parameters.get('BM25:blockMaxWand', False))
         elif parameters['retrievalAlgorithm'] == 'Indri':
             mu, Lambda = parameters['Indri:mu'],parameters['Indri:lambda']
-            self._model = RetrievalModelIndri(mu, Lambda)
+            self._model = RetrievalModelIndri(
+                mu, Lambda, parameters.get('Indri:blockMaxWand', False),
+                parameters.get('Indri:maxScore', False),
+                parameters.get('Indri:logSpace', False))
         else:
             raise Exception('Error: Unknown retrievalAlgorithm: ' \
                             f'{parameters["ranker"]["retrievalAlgorithm"]}')
 
+        # Flat bag-of-words queries may be evaluated term-at-a-time
+        # or score-at-a-time.
+        engine = parameters.get('evaluationEngine', 'daat')
+        if engine == 'taat':
+            self._engine = TaatEngine(self._model, self._max_results)
+        elif engine == 'saat':
+            self._engine = SaatEngine(
+                self._model, self._max_results,
+                parameters.get('saat:postingsBudget'),
+                parameters.get('saat:timeBudget'))
+        elif engine != 'daat':
+            raise Exception(f'Error: Unknown evaluationEngine: {engine}')
+
+        # Flat bag-of-words queries that the engine doesn't evaluate
+        # have a fast path that doesn't use the query operator tree.
+        self._flatEngine = None
+        if parameters.get('flatEngine', True):
+            self._flatEngine = FlatEngine(self._model, self._max_results)
+
+        # The number of blocks that Block-Max WAND skipped in all of the
+        # queries, or None if it isn't enabled.
+        self.blocksSkipped = None
+        if getattr(self._model, 'blockMaxWand', False):
+            self.blocksSkipped = 0
+
+
+    def get_ranking_bow(self, q):
+        """
+        Get a ranking for a parsed bag-of-words query.  The ranking is
+        a list of (score, externalId) tuples.
+
+        q: A query, e.g., from QryParser.getQuery.
+        """
+        if self._engine is not None:
+            ranking = self._engine.getRanking(q)
+            if ranking is not None:
+                return(ranking)
+
+        if self._flatEngine is not None:
+            ranking = self._flatEngine.getRanking(q)
+            if ranking is not None:
+                return(ranking)
+
+        q.initialize(self._model)
+
+        # Compiled scorers bind the model parameters and per-term
+        # constants once, instead of dispatching on every document.
+        if self._compileScorers:
+            getScore = q.compileScore(self._model)
+        else:
+            getScore = lambda docid: q.getScore(self._model)
+
+        result_heap = ResultHeap(self._max_results)
+        threshold = result_heap.getThreshold()
+
+        # Evaluate the query. Each pass of the loop finds
+        # one matching document.
+        while(q.docIteratorHasMatch(self._model)):
+            docid = q.docIteratorGetMatch()
+            score = getScore(docid)
+            q.docIteratorAdvancePast(docid)
+
+            # The most common case is that (score, docid) is not
+            # in the top n. Do it first and efficiently.
+            if score < threshold:
+                continue
+
+            # Maybe this (score, docid) needs to be saved.
+            result_heap.add(docid, score)
+
+            # Once the heap is full, documents that can't reach its
+            # smallest score can be skipped.
+            if result_heap.isFull():
+                threshold = result_heap.getThreshold()
+                q.setScoreThreshold(threshold)
+
+        if self.blocksSkipped is not None:
+            self.blocksSkipped += q.getBlocksSkipped()
+
+        # External ids are looked up only for the top n.
+        return(result_heap.get_ranking())
+
 
     def get_rankings(self, queries):
         """
@@ -101,44 +176,9 @@ class Ranker:
             # Prepare to evaluate a query
             print(f'{qid}: {qString}')
             qString = f'{self._model.defaultQrySop}({qString})'
-            q = QryParser.getQuery(qString)
+            q = QryParser.getQuery(qString, self._model)
             print(f'    ==> {str(q)}')
-            q.initialize(self._model)
-            result_heap = []		# A heap of max size n
-
-            # Evaluate the query. Each pass of the loop finds
-            # one matching document.
-            while(q.docIteratorHasMatch(self._model)):
-                docid = q.docIteratorGetMatch()
-                score = q.getScore(self._model)
-                q.docIteratorAdvancePast(docid)
-
-                # Python heaps keep the smallest element at [0].
-                # The most common case is that (score, docid) is not
-                # in the top n. Do it first and efficiently.
-                if len(result_heap) == self._max_results:
-                    if result_heap[0].score > score:
-                        continue
-
-                # Maybe this (score, docid) needs to be saved.
-                externalId = Idx.getExternalDocid(docid)
-
-                if len(result_heap) < self._max_results:
-                    heapq.heappush(result_heap,
-                                   self.heap_item(score, externalId))
-                    heapq.heapify(result_heap)
-                else:
-                    smallest = result_heap[0]
-                    if (smallest.score < score or
-                        (smallest.score == score  and
-                         smallest.externalId > externalId)):
-                        heapq.heapreplace(result_heap,
-                                          self.heap_item(score, externalId))
-
-            # Convert the heap into a list of (score, externalId),
-            # then sort into ranking order and save it.
-            results_qid = [(r.score, r.externalId) for r in result_heap]
-            results_qid.sort(key=lambda r: (-r[0], r[1]))
-            results[qid] = results_qid
+
+            results[qid] = self.get_ranking_bow(q)
 
         return(results)
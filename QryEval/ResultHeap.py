@@ -6,6 +6,7 @@ Create, access, and manipulate document score lists.
 
 
 import heapq
+import math
 
 from Idx import Idx
 
@@ -13,25 +14,33 @@ class ResultHeap:
     """
     A ResultHeap stores the top n search results. The underlying
     data structure is a Python heap with a maximum size.
+
+    Results are (score, internal docid) pairs.  Ties are broken by
+    external id (the smaller external id ranks higher), but external
+    ids are looked up only for the final results, in get_ranking.
+    Ties are compared with Idx.getExternalDocidRanks, which orders
+    docids as their external ids are ordered.  If the index doesn't
+    cache external ids, each result's external id is looked up when
+    it is added to the heap, as before.
+
+    Heap entries are tuples, so heapq compares them in C: (score,
+    -rank, docid) or (score, ExternalIdKey, docid).  The smallest
+    entry is the result that is replaced next.
     """
 
-    class Result:
+    class ExternalIdKey:
         """
-        A utility class to create an <externalDocid, score> object
-        for the heap.
+        A utility class that orders external ids in reverse, so that
+        the heap replaces the larger external id of a tie first.
         """
 
-        def __init__(self, externalId, score):
+        __slots__ = ('externalId',)
+
+        def __init__(self, externalId):
             self.externalId = externalId
-            self.score = score
 
         def __lt__(self, other):
-            return(self.score < other.score or
-                    (self.score == other.score and
-                      self.externalId < other.externalId))
-
-        def __str__(self):
-            return(f'{self.externalId} {self.score}')
+            return(self.externalId > other.externalId)
 
 
     # -------------- Methods (alphabetical) ---------------- #
@@ -40,15 +49,9 @@ class ResultHeap:
         """Create an empty ResultHeap that can store n results."""
         self._max_heap_size = n
         self._heap = []
+        self._ranks = Idx.getExternalDocidRanks()
 
 
-    def _full(self):
-        """
-        True iff the heap is full, otherwise False.
-        """
-        return(len(self._heap) == self._max_heap_size)
-    
-        
     def __len__(self):
         return(len(self._heap))
 
@@ -62,33 +65,50 @@ class ResultHeap:
 
         # Do the most common case as efficiently as possible. This
         # works because the list is always kept in heap order.
-        if self._full():
-            if self._heap[ 0 ].score > score:
-                return
-
-        # Check whether this result needs to be added to the list.
-        externalId = Idx.getExternalDocid(internalId)
-        
-        if not self._full():
-            heapq.heappush(self._heap, self.Result(externalId, score))
-            heapq.heapify(self._heap)
+        heap = self._heap
+        full = len(heap) == self._max_heap_size
+        if full and heap[0][0] > score:
+            return
+
+        if self._ranks is not None:
+            entry = (score, -self._ranks[internalId], internalId)
         else:
-            # Decide whether to replace the smallest element. This can
-            # be done with fewer lines of code, but it is called hundreds
-            # of thousands of times, so be efficient as possible.
-            smallest = self._heap[ 0 ]
-            if (smallest.score < score or
-                 (smallest.score == score  and
-                   smallest.externalId < externalId)):
-                smallest.score = score
-                smallest.externalId = externalId
-                heapq.heapify(self._heap)
+            entry = (score,
+                     self.ExternalIdKey(Idx.getExternalDocid(internalId)),
+                     internalId)
+
+        # Tuples compare score first, then the tie key, so the new
+        # result replaces the smallest one only if it ranks higher.
+        if not full:
+            heapq.heappush(heap, entry)
+        elif heap[0] < entry:
+            heapq.heapreplace(heap, entry)
 
 
     def get_ranking(self):
         """
         Get a ranked list of results in (score, externalId) order.
         """
-        return(sorted(self._heap,
-                        key=lambda x: (-x.score, x.externalId)))
+        results = sorted(self._heap, reverse=True)
+        return([(score, Idx.getExternalDocid(internalId))
+                for score, _, internalId in results])
 
+
+    def getThreshold(self):
+        """
+        Get the smallest score that a document needs to enter the
+        heap: the smallest score in the heap if it is full, otherwise
+        -math.inf.  A document that has the threshold score enters
+        only if it wins the tie.  Evaluators that prune can use the
+        threshold to skip documents.
+        """
+        if not self.isFull():
+            return(-math.inf)
+        return(self._heap[0][0])
+
+
+    def isFull(self):
+        """
+        True iff the heap is full, otherwise False.
+        """
+        return(len(self._heap) == self._max_heap_size)
@@ -12,7 +12,7 @@ class RetrievalModelBM25(RetrievalModel):
 
     # -------------- Methods (alphabetical) ---------------- #
 
-    def __init__(self, k_1, b, k_3):
+    def __init__(self, k_1, b, k_3, wand=False, blockMaxWand=False):
         RetrievalModel.__init__(self)
         # SUM query operator is the default query operator for unstructured (bag of word) queries in BM25.		
         self.defaultQrySop = '#SUM'
@@ -20,4 +20,12 @@ class RetrievalModelBM25(RetrievalModel):
         # Model Parameters
         self.k_1 = k_1
         self.b = b
-        self.k_3 = k_3
\ No newline at end of file
+        self.k_3 = k_3
+
+        # If True, #SUM uses WAND to skip documents that can't reach the
+        # top of the ranking.
+        self.wand = wand
+
+        # If True, #SUM uses Block-Max WAND, which also skips blocks of
+        # postings whose score bounds are too low.
+        self.blockMaxWand = blockMaxWand
\ No newline at end of file
@@ -12,11 +12,30 @@ class RetrievalModelIndri(RetrievalModel):
 
     # -------------- Methods (alphabetical) ---------------- #
 
-    def __init__(self, mu, Lambda):
+    def __init__(self, mu, Lambda, blockMaxWand=False, maxScore=False,
+                 logSpace=False):
         RetrievalModel.__init__(self)
         # AND is the default query operator for most language modeling systems		
         self.defaultQrySop = '#AND'
 
         # Parameters for Indri
         self.mu = mu
-        self.Lambda = Lambda
\ No newline at end of file
+        self.Lambda = Lambda
+
+        # If True, #WSUM uses Block-Max WAND to skip documents that
+        # can't reach the top of the ranking.
+        self.blockMaxWand = blockMaxWand
+
+        # If True, #AND and #WAND use MaxScore to skip documents that
+        # can't reach the top of the ranking.
+        self.maxScore = maxScore
+
+        # If True, scores are log probabilities: #SCORE returns the log
+        # of its probability, and #AND and #WAND are weighted sums of
+        # their arguments' scores.  Scores are reported as log
+        # probabilities, as Indri reports them.  Rankings are the same
+        # up to floating point rounding.  The logs round differently,
+        # so documents whose scores are nearly tied may change order,
+        # and tied documents may stop being tied (ties are broken by
+        # external id).
+        self.logSpace = logSpace
@@ -0,0 +1,124 @@
+"""
+A score-at-a-time (SAAT) anytime evaluator for flat bag-of-words
+BM25 queries.  It uses the impact-ordered index instead of the query
+operator tree.
+"""
+
+# Copyright (c) 2026, Carnegie Mellon University.  All Rights Reserved.
+
+import time
+
+# NumPy is optional.  It is needed only by the SAAT engine.
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from FlatEngine import FlatEngine
+from ImpactIndex import ImpactIndex
+from QrySopSum import QrySopSum
+from RetrievalModelBM25 import RetrievalModelBM25
+from TaatEngine import TaatEngine
+
+
+class SaatEngine:
+    """
+    Evaluate flat BM25 #SUM queries score-at-a-time.  The impact
+    segments of all query terms are processed from the highest impact
+    to the lowest, and each segment adds its impact to the accumulators
+    of its documents.  The most important postings are processed first,
+    so evaluation can stop early, after a posting budget or a time
+    budget is used, and still return a good ranking.  Smaller budgets
+    trade ranking quality for lower latency.
+
+    Scores are quantized BM25 scores (the sum of the impacts times the
+    quantization step), so rankings approximate DAAT BM25 rankings
+    even when the budgets are unlimited.  Other queries are left to
+    DAAT evaluation.
+    """
+
+    # -------------- Methods (alphabetical) ---------------- #
+
+    def __init__(self, model, max_results, postingsBudget=None,
+                 timeBudget=None):
+        """
+        Create a SAAT engine.
+
+        model: A RetrievalModelBM25.
+        max_results: The maximum number of documents to return.
+        postingsBudget: The maximum number of postings to process for
+          a query, or None for no limit.
+        timeBudget: The maximum time to spend on a query, in
+          milliseconds, or None for no limit.  The time is checked
+          between segments.
+        """
+        if np is None:
+            raise Exception('Error: The saat evaluation engine needs NumPy.')
+
+        if not isinstance(model, RetrievalModelBM25):
+            raise Exception('Error: The saat evaluation engine supports BM25.')
+
+        if not ImpactIndex.isOpen():
+            raise Exception('Error: The saat evaluation engine needs ' +
+                            'an open impact index.')
+
+        self._model = model
+        self._max_results = max_results
+        self._postingsBudget = postingsBudget
+        self._timeBudget = timeBudget
+
+
+    def getRanking(self, q):
+        """
+        Evaluate a query score-at-a-time.  The query is not initialized,
+        because its inverted lists aren't used.
+
+        q: A query.
+
+        Returns a list of (score, externalId) in ranking order, or None
+        if the query isn't a flat BM25 #SUM query.
+        """
+        start = time.perf_counter()
+
+        if type(q) is not QrySopSum:
+            return(None)
+
+        terms = FlatEngine.getFlatTerms(q._args)
+        if terms is None:
+            return(None)
+
+        # Order segments by decreasing impact.  Ties are broken by
+        # query order, so that evaluation is deterministic.
+        segments = []
+        for i, t in enumerate(terms):
+            for impact, docids in ImpactIndex.get(t._field, t._term,
+                                                  self._model.k_1,
+                                                  self._model.b):
+                segments.append((impact, i, docids))
+
+        if len(segments) == 0:
+            return([])
+
+        segments.sort(key=lambda s: (-s[0], s[1]))
+        size = max(int(docids.max()) for _, _, docids in segments) + 1
+        accumulators = np.zeros(size, dtype=np.int64)
+        budget = self._postingsBudget
+
+        for impact, _, docids in segments:
+            if (self._timeBudget is not None and
+                (time.perf_counter() - start) * 1000 >= self._timeBudget):
+                break
+
+            if budget is not None:
+                if budget <= 0:
+                    break
+                docids = docids[:budget]
+                budget -= len(docids)
+
+            accumulators[docids] += impact
+
+        candidates = np.flatnonzero(accumulators)
+        scale = ImpactIndex.getScale()
+        return(TaatEngine.getTopDocs(candidates, accumulators[candidates],
+                                     self._max_results,
+                                     lambda a: a * scale))
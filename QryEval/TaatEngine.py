@@ -0,0 +1,363 @@
+"""
+A term-at-a-time (TAAT) evaluator for flat bag-of-words BM25 and
+Indri queries.  It is an alternative to document-at-a-time evaluation
+with the query operator tree.
+"""
+
+# Copyright (c) 2026, Carnegie Mellon University.  All Rights Reserved.
+
+import math
+
+# NumPy is optional.  It is needed only by the TAAT engine.
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from CollectionStats import CollectionStats
+from Idx import Idx
+from FlatEngine import FlatEngine
+from QrySopAnd import QrySopAnd
+from QrySopSum import QrySopSum
+from RetrievalModelBM25 import RetrievalModelBM25
+from RetrievalModelIndri import RetrievalModelIndri
+
+
+class TaatEngine:
+    """
+    Evaluate flat bag-of-words queries term-at-a-time: BM25 #SUM and
+    Indri #AND queries whose arguments are all terms.  Each term's
+    contribution is added to a score accumulator with vectorized NumPy
+    operations over its posting arrays and the field length cache,
+    instead of several Python method calls per document per query
+    operator.  The top documents are selected with argpartition-style
+    partial sorting.
+
+    The accumulator is dense (one entry per docid) if the inverted
+    lists are long compared to the corpus, and sparse (one entry per
+    candidate document) if the query is selective.
+
+    Term scores use the same floating point operations in the same
+    order as QrySopScore, and they are combined in query order, as
+    QrySopSum and QrySopAnd do, so scores and rankings match DAAT
+    evaluation.  Other queries are left to DAAT evaluation.
+    """
+
+    # -------------- Constants and variables --------------- #
+
+    # Use a sparse accumulator if the query has fewer postings than
+    # this fraction of the docid space.
+    SPARSE_FRACTION = 0.125
+
+    _fieldLengths = {}		# field -> (cached lengths, NumPy array)
+
+
+    # -------------- Methods (alphabetical) ---------------- #
+
+    def __init__(self, model, max_results):
+        """
+        Create a TAAT engine.
+
+        model: A RetrievalModelBM25 or RetrievalModelIndri.
+        max_results: The maximum number of documents to return.
+        """
+        if np is None:
+            raise Exception('Error: The taat evaluation engine needs NumPy.')
+
+        self._model = model
+        self._max_results = max_results
+
+
+    def __getDefaultScoresIndri(self, q, lengths):
+        """
+        Get Indri default scores for documents that don't contain a
+        term, as QrySopScore.getDefaultScore calculates them.
+
+        q: A QryIopTerm.
+        lengths: A NumPy array of field lengths.
+
+        Returns a NumPy array of scores.
+        """
+        mu = self._model.mu
+        Lambda = self._model.Lambda
+
+        ctf = q.getCtf()
+        if ctf == 0:
+            ctf = 0.5
+        pMLE = CollectionStats.getPMLE(q._field, ctf)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scores = (1-Lambda)*((0+mu*pMLE)/(lengths+mu))+Lambda*pMLE
+
+        if mu == 0:
+            scores[lengths == 0] = 0
+        return(scores)
+
+
+    def __getFieldLengths(self, fieldName, docids=None):
+        """
+        Get field lengths as a NumPy array.
+
+        fieldName: The name of a document field.
+        docids: A NumPy array of internal docids, or None for all
+          documents.
+
+        Returns a NumPy array of field lengths, or None if docids is
+        None and field lengths aren't cached.
+        """
+        # Arrays are rebuilt if the index (and its field length cache)
+        # is reopened.
+        cached = Idx.getFieldLengths(fieldName)
+        lengths = None
+
+        if cached is not None:
+            entry = TaatEngine._fieldLengths.get(fieldName)
+            if entry is not None and entry[0] is cached:
+                lengths = entry[1]
+            else:
+                lengths = np.array(cached, dtype=np.int64)
+                TaatEngine._fieldLengths[fieldName] = (cached, lengths)
+
+        if docids is None:
+            return(lengths)
+        if lengths is not None:
+            return(lengths[docids])
+
+        return(np.array([Idx.getFieldLength(fieldName, int(d))
+                         for d in docids], dtype=np.int64))
+
+
+    def getRanking(self, q):
+        """
+        Evaluate a query term-at-a-time.  The query is initialized
+        only if it is evaluated.
+
+        q: A query.
+
+        Returns a list of (score, externalId) in ranking order, or None
+        if the query isn't a flat BM25 #SUM or Indri #AND query.
+        """
+        if isinstance(self._model, RetrievalModelBM25):
+            if type(q) is not QrySopSum:
+                return(None)
+        elif isinstance(self._model, RetrievalModelIndri):
+            if type(q) is not QrySopAnd:
+                return(None)
+        else:
+            return(None)
+
+        terms = FlatEngine.getFlatTerms(q._args)
+
+        # Streamed and compressed inverted lists are left to DAAT
+        # evaluation, which reads them without materializing them.
+        if (terms is None or
+            not all([FlatEngine.isMaterialized(t) for t in terms])):
+            return(None)
+
+        q.initialize(self._model)
+        postings = [FlatEngine.getPostings(t) for t in terms]
+
+        if None in postings:
+            return(None)
+
+        postings = [(np.frombuffer(docids, dtype=np.intc),
+                     np.frombuffer(tfs, dtype=np.intc))
+                    for docids, tfs in postings]
+        total = sum(len(d) for d, _ in postings)
+
+        if total == 0:
+            return([])
+
+        size = max(int(d[-1]) for d, _ in postings if len(d) > 0) + 1
+        dense = (total >= TaatEngine.SPARSE_FRACTION * size and
+                 all(self.__getFieldLengths(t._field) is not None
+                     for t in terms))
+
+        if dense:
+            candidates = None
+        else:
+            candidates = np.unique(np.concatenate([d for d, _ in postings]))
+
+        if isinstance(self._model, RetrievalModelBM25):
+            return(self.__getRankingBM25(terms, postings, size, candidates))
+        else:
+            return(self.__getRankingIndri(terms, postings, size, candidates))
+
+
+    def __getRankingBM25(self, terms, postings, size, candidates):
+        """
+        Evaluate a flat BM25 #SUM query.  Each document's score is the
+        sum of the scores of the terms that it contains.
+
+        terms: A list of QryIopTerm.
+        postings: A list of (docids, tfs) for each term.
+        size: The size of the docid space.
+        candidates: A sorted NumPy array of candidate docids (sparse
+          accumulator), or None (dense accumulator).
+
+        Returns a list of (score, externalId) in ranking order.
+        """
+        if candidates is None:
+            scores = np.zeros(size)
+            matched = np.zeros(size, dtype=bool)
+        else:
+            scores = np.zeros(len(candidates))
+
+        for t, (docids, tfs) in zip(terms, postings):
+            lengths = self.__getFieldLengths(t._field, docids)
+            termScores = self.__getScoresBM25(t, tfs, lengths)
+
+            if candidates is None:
+                scores[docids] += termScores
+                matched[docids] = True
+            else:
+                scores[np.searchsorted(candidates, docids)] += termScores
+
+        if candidates is None:
+            candidates = np.flatnonzero(matched)
+            scores = scores[candidates]
+
+        return(TaatEngine.getTopDocs(candidates, scores,
+                                      self._max_results, lambda s: s))
+
+
+    def __getRankingIndri(self, terms, postings, size, candidates):
+        """
+        Evaluate a flat Indri #AND query.  Each document's score is the
+        geometric mean of the term scores, where terms that it doesn't
+        contain contribute their default scores.  Documents are ranked
+        by the product of the term scores, which has the same order.
+        If the model scores in log space, documents are ranked by the
+        sum of the logs of the term scores instead, which doesn't
+        underflow on long queries, and the score is the mean of the
+        logs.  NumPy's log may differ from math.log in the last bit, so
+        log space scores may differ slightly from DAAT scores.
+
+        terms: A list of QryIopTerm.
+        postings: A list of (docids, tfs) for each term.
+        size: The size of the docid space.
+        candidates: A sorted NumPy array of candidate docids (sparse
+          accumulator), or None (dense accumulator).
+
+        Returns a list of (score, externalId) in ranking order.
+        """
+        logSpace = self._model.logSpace
+        initial = np.zeros if logSpace else np.ones
+
+        if candidates is None:
+            keys = initial(size)
+            matched = np.zeros(size, dtype=bool)
+        else:
+            keys = initial(len(candidates))
+
+        for t, (docids, tfs) in zip(terms, postings):
+            if candidates is None:
+                allLengths = self.__getFieldLengths(t._field)[:size]
+                termScores = self.__getDefaultScoresIndri(t, allLengths)
+                termScores[docids] = self.__getScoresIndri(
+                    t, tfs, allLengths[docids])
+                matched[docids] = True
+            else:
+                lengths = self.__getFieldLengths(t._field, candidates)
+                termScores = self.__getDefaultScoresIndri(t, lengths)
+                termScores[np.searchsorted(candidates, docids)] = (
+                    self.__getScoresIndri(t, tfs,
+                                          self.__getFieldLengths(t._field,
+                                                                 docids)))
+
+            if logSpace:
+                with np.errstate(divide='ignore'):
+                    keys += np.log(termScores)
+            else:
+                keys *= termScores
+
+        if candidates is None:
+            candidates = np.flatnonzero(matched)
+            keys = keys[candidates]
+
+        n = len(terms)
+        if logSpace:
+            finalize = lambda s: s / n
+        else:
+            finalize = lambda p: math.pow(p, 1/n)
+
+        return(TaatEngine.getTopDocs(candidates, keys, self._max_results,
+                                     finalize))
+
+
+    def __getScoresBM25(self, q, tfs, lengths):
+        """
+        Get BM25 term scores, as QrySopScore.getScore calculates them.
+
+        q: A QryIopTerm.
+        tfs: A NumPy array of term frequencies.
+        lengths: A NumPy array of field lengths.
+
+        Returns a NumPy array of scores.
+        """
+        k_1 = self._model.k_1
+        b = self._model.b
+        k_3 = self._model.k_3
+
+        rsj_weight = CollectionStats.getIdf(q.getDf())
+
+        avg_doclen = CollectionStats.getAvgFieldLength(q._field)
+        tf_weight = tfs / (tfs + k_1 * ((1 - b) + b * (lengths / avg_doclen)))
+
+        qtf = 1
+        user_weight = (k_3 + 1) * qtf / (k_3 + qtf)
+
+        return(rsj_weight * tf_weight * user_weight)
+
+
+    def __getScoresIndri(self, q, tfs, lengths):
+        """
+        Get Indri term scores, as QrySopScore.getScore calculates them.
+
+        q: A QryIopTerm.
+        tfs: A NumPy array of term frequencies.
+        lengths: A NumPy array of field lengths.
+
+        Returns a NumPy array of scores.
+        """
+        mu = self._model.mu
+        Lambda = self._model.Lambda
+
+        pMLE = CollectionStats.getPMLE(q._field, q.getCtf())
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scores = (1-Lambda)*((tfs+mu*pMLE)/(lengths+mu))+Lambda*pMLE
+
+        if mu == 0:
+            scores[lengths == 0] = 0
+        return(scores)
+
+
+    @staticmethod
+    def getTopDocs(docids, keys, k, finalize):
+        """
+        Select the top documents.
+
+        docids: A NumPy array of candidate docids.
+        keys: A NumPy array of values that rank the candidates in the
+          same order as their scores.
+        k: The maximum number of documents to return.
+        finalize: A function that converts a key into a score.
+
+        Returns a list of (score, externalId) in ranking order.
+        """
+
+        # Partially sort to find the k'th largest key.  Candidates that
+        # are (almost) tied with it are kept, so that ties are broken
+        # by external id, as the DAAT ranker does.
+        if len(keys) > k:
+            kth = np.partition(keys, len(keys) - k)[len(keys) - k]
+            selected = np.flatnonzero(keys >= kth - 1e-9 * abs(kth))
+        else:
+            selected = np.arange(len(keys))
+
+        results = [(finalize(float(keys[i])),
+                    Idx.getExternalDocid(int(docids[i])))
+                   for i in selected]
+        results.sort(key=lambda r: (-r[0], r[1]))
+        return(results[:k])
@@ -0,0 +1,164 @@
+"""
+A heap-ordered iterator over the union of the documents that the
+arguments of a query operator match.
+"""
+
+# Copyright (c) 2026, Carnegie Mellon University.  All Rights Reserved.
+
+import heapq
+
+
+class UnionIterator:
+    """
+    An iterator over the union of the documents that a list of query
+    operators (the arguments of a disjunctive operator such as #OR,
+    #SUM, or #SYN) match.  A heap holds (docid, argument index) for
+    each argument that isn't exhausted, so the next docid is found
+    without probing every argument.  The arguments that match the
+    current docid are taken off the heap, which tells scorers which
+    arguments match without calling docIteratorHasMatch and
+    docIteratorGetMatch on each of them.  Only those arguments (and
+    arguments behind an advance target) are advanced.
+
+    Heap entries are checked against their arguments when they reach
+    the top of the heap, so arguments that other code advanced (e.g.,
+    WAND pruning) are handled correctly, as long as iterators only
+    move forward.  The iterator is built from the arguments' current
+    positions, so it can be discarded and rebuilt at any time.
+    """
+
+    # -------------- Methods (alphabetical) ---------------- #
+
+    def __init__(self, args, r):
+        """
+        Create an iterator over the union of the arguments' documents.
+
+        args: A list of initialized query operators.
+        r: The retrieval model that determines what is a match.
+        """
+        self._args = args
+        self._r = r
+        self._heap = [(q_i.docIteratorGetMatch(), i)
+                      for i, q_i in enumerate(args)
+                      if q_i.docIteratorHasMatch(r)]
+        heapq.heapify(self._heap)
+        self._docid = None		# The current docid
+        self._matches = None		# Arguments at the current docid
+
+
+    def __advance(self, docid, past):
+        """
+        Advance the arguments that are before a target docid.
+
+        docid: An internal document id.
+        past: If True, advance past docid; otherwise advance to it.
+        """
+        r = self._r
+        args = self._args
+        heap = self._heap
+        target = docid + 1 if past else docid
+
+        if self._matches is not None:
+            if self._docid >= target:
+                return			# No argument is behind the target
+
+            for i in self._matches:
+                heapq.heappush(heap, (self._docid, i))
+
+            self._matches = None
+
+        # Advancing an argument that is already beyond the target (its
+        # entry is out of date) doesn't move it.
+        while heap and heap[0][0] < target:
+            i = heap[0][1]
+            q_i = args[i]
+
+            if past:
+                q_i.docIteratorAdvancePast(docid)
+            else:
+                q_i.docIteratorAdvanceTo(docid)
+
+            if q_i.docIteratorHasMatch(r):
+                heapq.heapreplace(heap, (q_i.docIteratorGetMatch(), i))
+            else:
+                heapq.heappop(heap)
+
+
+    def advancePast(self, docid):
+        """
+        Advance the iterator beyond the specified document.
+
+        docid: An internal document id.
+        """
+        self.__advance(docid, True)
+
+
+    def advanceTo(self, docid):
+        """
+        Advance the iterator to the specified document, or beyond if
+        no argument matches it.
+
+        docid: An internal document id.
+        """
+        self.__advance(docid, False)
+
+
+    def getDocid(self):
+        """
+        Get the current docid.  hasMatch must be True.
+
+        Returns an internal document id.
+        """
+        return(self._docid)
+
+
+    def getMatches(self):
+        """
+        Get the arguments that match the current docid.  hasMatch must
+        be True.
+
+        Returns a sorted list of argument indexes.
+        """
+        return(self._matches)
+
+
+    def hasMatch(self):
+        """
+        Find the smallest docid that an argument matches, and the
+        arguments that match it.
+
+        Returns True if an argument has a match, otherwise False.
+        """
+        if self._matches is not None:
+            return(True)
+
+        r = self._r
+        args = self._args
+        heap = self._heap
+        matches = []
+
+        # Pop the arguments at the smallest docid, and refresh entries
+        # whose arguments were advanced by other code.
+        while heap:
+            docid, i = heap[0]
+
+            if matches and docid != self._docid:
+                break
+
+            q_i = args[i]
+
+            if not q_i.docIteratorHasMatch(r):
+                heapq.heappop(heap)
+            elif q_i.docIteratorGetMatch() != docid:
+                heapq.heapreplace(heap, (q_i.docIteratorGetMatch(), i))
+            else:
+                heapq.heappop(heap)
+                matches.append(i)
+                self._docid = docid
+
+        if not matches:
+            return(False)
+
+        matches.sort()
+        self._matches = matches
+        return(True)
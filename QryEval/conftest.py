@@ -0,0 +1,158 @@
+"""
+Shared pytest fixtures.  memoryIndex creates small random corpora
+whose collection statistics, field lengths, and external ids are
+stored in the Idx and CollectionStats caches, and whose inverted lists
+are given to the query terms, so rankings can be tested without a
+Lucene index.
+"""
+
+# Copyright (c) 2026, Carnegie Mellon University.  All Rights Reserved.
+
+import random
+
+import pytest
+
+from CollectionStats import CollectionStats
+from Idx import Idx
+from InvList import InvList
+from LengthNorms import LengthNorms
+from QryIopTerm import QryIopTerm
+
+# ------------------ Global variables ---------------------- #
+
+field = 'body'
+
+
+# ------------------ Classes ------------------------------- #
+
+class QryIopTermList(QryIopTerm):
+    """A term whose inverted list is given, not read from the index."""
+
+    def __init__(self, termString, invList):
+        QryIopTerm.__init__(self, termString, invList._field)
+        self.__invList = invList
+
+    def evaluate(self):
+        self.invertedList = self.__invList
+
+
+class MemoryIndex:
+    """
+    A random corpus of one field.  Field lengths are short, so many
+    documents have the same length and tf, and thus the same score;
+    external ids are shuffled, so ties are broken by the external ids,
+    not by the internal docids.  Terms have a wide range of dfs, and
+    one term doesn't occur in the corpus.  The largest tf of a term
+    varies from one range of docids to another, so the score bounds of
+    postings blocks (see InvList.getBlockMetadata) differ.
+    """
+
+    def __init__(self, seed, numDocs=200, numTerms=6):
+        """
+        Create a random corpus.
+
+        seed: A random seed.
+        numDocs: The number of documents.
+        numTerms: The number of terms.
+        """
+        rng = random.Random(seed)
+        self.rng = rng
+        self.lengths = [rng.randint(1, 40) for _ in range(numDocs)]
+        self.eids = [f'doc-{i:04d}' for i in range(numDocs)]
+        rng.shuffle(self.eids)
+
+        self.invLists = {}
+        for i in range(numTerms):
+            df = 0 if i == 0 else rng.choice([1, 5, 20, 80, numDocs])
+            maxTfs = [rng.choice([1, 3, 10])
+                      for _ in range(numDocs // InvList.BLOCK_SIZE + 1)]
+            invList = InvList(field, None, InvList.FREQS)
+            docids = sorted(rng.sample(range(numDocs), df))
+            invList.appendPostings(
+                docids, [rng.randint(1, min(maxTfs[d // InvList.BLOCK_SIZE],
+                                            self.lengths[d]))
+                         for d in docids])
+            self.invLists[f't{i}'] = invList
+
+
+    def getQuery(self, operator, terms, weights=None):
+        """
+        Create a query, as QryParser does.  A query that has one term
+        is its #SCORE operator.
+
+        operator: A QrySop class, e.g., QrySopSum.
+        terms: A list of terms.
+        weights: A list of term weights, for #WSUM and #WAND.
+
+        Returns a query.
+        """
+        q = operator()
+        for i, t in enumerate(terms):
+            if weights is not None:
+                q.setWeight(weights[i])
+            q.appendArg(QryIopTermList(t, self.invLists[t]))
+
+        if len(q._args) == 1:
+            q = q._args[0]
+
+        return(q)
+
+
+    def getRandomTerms(self):
+        """
+        Get from one to four random terms, possibly with repeats.
+
+        Returns a list of terms.
+        """
+        return(self.rng.choices(sorted(self.invLists),
+                                k=self.rng.randint(1, 4)))
+
+
+    def getRandomWeights(self, n):
+        """
+        Get random term weights.  A few weights are 0.
+
+        n: The number of weights.
+
+        Returns a list of weights.
+        """
+        return(self.rng.choices([0.0, 0.5, 1.0, 2.0, 3.5], [1, 4, 4, 4, 4],
+                                k=n))
+
+
+# ------------------ Fixtures ------------------------------ #
+
+@pytest.fixture
+def memoryIndex(monkeypatch):
+    """
+    Returns a function of a random seed (and MemoryIndex options) that
+    creates a MemoryIndex and stores its statistics in the Idx,
+    CollectionStats, and LengthNorms caches.  The caches are restored
+    after the test.
+    """
+    def install(seed, **options):
+        index = MemoryIndex(seed, **options)
+        dfs = {t: l.df for t, l in index.invLists.items()}
+        ctfs = {t: l.ctf for t, l in index.invLists.items()}
+
+        for cls, name, value in [
+                (Idx, '_ldc_field_lengths', {field: index.lengths}),
+                (Idx, '_ldc_min_field_lengths', {}),
+                (Idx, '_ldc_eid', index.eids),
+                (Idx, '_ldc_eid_ranks', None),
+                (CollectionStats, '_numDocs', len(index.lengths)),
+                (CollectionStats, '_docCount', {field: len(index.lengths)}),
+                (CollectionStats, '_sumOfFieldLengths',
+                 {field: sum(index.lengths)}),
+                (CollectionStats, '_docFreq', {field: dfs}),
+                (CollectionStats, '_totalTermFreq', {field: ctfs}),
+                (CollectionStats, '_avgFieldLength', {}),
+                (CollectionStats, '_idf', {}),
+                (CollectionStats, '_pMLE', {}),
+                (LengthNorms, '_path', None),
+                (LengthNorms, '_norms', {})]:
+            monkeypatch.setattr(cls, name, value)
+
+        return(index)
+
+    return(install)
@@ -0,0 +1,68 @@
+"""
+Randomized tests of the flat query engine.  FlatEngine evaluates flat
+bag-of-words queries without the query operator tree, and it must
+return the same ranking (scores, documents, and tie order) as the
+query operator tree and ResultHeap.  These tests compare both on
+random corpora (see conftest.py).  Run them with pytest.
+"""
+
+# Copyright (c) 2026, Carnegie Mellon University.  All Rights Reserved.
+
+import pytest
+
+from QrySopAnd import QrySopAnd
+from QrySopOr import QrySopOr
+from QrySopSum import QrySopSum
+from Ranker import Ranker
+
+# ------------------ Global variables ---------------------- #
+
+numTrials = 200
+outputLength = 10
+
+bm25 = {'retrievalAlgorithm': 'BM25',
+        'BM25:k_1': 1.2, 'BM25:b': 0.75, 'BM25:k_3': 0}
+indri = {'retrievalAlgorithm': 'Indri',
+         'Indri:mu': 2500, 'Indri:lambda': 0.4}
+
+# (parameters, query operator) pairs.  Indri #AND queries include the
+# term that doesn't occur in the corpus, and terms that most documents
+# don't contain, which get default scores.
+models = {
+    'BM25-SUM': (bm25, QrySopSum),
+    'Indri-AND': (indri, QrySopAnd),
+    'Indri-AND-smallMu': (dict(indri, **{'Indri:mu': 5}), QrySopAnd),
+    'Indri-AND-logSpace': (dict(indri, **{'Indri:logSpace': True}),
+                           QrySopAnd),
+    'RankedBoolean-AND': ({'retrievalAlgorithm': 'RankedBoolean'},
+                          QrySopAnd),
+    'RankedBoolean-OR': ({'retrievalAlgorithm': 'RankedBoolean'},
+                         QrySopOr),
+    'UnrankedBoolean-AND': ({'retrievalAlgorithm': 'UnrankedBoolean'},
+                            QrySopAnd),
+    'UnrankedBoolean-OR': ({'retrievalAlgorithm': 'UnrankedBoolean'},
+                           QrySopOr),
+}
+
+
+# ------------------ Tests --------------------------------- #
+
+@pytest.mark.parametrize('model', sorted(models))
+@pytest.mark.parametrize('compileScorers', [False, True])
+def test_sameRanking(memoryIndex, model, compileScorers):
+    parameters, operator = models[model]
+    parameters = dict(parameters, outputLength=outputLength,
+                      compileScorers=compileScorers)
+    flatRanker = Ranker(parameters)
+    treeRanker = Ranker(dict(parameters, flatEngine=False))
+
+    for seed in range(numTrials):
+        index = memoryIndex(seed)
+        terms = index.getRandomTerms()
+
+        flat = flatRanker._flatEngine.getRanking(
+            index.getQuery(operator, terms))
+        tree = treeRanker.get_ranking_bow(index.getQuery(operator, terms))
+
+        assert flat is not None
+        assert flat == tree, f'seed {seed}, terms {terms}'
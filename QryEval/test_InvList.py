@@ -0,0 +1,79 @@
+"""
+Tests of InvList postings and printing in each postings mode.  Lists
+that don't store locations (e.g., the lists of terms under #SCORE)
+must still provide each posting's docid and tf.  Run them with pytest.
+"""
+
+# Copyright (c) 2026, Carnegie Mellon University.  All Rights Reserved.
+
+import pytest
+
+from InvList import InvList
+from InvListCompressed import InvListCompressed
+
+# ------------------ Global variables ---------------------- #
+
+field = 'body'
+
+
+# ------------------ Methods (alphabetical) ---------------- #
+
+def countOnlyInvList(postingsMode):
+    """
+    Create an inverted list that doesn't store locations.
+
+    postingsMode: InvList.FREQS or InvList.DOCS.
+
+    Returns an InvList with postings for docids 3 and 5.
+    """
+    invList = InvList(field, None, postingsMode)
+    if postingsMode == InvList.FREQS:
+        invList.appendPostings([3, 5], [2, 4])
+    else:
+        invList.appendPostings([3, 5], [1, 1])
+
+    return(invList)
+
+
+# ------------------ Tests --------------------------------- #
+
+@pytest.mark.parametrize('postingsMode', [InvList.FREQS, InvList.DOCS])
+@pytest.mark.parametrize('compress', [False, True])
+def test_getPosting_countOnly(postingsMode, compress):
+    invList = countOnlyInvList(postingsMode)
+    tfs = [invList.getTf(0), invList.getTf(1)]
+    if compress:
+        invList = InvListCompressed(invList)
+
+    for n, docid in enumerate([3, 5]):
+        posting = invList.getPosting(n)
+        assert posting.docid == docid
+        assert posting.tf == tfs[n]
+        assert list(posting.positions) == []
+
+
+@pytest.mark.parametrize('compress', [False, True])
+def test_getPosting_positions(compress):
+    invList = InvList(field)
+    invList.appendPosting(3, [1, 7])
+    invList.appendPosting(5, [2, 4, 9])
+    if compress:
+        invList = InvListCompressed(invList)
+
+    posting = invList.getPosting(1)
+    assert posting.docid == 5
+    assert posting.tf == 3
+    assert list(posting.positions) == [2, 4, 9]
+
+
+@pytest.mark.parametrize('postingsMode', [InvList.FREQS, InvList.DOCS])
+@pytest.mark.parametrize('compress', [False, True])
+def test_str_countOnly(postingsMode, compress):
+    invList = countOnlyInvList(postingsMode)
+    tf = invList.getTf(1)
+    if compress:
+        invList = InvListCompressed(invList)
+
+    s = str(invList)
+    assert '\tdocid: 3\n' in s
+    assert f'\tdocid: 5\n\ttf: {tf}\n\tPositions: \n' in s
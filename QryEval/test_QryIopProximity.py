@@ -0,0 +1,181 @@
+"""
+Randomized tests of the vectorized #NEAR and #WINDOW evaluation.  The
+two-argument case is evaluated for all documents at once (see
+QryIop._getArgLocations), and documents where the vectorized rules
+can't reproduce the greedy search fall back to the buffer matchers.
+These tests compare the vectorized results with the buffer matchers
+(_getNextMatch) on random inverted lists.  Run them with pytest.
+"""
+
+# Copyright (c) 2026, Carnegie Mellon University.  All Rights Reserved.
+
+import random
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from InvList import InvList
+from QryIop import QryIop
+from QryIopNear import QryIopNear
+from QryIopWindow import QryIopWindow
+
+# ------------------ Global variables ---------------------- #
+
+field = 'body'
+numDocs = 40
+numTrials = 3000
+
+# (span, maxTf) pairs.  Short spans and large tfs put locations close
+# together, which is where greedy matches conflict.
+shapes = [(10, 6), (30, 12), (300, 4), (2000, 30)]
+
+
+# ------------------ Classes ------------------------------- #
+
+class QryIopList(QryIop):
+    """A query operator whose inverted list is given, not evaluated."""
+
+    def __init__(self, invList):
+        QryIop.__init__(self)
+        self._field = invList._field
+        self.__invList = invList
+
+    def evaluate(self):
+        self.invertedList = self.__invList
+
+
+# ------------------ Methods (alphabetical) ---------------- #
+
+def evaluate(op, invLists, postingsMode):
+    """
+    Evaluate a proximity operator twice, vectorized and with the buffer
+    matchers.
+
+    op: An empty QryIopNear or QryIopWindow.
+    invLists: A list of two InvList, one per argument.
+    postingsMode: InvList.POSITIONS or InvList.FREQS.
+
+    Returns the vectorized and the buffer matcher postings.  Each is a
+    list of (docid, tf, locations) tuples; locations is None if the
+    postings are count-only.
+    """
+    op._field = field
+    for invList in invLists:
+        op._args.append(QryIopList(invList))
+    op.setPostingsMode(postingsMode)
+    op.initialize(None)
+
+    # Two-argument operators are vectorized if the lists allow it.
+    assert op._getArgLocations(0) is not None
+
+    il = op.invertedList
+    vectorized = [(il.getDocid(n), il.getTf(n),
+                   list(il.getPositions(n))
+                   if postingsMode == InvList.POSITIONS else None)
+                  for n in range(il.df)]
+
+    for q_i in op._args:
+        q_i.docIteratorReset()
+
+    buffered = []
+    match = op._getNextMatch(0)
+    while match is not None:
+        docid, locations = match
+        buffered.append((docid, len(locations),
+                         list(locations)
+                         if postingsMode == InvList.POSITIONS else None))
+        match = op._getNextMatch(docid + 1)
+
+    return(vectorized, buffered)
+
+
+def randomInvList(rng, shared):
+    """
+    Create a random inverted list.
+
+    rng: A random.Random.
+    shared: A set of docids that the list must match.
+
+    Returns an InvList.
+    """
+    invList = InvList(field)
+    docids = set(rng.sample(range(numDocs), rng.randint(0, numDocs // 2)))
+    span, maxTf = rng.choice(shapes)
+
+    for docid in sorted(docids | shared):
+        locations = {rng.randint(0, span) for _ in range(rng.randint(1, maxTf))}
+        invList.appendPosting(docid, sorted(locations))
+
+    return(invList)
+
+
+def randomInvLists(seed):
+    """
+    Create the inverted lists of two arguments.  Sometimes both
+    arguments have the same inverted list (e.g., #NEAR/1(a a)).
+
+    seed: A random seed.
+
+    Returns a list of two InvList.
+    """
+    rng = random.Random(seed)
+    shared = set(rng.sample(range(numDocs), 5))
+    invLists = [randomInvList(rng, shared), randomInvList(rng, shared)]
+
+    if rng.random() < 0.3:
+        invLists[1] = invLists[0]
+
+    return(invLists)
+
+
+def singleDocInvLists(locations):
+    """
+    Create the inverted lists of two arguments that match one document.
+
+    locations: A list of two sorted location lists, one per argument.
+
+    Returns a list of two InvList.
+    """
+    invLists = []
+    for l in locations:
+        invList = InvList(field)
+        invList.appendPosting(0, l)
+        invLists.append(invList)
+
+    return(invLists)
+
+
+# ------------------ Tests --------------------------------- #
+
+# Small cases for the conflict rules of the vectorized evaluators.
+# For #NEAR, two locations of the first argument match the same
+# location of the second argument (f[1:] == f[:-1]).  For #WINDOW, the
+# next location of the other argument isn't the next merged location
+# (partners != k + 1), or a run of matching pairs has an odd length.
+@pytest.mark.parametrize('operator, n, locations', [
+    (QryIopNear, 2, [[1, 2], [3]]),
+    (QryIopNear, 2, [[1, 2, 4], [3, 5]]),
+    (QryIopNear, 1, [[1, 2, 3], [2, 3, 4]]),
+    (QryIopNear, 0, [[1, 2], [1, 2]]),
+    (QryIopWindow, 3, [[1, 2], [3]]),
+    (QryIopWindow, 2, [[1, 3, 5], [2, 4, 6]]),
+    (QryIopWindow, 2, [[1, 3, 5], [2, 4]]),
+    (QryIopWindow, 1, [[1, 2], [1, 2]]),
+    (QryIopWindow, 5, [[1, 2, 3], [9, 10]]),
+])
+def test_conflicts(operator, n, locations):
+    vectorized, buffered = evaluate(operator(n),
+                                    singleDocInvLists(locations),
+                                    InvList.POSITIONS)
+    assert vectorized == buffered
+
+
+@pytest.mark.parametrize('operator', [QryIopNear, QryIopWindow])
+@pytest.mark.parametrize('postingsMode', [InvList.POSITIONS, InvList.FREQS])
+def test_random(operator, postingsMode):
+    for seed in range(numTrials):
+        n = seed % 7
+        vectorized, buffered = evaluate(operator(n), randomInvLists(seed),
+                                        postingsMode)
+        assert vectorized == buffered, f'seed {seed}, n {n}'
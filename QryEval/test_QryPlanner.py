@@ -0,0 +1,100 @@
+"""
+Tests of the query planner.  Conjunctions are ordered rarest first,
+and Indri #AND, which isn't a conjunction, is neither planned nor
+charged for df lookups.  Run them with pytest.
+"""
+
+# Copyright (c) 2026, Carnegie Mellon University.  All Rights Reserved.
+
+from Idx import Idx
+from QryIopNear import QryIopNear
+from QryIopTerm import QryIopTerm
+from QryPlanner import QryPlanner
+from QrySopAnd import QrySopAnd
+from RetrievalModelIndri import RetrievalModelIndri
+from RetrievalModelUnrankedBoolean import RetrievalModelUnrankedBoolean
+
+# ------------------ Global variables ---------------------- #
+
+indri = RetrievalModelIndri(2500, 0.4)
+unrankedBoolean = RetrievalModelUnrankedBoolean({})
+
+
+# ------------------ Methods (alphabetical) ---------------- #
+
+def countDocFreqs(monkeypatch):
+    """
+    Count the calls of Idx.getDocFreq.
+
+    Returns a list whose only element is the number of calls.
+    """
+    calls = [0]
+    getDocFreq = Idx.getDocFreq
+
+    def countingGetDocFreq(fieldName, term):
+        calls[0] += 1
+        return(getDocFreq(fieldName, term))
+
+    monkeypatch.setattr(Idx, 'getDocFreq', staticmethod(countingGetDocFreq))
+    return(calls)
+
+
+def getQuery(operator, terms):
+    """
+    Create a query whose arguments are terms.  The planner reads only
+    the terms' dfs, so their inverted lists aren't needed.
+
+    operator: A query operator, e.g., QrySopAnd().
+    terms: A list of terms.
+
+    Returns the query.
+    """
+    for t in terms:
+        operator.appendArg(QryIopTerm(t))
+
+    return(operator)
+
+
+# ------------------ Tests --------------------------------- #
+
+def test_booleanAnd(memoryIndex, monkeypatch):
+    index = memoryIndex(0)
+    calls = countDocFreqs(monkeypatch)
+    terms = sorted(index.invLists)[1:4]
+    q = getQuery(QrySopAnd(), terms)
+
+    QryPlanner.plan(q, unrankedBoolean)
+
+    # The arguments are #SCORE operators over the terms.
+    dfs = [index.invLists[q_i._args[0]._term].df for q_i in q._argOrder]
+    assert calls[0] == len(terms)
+    assert dfs == sorted(dfs)
+    assert q._svs
+
+
+def test_indriAnd(memoryIndex, monkeypatch):
+    index = memoryIndex(0)
+    calls = countDocFreqs(monkeypatch)
+    q = getQuery(QrySopAnd(), sorted(index.invLists)[1:4])
+
+    QryPlanner.plan(q, indri)
+
+    assert calls[0] == 0
+    assert q._argOrder is None
+    assert not q._svs
+
+
+def test_indriAndNear(memoryIndex, monkeypatch):
+    index = memoryIndex(0)
+    calls = countDocFreqs(monkeypatch)
+    terms = sorted(index.invLists)
+    near = getQuery(QryIopNear(1), terms[1:3])
+    q = QrySopAnd()
+    q.appendArg(near)
+    q.appendArg(QryIopTerm(terms[3]))
+
+    QryPlanner.plan(q, indri)
+
+    assert calls[0] == 2		# Only the #NEAR arguments
+    assert q._argOrder is None
+    assert near._argOrder is not None
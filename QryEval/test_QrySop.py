@@ -0,0 +1,73 @@
+"""
+Randomized tests of dynamic pruning.  WAND, Block-Max WAND, and
+MaxScore skip documents whose score bounds can't reach the top of the
+ranking, so they must return the same ranking (scores, documents, and tie order)
+as evaluation without pruning.  These tests compare both on random
+corpora (see conftest.py).  Run them with pytest.
+"""
+
+# Copyright (c) 2026, Carnegie Mellon University.  All Rights Reserved.
+
+import pytest
+
+from QrySopAnd import QrySopAnd
+from QrySopSum import QrySopSum
+from QrySopWAnd import QrySopWAnd
+from QrySopWSum import QrySopWSum
+from Ranker import Ranker
+
+# ------------------ Global variables ---------------------- #
+
+numDocs = 1000
+numTrials = 100
+outputLength = 10
+
+bm25 = {'retrievalAlgorithm': 'BM25',
+        'BM25:k_1': 1.2, 'BM25:b': 0.75, 'BM25:k_3': 0}
+indri = {'retrievalAlgorithm': 'Indri',
+         'Indri:mu': 2500, 'Indri:lambda': 0.4}
+
+# (parameters, pruning parameters, query operator) tuples.
+cases = {
+    'WAND-BM25-SUM': (bm25, {'BM25:wand': True}, QrySopSum),
+    'BMW-BM25-SUM': (bm25, {'BM25:blockMaxWand': True}, QrySopSum),
+    'BMW-Indri-WSUM': (indri, {'Indri:blockMaxWand': True}, QrySopWSum),
+    'BMW-Indri-WSUM-logSpace': (dict(indri, **{'Indri:logSpace': True}),
+                                {'Indri:blockMaxWand': True}, QrySopWSum),
+    'MaxScore-Indri-AND': (indri, {'Indri:maxScore': True}, QrySopAnd),
+    'MaxScore-Indri-AND-logSpace': (dict(indri, **{'Indri:logSpace': True}),
+                                    {'Indri:maxScore': True}, QrySopAnd),
+    'MaxScore-Indri-WAND': (indri, {'Indri:maxScore': True}, QrySopWAnd),
+    'MaxScore-Indri-WAND-logSpace': (dict(indri, **{'Indri:logSpace': True}),
+                                     {'Indri:maxScore': True}, QrySopWAnd),
+}
+
+
+# ------------------ Tests --------------------------------- #
+
+@pytest.mark.parametrize('case', sorted(cases))
+@pytest.mark.parametrize('compileScorers', [False, True])
+def test_sameRanking(memoryIndex, case, compileScorers):
+    parameters, pruning, operator = cases[case]
+    parameters = dict(parameters, outputLength=outputLength,
+                      compileScorers=compileScorers, flatEngine=False)
+    ranker = Ranker(parameters)
+    prunedRanker = Ranker(dict(parameters, **pruning))
+
+    for seed in range(numTrials):
+        index = memoryIndex(seed, numDocs=numDocs)
+        terms = index.getRandomTerms()
+        weights = None
+        if hasattr(operator(), 'weights'):
+            weights = index.getRandomWeights(len(terms))
+
+        exact = ranker.get_ranking_bow(
+            index.getQuery(operator, terms, weights))
+        pruned = prunedRanker.get_ranking_bow(
+            index.getQuery(operator, terms, weights))
+
+        assert pruned == exact, f'seed {seed}, terms {terms}'
+
+    # Block-Max WAND must skip some blocks, or the test proves little.
+    assert (prunedRanker.blocksSkipped is None or
+            prunedRanker.blocksSkipped > 0)